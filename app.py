@@ -1,15 +1,15 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import ast
-import re
-import nltk
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import hashlib
+import html
+import httpx
 import os
-import pickle
+import shutil
+import tempfile
+
+import filters
+import model_build
+import text_prep
+from recommender import Recommender
 
 # ─── Page Config ────────────────────────────────────────────────────────────────
 st.set_page_config(
@@ -89,6 +89,8 @@ st.markdown("""
     }
     .selected-movie h3 { color: #e94560; margin-top: 0; }
 
+    .stat-grid, .card-grid { display: grid; grid-template-columns: repeat(3, 1fr); gap: 1rem; }
+    .card-grid { grid-template-columns: repeat(2, 1fr); gap: 0 1rem; }
     .stat-card {
         background: #1a1a2e;
         border: 1px solid #2a2a4a;
@@ -133,73 +135,212 @@ st.markdown("""
 # ─── NLTK Setup ─────────────────────────────────────────────────────────────────
 @st.cache_resource
 def load_nltk():
-    nltk.download('stopwords', quiet=True)
-    nltk.download('wordnet', quiet=True)
-    return set(stopwords.words('english')), WordNetLemmatizer()
+    return text_prep.load_nltk(download=True)
+
+
+# Streamlit >= 1.37 reruns only the decorated function when its own widgets change
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', lambda f: f)
+
+MAX_RECS = 20  # top of the "Number of recommendations" slider
+
+# With RECOMMENDER_API_URL set (e.g. http://localhost:8000) the app is a thin client
+# of the FastAPI service and only builds the model itself while the API is unreachable
+API_URL     = os.getenv('RECOMMENDER_API_URL', '').rstrip('/')
+API_TIMEOUT = float(os.getenv('RECOMMENDER_API_TIMEOUT', '10'))
+
+
+# ─── API Client ─────────────────────────────────────────────────────────────────
+@st.cache_resource
+def api_client():
+    # one keep-alive pool per Streamlit server, shared by all sessions
+    return httpx.Client(
+        base_url=API_URL,
+        timeout=API_TIMEOUT,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+    )
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def api_available():
+    try:
+        return api_client().get('/health', timeout=2).status_code == 200
+    except httpx.HTTPError:
+        return False
+
 
-stop_words, lemmatizer = load_nltk()
+def api_get(path, params=None):
+    r = api_client().get(path, params=params)
+    r.raise_for_status()
+    return r.json()
 
 
-# ─── Preprocessing ──────────────────────────────────────────────────────────────
-def preprocess_text(text):
-    text = str(text).lower()
-    text = re.sub(r'[^a-zA-Z\s]', '', text)
-    words = text.split()
-    words = [w for w in words if w not in stop_words]
-    words = [lemmatizer.lemmatize(w) for w in words]
-    return " ".join(words)
+@st.cache_data(ttl=300, show_spinner=False)
+def api_catalog_info():
+    return api_get('/catalog/info')
+
+
+@st.cache_data(ttl=600, show_spinner=False, max_entries=1000)
+def api_suggest(q):
+    return api_get('/titles/suggest', {'q': q, 'limit': MAX_RECS})
 
 
 # ─── Data Loading & Model Building ──────────────────────────────────────────────
-CACHE_FILES = ['df.pkl', 'tfidf_matrix.pkl', 'indices.pkl', 'tfidf.pkl']
-
-@st.cache_resource(show_spinner=False)
-def build_model(csv_path):
-    if all(os.path.exists(f) for f in CACHE_FILES):
-        df         = pd.read_pickle('df.pkl')
-        tfidf_mat  = pickle.load(open('tfidf_matrix.pkl', 'rb'))
-        indices    = pickle.load(open('indices.pkl', 'rb'))
-        tfidf      = pickle.load(open('tfidf.pkl', 'rb'))
-        return df, tfidf_mat, indices, tfidf
-
-    df = pd.read_csv(csv_path, low_memory=False)
-    df = df.drop_duplicates().reset_index(drop=True)
-    df = df[['title', 'overview', 'genres', 'tagline', 'vote_average', 'popularity']]
-    df = df.dropna(subset=['title'])
-    df['overview']  = df['overview'].fillna(' ')
-    df['tagline']   = df['tagline'].fillna(' ')
-    df['genres']    = df['genres'].apply(
-        lambda x: " ".join([i['name'] for i in ast.literal_eval(x)]) if x and x != '[]' else ''
+@st.cache_data(show_spinner=False)
+def csv_cache_key(csv_path, mtime, size):
+    # content hash + pipeline config; mtime/size only decide when to rehash
+    return model_build.cache_key(csv_path)
+
+
+def save_upload(uploaded):
+    """Path of the upload on disk, written once per upload.
+
+    Named by the upload's id, so sessions never share a file. Reruns find it
+    in place and leave its mtime alone, so csv_cache_key does not rehash it.
+    """
+    upload_id = getattr(uploaded, 'file_id', None) or f'{uploaded.name}:{uploaded.size}'
+    digest = hashlib.sha256(str(upload_id).encode()).hexdigest()[:16]
+    path = os.path.join(tempfile.gettempdir(), f'movies_upload_{digest}.csv')
+    if not (os.path.exists(path) and os.path.getsize(path) == uploaded.size):
+        # copy in 1 MiB blocks instead of holding a second full copy in memory
+        uploaded.seek(0)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+        with os.fdopen(fd, 'wb') as f:
+            shutil.copyfileobj(uploaded, f, length=1 << 20)
+        os.replace(tmp_path, path)
+    previous = st.session_state.get('upload_path')
+    if previous and previous != path and os.path.exists(previous):
+        os.remove(previous)  # this session's earlier upload
+    st.session_state['upload_path'] = path
+    return path
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def build_model(csv_path, key):
+    return model_build.cached_build(csv_path, key)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def local_recommender(key, _df, _tfidf_mat):
+    # the same engine main.py serves, so both surfaces rank identically
+    years = filters.release_years(_df['release_date']) if 'release_date' in _df.columns else None
+    return Recommender(_df, _tfidf_mat, years=years)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def local_catalog_info(key, _rec):
+    # same fields as the API's /catalog/info
+    return {
+        'movies':     len(_rec),
+        'features':   _rec.tfidf_matrix.shape[1],
+        'avg_rating': float(_rec.df['vote_average'].mean()),
+        'genres':     _rec.filters.available_genres(),
+        'year_range': _rec.filters.year_range(),
+    }
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def title_options(key, _df, _catalog):
+    # label -> row, built once per model; duplicate titles (remakes) get their release year
+    dup  = _df['title'].duplicated(keep=False).to_numpy()
+    rows = {}
+    for row, (title, is_dup, year) in enumerate(zip(_df['title'].tolist(), dup, _catalog.years.tolist())):
+        if not isinstance(title, str):
+            continue
+        label = base = f'{title} ({year})' if is_dup and year else title
+        n = 2
+        while label in rows:
+            label, n = f'{base} #{n}', n + 1
+        rows[label] = row
+    return [''] + sorted(rows), rows
+
+
+def local_summary(rec, row):
+    m    = rec.df.iloc[row]
+    year = int(rec.filters.years[row])
+    return {
+        'key': row, 'title': m['title'], 'year': year or None, 'genres': m['genres'],
+        'vote_average': m['vote_average'], 'overview': m['overview'],
+    }
+
+
+def fetch_similar(rec, query, filter_params):
+    """(query movie, top MAX_RECS results) from the API or the local recommender."""
+    if rec is None:
+        params = {k: v for k, v in filter_params.items() if v is not None}
+        data   = api_get('/recommend/similar', {**query, **params, 'top_n': MAX_RECS})
+        items = [{**r, 'key': (r['title'], r['year'], r['tmdb_id'])} for r in data['results']]
+        return data['movie'], items
+    # the filter mask is applied before top-n, so n qualifying movies come back
+    allow = rec.filters.mask(
+        min_rating=filter_params['min_rating'],
+        genres=filter_params['genre'],
+        year_from=filter_params['year_from'],
+        year_to=filter_params['year_to'],
     )
-    df['tags'] = df['overview'] + " " + df['genres'] + " " + df['tagline']
-    df['tags'] = df['tags'].apply(preprocess_text)
-    df = df.reset_index(drop=True)
-    df['vote_average'] = pd.to_numeric(df['vote_average'], errors='coerce').fillna(0)
-    df['popularity']   = pd.to_numeric(df['popularity'],   errors='coerce').fillna(0)
+    rows, scores = rec.similar(query['row'], MAX_RECS, allow=allow)
+    return local_summary(rec, query['row']), [{**local_summary(rec, r), 'score': sc} for r, sc in zip(rows.tolist(), scores.tolist())]
+
 
-    indices = pd.Series(df.index, index=df['title']).drop_duplicates()
+def cached_similar(backend_key, rec, query, filter_params, filter_key):
+    # last query in session state: slider tweaks and reruns only re-slice it
+    key  = (backend_key, tuple(sorted(query.items())), filter_key)
+    last = st.session_state.get('recs')
+    if last is None or last[0] != key:
+        with st.spinner("🔍 Finding similar movies..."):
+            last = st.session_state['recs'] = (key, *fetch_similar(rec, query, filter_params))
+    return last[1], last[2]
 
-    tfidf     = TfidfVectorizer(max_features=50000, ngram_range=(1, 2), stop_words='english')
-    tfidf_mat = tfidf.fit_transform(df['tags'])
-    
-    df.to_pickle('df.pkl')
-    pickle.dump(tfidf_mat, open('tfidf_matrix.pkl', 'wb'))
-    pickle.dump(indices, open('indices.pkl', 'wb'))
-    pickle.dump(tfidf, open('tfidf.pkl', 'wb'))
 
-    return df, tfidf_mat, indices, tfidf
+# ─── Rendering ──────────────────────────────────────────────────────────────────
+def genre_tags(genres):
+    return ''.join(f'<span class="genre-tag">{html.escape(g)}</span>' for g in str(genres).split())
 
 
-def recommend(title, df, tfidf_mat, indices, n=10):
-    if title not in indices:
-        return pd.DataFrame()
-    idx       = indices[title]
-    sim_score = cosine_similarity(tfidf_mat[idx], tfidf_mat).flatten()
-    sim_score[idx] = 0
-    similar_idx = sim_score.argsort()[::-1][:n]
-    results   = df.iloc[similar_idx][['title', 'genres', 'vote_average', 'popularity', 'overview', 'tagline']].copy()
-    results['similarity'] = sim_score[similar_idx]
-    return results.reset_index(drop=True)
+def snippet(text, n):
+    text = str(text)
+    return html.escape(text[:n] + ('...' if len(text) > n else ''))
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def card_bodies(key):
+    # movie -> card HTML below the rank line, filled the first time a movie is shown
+    return {}
+
+
+def card_body(key, item):
+    bodies = card_bodies(key)
+    if item['key'] not in bodies:
+        bodies[item['key']] = f"""
+        <div class="movie-title">{html.escape(str(item['title']))}
+            <span class="rating-badge">⭐ {item['vote_average']:.1f}</span>
+        </div>
+        <div style="margin:0.4rem 0">{genre_tags(item['genres'])}</div>
+        <div class="movie-meta">{snippet(item['overview'], 160)}</div>"""
+    return bodies[item['key']]
+
+
+def cards_html(key, items):
+    # one markdown call for the whole grid instead of one per card
+    cards = ''.join(
+        f'<div class="movie-card"><div class="movie-rank">#{i + 1} &nbsp;·&nbsp; {int(item["score"] * 100)}% match</div>'
+        f'{card_body(key, item)}</div>'
+        for i, item in enumerate(items)
+    )
+    return f'<div class="card-grid">{cards}</div>'
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def stats_html(key, _info):
+    stats = [
+        (f"{_info['movies']:,}", 'Movies'),
+        (f"{_info['features']:,}", 'TF-IDF Features'),
+        (f"{_info['avg_rating']:.1f}", 'Avg Rating'),
+    ]
+    cards = ''.join(
+        f'<div class="stat-card"><div class="stat-value">{v}</div><div class="stat-label">{label}</div></div>'
+        for v, label in stats
+    )
+    return f'<div class="stat-grid">{cards}</div>'
 
 
 # ─── Sidebar ────────────────────────────────────────────────────────────────────
@@ -216,6 +357,7 @@ with st.sidebar:
     st.markdown("---")
     n_recs = st.slider("Number of recommendations", 5, 20, 10)
     min_rating = st.slider("Minimum vote average", 0.0, 10.0, 0.0, 0.5)
+    filter_box = st.container()  # genre/year filters, filled once the catalog is loaded
 
     st.markdown("---")
     st.markdown("### 🎯 About")
@@ -236,126 +378,135 @@ st.markdown("""
 
 
 # ─── Main Logic ─────────────────────────────────────────────────────────────────
-csv_path = None
-if uploaded:
-    tmp_path = f"/tmp/{uploaded.name}"
-    with open(tmp_path, 'wb') as f:
-        f.write(uploaded.read())
-    csv_path = tmp_path
-elif os.path.exists('movies_metadata.csv'):
-    csv_path = 'movies_metadata.csv'
-
-if csv_path is None:
-    st.info("👈 Upload **movies_metadata.csv** in the sidebar to get started.", icon="📂")
-    st.stop()
-
-with st.spinner("🔄 Loading dataset and building model... (first run may take a minute)"):
-    df, tfidf_mat, indices, tfidf = build_model(csv_path)
+rec = None
+if API_URL and api_available():
+    backend_key = f'api:{API_URL}'
+    info        = api_catalog_info()
+else:
+    if API_URL:
+        st.warning(f"Recommendation API at {API_URL} is unreachable, using a local model.", icon="⚠️")
+    load_nltk()
+
+    csv_path = None
+    if uploaded:
+        csv_path = save_upload(uploaded)
+    elif os.path.exists('movies_metadata.csv'):
+        csv_path = 'movies_metadata.csv'
+
+    if csv_path is None:
+        st.info("👈 Upload **movies_metadata.csv** in the sidebar to get started.", icon="📂")
+        st.stop()
+
+    with st.spinner("🔄 Loading dataset and building model... (first run may take a minute)"):
+        stat = os.stat(csv_path)
+        backend_key = csv_cache_key(csv_path, stat.st_mtime, stat.st_size)
+        df, tfidf_mat, indices, tfidf = build_model(csv_path, backend_key)
+        rec  = local_recommender(backend_key, df, tfidf_mat)
+        info = local_catalog_info(backend_key, rec)
+
+with filter_box:
+    genres = st.multiselect("Genres", info['genres'], placeholder="Any genre")
+    first_year, last_year = info['year_range']
+    years = st.slider("Release year", first_year, last_year, (first_year, last_year)) if first_year < last_year else None
+
+filter_params = {
+    'min_rating': min_rating or None,
+    'genre':      genres or None,
+    'year_from':  years[0] if years and years[0] > first_year else None,
+    'year_to':    years[1] if years and years[1] < last_year else None,
+}
+filter_key = (min_rating, tuple(genres), years)
 
 # Dataset stats
-col1, col2, col3 = st.columns(3)
-with col1:
-    st.markdown(f"""
-    <div class="stat-card">
-        <div class="stat-value">{len(df):,}</div>
-        <div class="stat-label">Movies</div>
-    </div>""", unsafe_allow_html=True)
-with col2:
-    st.markdown(f"""
-    <div class="stat-card">
-        <div class="stat-value">{tfidf_mat.shape[1]:,}</div>
-        <div class="stat-label">TF-IDF Features</div>
-    </div>""", unsafe_allow_html=True)
-with col3:
-    avg = df['vote_average'].mean()
-    st.markdown(f"""
-    <div class="stat-card">
-        <div class="stat-value">{avg:.1f}</div>
-        <div class="stat-label">Avg Rating</div>
-    </div>""", unsafe_allow_html=True)
-
+st.markdown(stats_html(backend_key, info), unsafe_allow_html=True)
 st.markdown("<br>", unsafe_allow_html=True)
 
-# ─── Search ─────────────────────────────────────────────────────────────────────
-st.markdown('<div class="section-header">🔍 Find a Movie</div>', unsafe_allow_html=True)
-st.markdown("<br>", unsafe_allow_html=True)
 
-all_titles = sorted(df['title'].dropna().unique().tolist())
-selected   = st.selectbox(
-    "Type or select a movie title",
-    options=[""] + all_titles,
-    index=0,
-    placeholder="e.g. Avatar, Toy Story, Inception..."
-)
-
-col_btn, col_space = st.columns([1, 3])
-with col_btn:
-    get_recs = st.button("🎯 Get Recommendations")
-
-# ─── Results ────────────────────────────────────────────────────────────────────
-if get_recs and selected:
-    movie_info = df[df['title'] == selected]
-    if not movie_info.empty:
-        m = movie_info.iloc[0]
-        st.markdown(f"""
-        <div class="selected-movie">
-            <h3>📽️ {m['title']}</h3>
-            <p style="color:#a0a0c0; margin:0.3rem 0">{m['overview'][:280]}{'...' if len(str(m['overview'])) > 280 else ''}</p>
-            <p style="margin-top:0.8rem">
-                {''.join(f'<span class="genre-tag">{g.strip()}</span>' for g in str(m['genres']).split() if g.strip())}
-                <span class="rating-badge">⭐ {m['vote_average']:.1f}</span>
-            </p>
+# ─── Search & Results ───────────────────────────────────────────────────────────
+def pick_movie():
+    """The chosen movie as /recommend/similar params (API) or {'row': n} (local), or None."""
+    if rec is not None:
+        options, title_rows = title_options(backend_key, df, rec.filters)
+        selected = st.selectbox(
+            "Type or select a movie title",
+            options=options,
+            index=0,
+            placeholder="e.g. Avatar, Toy Story, Inception..."
+        )
+        return {'row': title_rows[selected]} if selected else None
+
+    q = st.text_input("Search a movie title", placeholder="e.g. Avatar, Toy Story, Inception...")
+    suggestions = api_suggest(q.strip()) if q.strip() else []
+    labels = [f"{s['title']} ({s['year']})" if s['year'] else s['title'] for s in suggestions]
+    pick = st.selectbox("Matches", range(len(labels)), format_func=labels.__getitem__, index=None, placeholder="Pick a movie")
+    if pick is None:
+        return None
+    s = suggestions[pick]
+    return {k: s[k] for k in ('title', 'year', 'tmdb_id') if s[k] is not None}
+
+
+@fragment
+def search_and_results():
+    # picking a title or clicking the button reruns only this function, not the page
+    st.markdown('<div class="section-header">🔍 Find a Movie</div>', unsafe_allow_html=True)
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    picked = pick_movie()
+
+    col_btn, col_space = st.columns([1, 3])
+    with col_btn:
+        get_recs = st.button("🎯 Get Recommendations")
+
+    if get_recs:
+        if not picked:
+            st.warning("Please select a movie first.")
+            return
+        st.session_state['query'] = (backend_key, picked)
+
+    query = st.session_state.get('query')
+    if query is None or query[0] != backend_key:
+        st.markdown("""
+        <div style="text-align:center; color:#4a4a7a; padding: 3rem 0;">
+            <div style="font-size:4rem">🎥</div>
+            <div style="font-size:1.1rem; margin-top:0.5rem">Select a movie and click <b>Get Recommendations</b></div>
         </div>
         """, unsafe_allow_html=True)
+        return
 
-    with st.spinner("🔍 Finding similar movies..."):
-        results = recommend(selected, df, tfidf_mat, indices, n=50)
-
-    if results.empty:
-        st.error("Movie not found in the database. Please try another title.")
-    else:
-        results = results[results['vote_average'] >= min_rating].head(n_recs)
-
-        if results.empty:
-            st.warning(f"No movies found with rating ≥ {min_rating}. Try lowering the filter.")
+    try:
+        m, items = cached_similar(backend_key, rec, query[1], filter_params, filter_key)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            st.error("Movie not found in the database. Please try another title.")
         else:
-            st.markdown(
-                f'<div class="section-header">🎞️ Top {len(results)} Recommendations</div>',
-                unsafe_allow_html=True
-            )
-            st.markdown("<br>", unsafe_allow_html=True)
-
-            left, right = st.columns(2)
-            for i, (_, row) in enumerate(results.iterrows()):
-                genres_html = ''.join(
-                    f'<span class="genre-tag">{g.strip()}</span>'
-                    for g in str(row['genres']).split() if g.strip()
-                )
-                overview_snippet = str(row['overview'])[:160] + ('...' if len(str(row['overview'])) > 160 else '')
-                sim_pct = int(row['similarity'] * 100)
-
-                card = f"""
-                <div class="movie-card">
-                    <div class="movie-rank">#{i+1} &nbsp;·&nbsp; {sim_pct}% match</div>
-                    <div class="movie-title">{row['title']}
-                        <span class="rating-badge">⭐ {row['vote_average']:.1f}</span>
-                    </div>
-                    <div style="margin:0.4rem 0">{genres_html}</div>
-                    <div class="movie-meta">{overview_snippet}</div>
-                </div>
-                """
-                if i % 2 == 0:
-                    left.markdown(card, unsafe_allow_html=True)
-                else:
-                    right.markdown(card, unsafe_allow_html=True)
-
-elif get_recs and not selected:
-    st.warning("Please select a movie first.")
-
-elif not get_recs:
-    st.markdown("""
-    <div style="text-align:center; color:#4a4a7a; padding: 3rem 0;">
-        <div style="font-size:4rem">🎥</div>
-        <div style="font-size:1.1rem; margin-top:0.5rem">Select a movie and click <b>Get Recommendations</b></div>
+            st.error(f"Recommendation API error: {e.response.status_code}")
+        return
+    except httpx.HTTPError:
+        api_available.clear()  # next run re-checks and falls back to the local model
+        st.error("Recommendation API is unreachable. Please try again.")
+        return
+
+    st.markdown(f"""
+    <div class="selected-movie">
+        <h3>📽️ {html.escape(str(m['title']))}</h3>
+        <p style="color:#a0a0c0; margin:0.3rem 0">{snippet(m['overview'], 280)}</p>
+        <p style="margin-top:0.8rem">
+            {genre_tags(m['genres'])}
+            <span class="rating-badge">⭐ {m['vote_average']:.1f}</span>
+        </p>
     </div>
     """, unsafe_allow_html=True)
+
+    items = items[:n_recs]
+    if not items:
+        st.warning("No movies match the current filters. Try loosening them.")
+        return
+    st.markdown(
+        f'<div class="section-header">🎞️ Top {len(items)} Recommendations</div>',
+        unsafe_allow_html=True
+    )
+    st.markdown("<br>", unsafe_allow_html=True)
+    st.markdown(cards_html(backend_key, items), unsafe_allow_html=True)
+
+
+search_and_results()
@@ -0,0 +1,297 @@
+"""
+Versioned on-disk artifact bundle for the recommendation engine.
+
+Replaces the gzip pickles at API startup with files that load in
+milliseconds and can be memory-mapped:
+
+    artifacts/
+        manifest.json          format version, shapes, dtypes, column list
+        tfidf.data.npy         CSR matrix as raw arrays (float32 / int32)
+        tfidf.indices.npy
+        tfidf.indptr.npy
+        col.<name>.npy         numeric df columns
+        col.<name>.offsets.npy string df columns: UTF-8 blob + int64 offsets
+        col.<name>.bytes.npy
+        index.rows.npy         title -> row map (keys stored as col.index_title)
+        vectorizer.pkl         fitted TfidfVectorizer, unpickled on first use
+
+Build it from the existing pickles with:
+    python artifacts.py --out artifacts
+"""
+import argparse
+import gzip
+import json
+import os
+import pickle
+import shutil
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+
+# content-addressed model sets written by model_build.cached_build
+MODEL_CACHE_DIRNAME = "model_cache"
+CURRENT_FILE = "CURRENT"
+
+
+def load_pickle_file(base_path: str) -> Any:
+    """Unpickle base_path, preferring a gzip-compressed base_path.gz next to it."""
+    gz_path = f"{base_path}.gz"
+    if os.path.exists(gz_path):
+        with gzip.open(gz_path, "rb") as f:
+            return pickle.load(f)
+    if os.path.exists(base_path):
+        with open(base_path, "rb") as f:
+            return pickle.load(f)
+    raise FileNotFoundError(f"Neither {gz_path} nor {base_path} found.")
+
+
+def resolve_model_dir(base_dir: str) -> str:
+    """Directory holding the model files to serve.
+
+    MODEL_DIR wins if set; otherwise the set named in model_cache/CURRENT;
+    otherwise base_dir itself (the legacy layout with pickles next to main.py).
+    """
+    env_dir = os.getenv("MODEL_DIR")
+    if env_dir:
+        return env_dir
+    cache_dir = os.getenv("MODEL_CACHE_DIR", os.path.join(base_dir, MODEL_CACHE_DIRNAME))
+    try:
+        with open(os.path.join(cache_dir, CURRENT_FILE)) as f:
+            key = f.read().strip()
+    except FileNotFoundError:
+        return base_dir
+    set_dir = os.path.join(cache_dir, key)
+    return set_dir if key and os.path.isdir(set_dir) else base_dir
+
+
+# =========================
+# WRITE
+# =========================
+def _save_str_column(out_dir: str, name: str, values: Iterable[Any]) -> None:
+    encoded = [("" if v is None or (isinstance(v, float) and np.isnan(v)) else str(v)).encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    np.save(os.path.join(out_dir, f"col.{name}.offsets.npy"), offsets)
+    np.save(os.path.join(out_dir, f"col.{name}.bytes.npy"), blob)
+
+
+def staging_dir(out_dir: str) -> str:
+    """Empty temp dir next to out_dir, to write its next version into."""
+    tmp_dir = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    return tmp_dir
+
+
+def replace_dir(tmp_dir: str, out_dir: str) -> str:
+    """Move the finished tmp_dir to out_dir, replacing the previous version.
+
+    Readers never see a half-written directory, but the swap is two renames,
+    not one: in between, out_dir does not exist and a loader falls back as if
+    it had never been built.
+    """
+    old_dir = f"{out_dir}.old-{os.getpid()}"
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return out_dir
+
+
+def save_bundle(out_dir: str, df: pd.DataFrame, tfidf_matrix: Any, indices: Any, tfidf: Any = None) -> str:
+    """Write a bundle into a temp dir, then swap it in with replace_dir."""
+    tmp_dir = staging_dir(out_dir)
+
+    mat = sparse.csr_matrix(tfidf_matrix, dtype=np.float32, copy=True)  # sort_indices works in place
+    mat.sort_indices()
+    np.save(os.path.join(tmp_dir, "tfidf.data.npy"), mat.data.astype(np.float32, copy=False))
+    # scipy copies indptr on load unless both index arrays share a dtype
+    idx_dtype = np.int32 if mat.nnz < np.iinfo(np.int32).max else np.int64
+    np.save(os.path.join(tmp_dir, "tfidf.indices.npy"), mat.indices.astype(idx_dtype, copy=False))
+    np.save(os.path.join(tmp_dir, "tfidf.indptr.npy"), mat.indptr.astype(idx_dtype, copy=False))
+
+    columns: Dict[str, str] = {}
+    for name in df.columns:
+        col = df[name]
+        if pd.api.types.is_numeric_dtype(col):
+            np.save(os.path.join(tmp_dir, f"col.{name}.npy"), col.to_numpy())
+            columns[name] = "numeric"
+        else:
+            _save_str_column(tmp_dir, name, col.tolist())
+            columns[name] = "str"
+
+    items = list(indices.items())
+    _save_str_column(tmp_dir, "index_title", [str(k) for k, _ in items])
+    np.save(os.path.join(tmp_dir, "index.rows.npy"), np.array([int(v) for _, v in items], dtype=np.int32))
+
+    if tfidf is not None:
+        with open(os.path.join(tmp_dir, "vectorizer.pkl"), "wb") as f:
+            pickle.dump(tfidf, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "n_rows": int(mat.shape[0]),
+        "n_features": int(mat.shape[1]),
+        "nnz": int(mat.nnz),
+        "columns": columns,
+        "has_vectorizer": tfidf is not None,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return replace_dir(tmp_dir, out_dir)
+
+
+# =========================
+# READ
+# =========================
+class StringColumn:
+    """Read-only string column decoded on access from a (memory-mapped) UTF-8 blob.
+
+    Indexing with an int returns a str; with a slice, list or int array it
+    returns an object ndarray, so callers can use it like TITLES[rows].
+    """
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _one(self, i: int) -> str:
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return self.blob[start:stop].tobytes().decode("utf-8")
+
+    def __getitem__(self, key: Any) -> Any:
+        n = len(self)
+        if isinstance(key, (int, np.integer)):
+            if not -n <= key < n:
+                raise IndexError(key)
+            return self._one(int(key) % n)
+        # index the requested rows only, never an arange over the whole column
+        if isinstance(key, slice):
+            rows = range(*key.indices(n))
+        else:
+            rows = np.asarray(key)
+            if rows.dtype == bool:
+                if rows.shape != (n,):
+                    raise IndexError(f"boolean index of shape {rows.shape} for {n} rows")
+                rows = np.flatnonzero(rows)
+            elif rows.size and (rows.min() < -n or rows.max() >= n):
+                raise IndexError(key)
+            rows = rows.ravel() % max(n, 1)
+        return np.array([self._one(int(i)) for i in rows], dtype=object)
+
+    def to_numpy(self) -> np.ndarray:
+        return self[:]
+
+
+class ArtifactBundle:
+    def __init__(self, path: str, mmap: bool = True):
+        self.path = path
+        self.mmap_mode = "r" if mmap else None
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+        version = self.manifest.get("format_version")
+        if version != FORMAT_VERSION:
+            raise RuntimeError(f"{path}: unsupported artifact format {version}, expected {FORMAT_VERSION}")
+        self._vectorizer: Any = None
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.manifest["n_rows"])
+
+    @property
+    def column_names(self) -> List[str]:
+        return list(self.manifest["columns"])
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.path, name), mmap_mode=self.mmap_mode)
+
+    def tfidf_matrix(self) -> sparse.csr_matrix:
+        mat = sparse.csr_matrix(
+            (self._load("tfidf.data.npy"), self._load("tfidf.indices.npy"), self._load("tfidf.indptr.npy")),
+            shape=(self.manifest["n_rows"], self.manifest["n_features"]),
+            copy=False,
+        )
+        mat.has_sorted_indices = True
+        return mat
+
+    def _kind(self, name: str) -> str:
+        kind = self.manifest["columns"].get(name) if name != "index_title" else "str"
+        if kind is None:
+            raise KeyError(f"Column '{name}' not in artifact bundle")
+        return kind
+
+    def str_column(self, name: str) -> StringColumn:
+        if self._kind(name) != "str":
+            raise TypeError(f"Column '{name}' is not a string column")
+        return StringColumn(self._load(f"col.{name}.offsets.npy"), self._load(f"col.{name}.bytes.npy"))
+
+    def column(self, name: str) -> np.ndarray:
+        if self._kind(name) == "numeric":
+            return self._load(f"col.{name}.npy")
+        offsets = self._load(f"col.{name}.offsets.npy")
+        blob = self._load(f"col.{name}.bytes.npy").tobytes()
+        return np.array(
+            [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)],
+            dtype=object,
+        )
+
+    def dataframe(self, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        names = self.column_names if columns is None else [c for c in columns if c in self.manifest["columns"]]
+        return pd.DataFrame({c: self.column(c) for c in names})
+
+    def title_index(self) -> Dict[str, int]:
+        rows = self._load("index.rows.npy")
+        return dict(zip(self.column("index_title").tolist(), rows.tolist()))
+
+    @property
+    def vectorizer(self) -> Any:
+        if self._vectorizer is None:
+            if not self.manifest.get("has_vectorizer"):
+                raise RuntimeError(f"{self.path}: bundle was built without a vectorizer")
+            with open(os.path.join(self.path, "vectorizer.pkl"), "rb") as f:
+                self._vectorizer = pickle.load(f)
+        return self._vectorizer
+
+
+def load_bundle(path: str, mmap: bool = True) -> ArtifactBundle:
+    return ArtifactBundle(path, mmap=mmap)
+
+
+def bundle_exists(path: str) -> bool:
+    return os.path.exists(os.path.join(path, MANIFEST))
+
+
+# =========================
+# CLI: pickles -> bundle
+# =========================
+def main():
+    model_dir = resolve_model_dir(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Convert df/indices/tfidf pickles into an artifact bundle")
+    parser.add_argument("--src", default=model_dir, help="directory holding the .pkl(.gz) files")
+    parser.add_argument("--out", default=None, help="bundle directory (default: <src>/artifacts)")
+    args = parser.parse_args()
+    args.out = args.out or os.path.join(args.src, "artifacts")
+
+    t0 = time.perf_counter()
+    df = load_pickle_file(os.path.join(args.src, "df.pkl"))
+    indices = load_pickle_file(os.path.join(args.src, "indices.pkl"))
+    tfidf_matrix = load_pickle_file(os.path.join(args.src, "tfidf_matrix.pkl"))
+    tfidf = load_pickle_file(os.path.join(args.src, "tfidf.pkl"))
+    save_bundle(args.out, df, tfidf_matrix, indices, tfidf)
+    print(f"Wrote artifact bundle to {args.out} in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Recall@10 and single-query throughput of the IVF approximate engine against
+exact brute-force cosine (similarity.ExactEngine), over a grid of nprobe /
+rerank settings.
+
+Runs on a synthetic topic-structured TF-IDF matrix by default (uniformly
+random sparse rows have no neighbourhood structure, so any ANN index looks
+bad on them), or on a real model directory with --model-dir.
+
+Usage:
+    python benchmarks/bench_ann.py --rows 200000 --dim 128 --nprobe 4 16 64 --rerank 0 100
+    python benchmarks/bench_ann.py --model-dir model_cache/<key>
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from similarity import ExactEngine, IVFEngine, build_ivf  # noqa: E402
+
+
+def synthetic_tfidf(n_rows: int, n_features: int = 50000, n_topics: int = 500, words_per_doc: int = 60, seed: int = 0):
+    # each row mixes words from its topic's 300-term vocabulary with background noise
+    rng = np.random.default_rng(seed)
+    topic_vocab = rng.integers(0, n_features, size=(n_topics, 300))
+    topics = rng.integers(0, n_topics, size=n_rows)
+    n_topic_words = int(words_per_doc * 0.7)
+    cols = np.concatenate([
+        topic_vocab[topics[:, None], rng.integers(0, 300, size=(n_rows, n_topic_words))],
+        rng.integers(0, n_features, size=(n_rows, words_per_doc - n_topic_words)),
+    ], axis=1).ravel()
+    rows = np.repeat(np.arange(n_rows), words_per_doc)
+    mat = sparse.csr_matrix((np.ones(len(cols), dtype=np.float32), (rows, cols)), shape=(n_rows, n_features))
+    mat.sum_duplicates()
+    mat.data = np.log1p(mat.data)
+    return normalize(mat)
+
+
+def load_matrix(model_dir: str):
+    from artifacts import bundle_exists, load_bundle
+    from artifacts import load_pickle_file
+
+    bundle_dir = os.path.join(model_dir, "artifacts")
+    if bundle_exists(bundle_dir):
+        return load_bundle(bundle_dir, mmap=False).tfidf_matrix()
+    return load_pickle_file(os.path.join(model_dir, "tfidf_matrix.pkl")).tocsr()
+
+
+def run(engine, matrix, queries: np.ndarray, top_n: int):
+    t0 = time.perf_counter()
+    found = [engine.search(matrix[q], top_n, exclude=[[q]])[0][0] for q in queries]
+    return found, len(queries) / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="synthetic catalog size")
+    parser.add_argument("--model-dir", default=None, help="benchmark a real model instead of synthetic data")
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--method", choices=["svd", "random"], default="svd")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 100, 400])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-n", type=int, default=10)
+    args = parser.parse_args()
+
+    matrix = load_matrix(args.model_dir) if args.model_dir else synthetic_tfidf(args.rows)
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    queries = np.random.default_rng(1).choice(matrix.shape[0], min(args.queries, matrix.shape[0]), replace=False)
+
+    t0 = time.perf_counter()
+    index = build_ivf(matrix, dim=args.dim, n_lists=args.n_lists, method=args.method)
+    build_s = time.perf_counter() - t0
+    print(f"rows={matrix.shape[0]:,} features={matrix.shape[1]:,} {args.method} dim={args.dim} "
+          f"cells={len(index['centroids']):,} build={build_s:.1f}s")
+
+    exact, exact_qps = run(ExactEngine(matrix), matrix, queries, args.top_n)
+    print(f"{'engine':<8} {'nprobe':>7} {'rerank':>7} {'recall@' + str(args.top_n):>10} {'QPS':>10} {'speedup':>8}")
+    print(f"{'exact':<8} {'-':>7} {'-':>7} {1.0:>10.3f} {exact_qps:>10,.0f} {1.0:>7.1f}x")
+    for nprobe in args.nprobe:
+        for rerank in args.rerank:
+            engine = IVFEngine(index, matrix=matrix, nprobe=nprobe, rerank=rerank)
+            found, qps = run(engine, matrix, queries, args.top_n)
+            recall = np.mean([len(np.intersect1d(a, b)) / max(len(b), 1) for a, b in zip(found, exact)])
+            print(f"{'ivf':<8} {nprobe:>7} {rerank:>7} {recall:>10.3f} {qps:>10,.0f} {qps / exact_qps:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
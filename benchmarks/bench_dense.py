@@ -0,0 +1,64 @@
+"""
+Dense low-rank embeddings vs. the sparse TF-IDF baseline: artifact size,
+per-query latency and result quality (similarity.quality_report) for a
+grid of SVD dimensions and storage dtypes.
+
+Usage:
+    python benchmarks/bench_dense.py --rows 100000 --dims 128 256 384
+    python benchmarks/bench_dense.py --model-dir model_cache/<key> --dtypes float32 float16
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy import sparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_ann import load_matrix, synthetic_tfidf  # noqa: E402
+from similarity import DenseEngine, ExactEngine, project, quality_report  # noqa: E402
+
+
+def latency_ms(engine, matrix, queries: np.ndarray, top_n: int) -> float:
+    t0 = time.perf_counter()
+    for q in queries:
+        engine.search(matrix[q], top_n, exclude=[[q]])
+    return (time.perf_counter() - t0) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="synthetic catalog size")
+    parser.add_argument("--model-dir", default=None, help="benchmark a real model instead of synthetic data")
+    parser.add_argument("--dims", type=int, nargs="+", default=[128, 256])
+    parser.add_argument("--dtypes", nargs="+", default=["float32", "float16"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-n", type=int, default=10)
+    args = parser.parse_args()
+
+    matrix = load_matrix(args.model_dir) if args.model_dir else synthetic_tfidf(args.rows)
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    queries = np.random.default_rng(1).choice(matrix.shape[0], min(args.queries, matrix.shape[0]), replace=False)
+    sparse_mib = (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 2**20
+
+    print(f"rows={matrix.shape[0]:,} features={matrix.shape[1]:,} nnz={matrix.nnz:,}")
+    print(f"{'engine':<16} {'MiB':>8} {'build s':>8} {'ms/query':>9} {'recall@' + str(args.top_n):>10} {'score ratio':>12}")
+    exact_ms = latency_ms(ExactEngine(matrix), matrix, queries, args.top_n)
+    print(f"{'sparse':<16} {sparse_mib:>8.1f} {'-':>8} {exact_ms:>9.2f} {1.0:>10.3f} {1.0:>12.3f}")
+    for dim in args.dims:
+        t0 = time.perf_counter()
+        projection, embeddings = project(matrix, dim=dim, method="svd")
+        build_s = time.perf_counter() - t0
+        for dtype in args.dtypes:
+            index = {"projection": projection.astype(dtype), "embeddings": embeddings.astype(dtype)}
+            engine = DenseEngine(index)
+            q = quality_report(matrix, engine, n_queries=args.queries, top_n=args.top_n)
+            ms = latency_ms(engine, matrix, queries, args.top_n)
+            mib = (index["embeddings"].nbytes + index["projection"].nbytes) / 2**20
+            print(f"{f'dense {dim} {dtype}':<16} {mib:>8.1f} {build_s:>8.1f} {ms:>9.2f} {q['recall']:>10.3f} {q['score_ratio']:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
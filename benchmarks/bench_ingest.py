@@ -0,0 +1,116 @@
+"""
+Peak memory and wall time of the model-build ingestion stage: the old
+whole-file pd.read_csv + ast.literal_eval path vs. model_build.load_catalog
+(usecols, dtype=str, chunked), and the vectorizer fit with the exact
+TfidfVectorizer vs. the HashingVectorizer pipeline.
+
+Every stage runs in a fresh process so ru_maxrss is that stage's own peak.
+The synthetic CSV carries the extra columns the real movies_metadata.csv
+has, which the old path materialized before dropping them. Text
+preprocessing (NLTK) is skipped; the fit runs on the raw tag strings.
+
+Usage (Linux/macOS):
+    python benchmarks/bench_ingest.py --sizes 20000 100000 400000
+"""
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = np.array("""alien heist detective romance war space family revenge haunted
+island robot kingdom spy comedy musical desert ocean city prison journey
+""".split())
+GENRES = ["Action", "Drama", "Comedy", "Thriller", "Science Fiction", "Horror", "Romance", "Family"]
+
+
+def write_csv(path: str, n_rows: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        header = ["adult", "belongs_to_collection", "budget", "genres", "homepage", "id", "imdb_id",
+                  "original_language", "original_title", "overview", "popularity", "poster_path",
+                  "production_companies", "release_date", "revenue", "tagline", "title", "vote_average"]
+        f.write(",".join(header) + "\n")
+        for i in range(n_rows):
+            genres = "[" + ", ".join(
+                f"{{'id': {g}, 'name': '{GENRES[g]}'}}" for g in rng.choice(len(GENRES), 2, replace=False)
+            ) + "]"
+            overview = " ".join(rng.choice(WORDS, 40))
+            companies = "[{'name': 'Studio %d', 'id': %d}]" % (i % 500, i % 500)
+            row = ["False", "", str(i * 1000), f'"{genres}"', "http://example.com", str(i + 1), f"tt{i:07d}",
+                   "en", f"Movie {i}", f'"{overview}"', f"{rng.random() * 50:.3f}", f"/p{i}.jpg",
+                   f'"{companies}"', "2001-01-01", str(i * 2000), '"A tagline."', f"Movie {i}",
+                   f"{rng.random() * 10:.1f}"]
+            f.write(",".join(row) + "\n")
+
+
+def legacy_load(csv_path: str) -> pd.DataFrame:
+    import ast
+    df = pd.read_csv(csv_path, low_memory=False)
+    df = df.drop_duplicates().reset_index(drop=True)
+    df = df[["title", "overview", "genres", "tagline", "vote_average", "popularity", "id", "poster_path", "release_date"]]
+    df = df.dropna(subset=["title"])
+    df["overview"] = df["overview"].fillna(" ")
+    df["tagline"] = df["tagline"].fillna(" ")
+    df["genres"] = df["genres"].apply(
+        lambda x: " ".join([i["name"] for i in ast.literal_eval(x)]) if x and x != "[]" else ""
+    )
+    return df.reset_index(drop=True)
+
+
+def stage(name: str, csv_path: str, out) -> None:
+    sys.path.insert(0, ROOT)
+    os.environ["MODEL_VECTORIZER"] = "hashing" if name == "fit-hashing" else "tfidf"
+    import model_build
+
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    if name == "read-legacy":
+        rows = len(legacy_load(csv_path))
+    elif name == "read-chunked":
+        rows = len(model_build.load_catalog(csv_path))
+    else:
+        df = model_build.load_catalog(csv_path)
+        base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t0 = time.perf_counter()
+        # fit_model minus the NLTK step
+        model_build.build_tags = lambda d: (d["overview"] + " " + d["genres"] + " " + d["tagline"]).tolist()
+        rows = model_build.fit_model(df)[1].shape[0]
+    elapsed = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    out.put((rows, elapsed, peak / scale, (peak - base) / scale))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20000, 100000])
+    parser.add_argument("--stages", nargs="+", default=["read-legacy", "read-chunked", "fit-tfidf", "fit-hashing"])
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    print(f"{'rows':>9} {'stage':<13} {'CSV MiB':>8} {'time s':>8} {'peak MiB':>9} {'delta MiB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            csv_path = os.path.join(tmp, f"movies_{n}.csv")
+            write_csv(csv_path, n)
+            size_mib = os.path.getsize(csv_path) / 2**20
+            for name in args.stages:
+                out = ctx.Queue()
+                p = ctx.Process(target=stage, args=(name, csv_path, out))
+                p.start()
+                rows, elapsed, peak, delta = out.get()
+                p.join()
+                print(f"{rows:>9,} {name:<13} {size_mib:>8.1f} {elapsed:>8.2f} {peak:>9.1f} {delta:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+"""
+Reproducible offline benchmark of the whole pipeline, written as JSON so
+runs can be compared between commits.
+
+For each catalog size a synthetic movies_metadata.csv is generated from a
+fixed seed. The words are Zipf-distributed over a synthetic vocabulary, so
+TF-IDF sparsity resembles real overviews. Then:
+
+    build    model_build.build() into a scratch dir: wall time, peak RSS
+    load     main.load_pickles(): wall time, RSS, per-artifact load times
+    query    tfidf_recommend_titles one title at a time: latency percentiles,
+             QPS and the mean matmul / select / build split
+    batch    tfidf_recommend_batch in --batch-size chunks: QPS, per-batch latency
+    search   /movie/search end to end. uvicorn runs main:app against the
+             local TMDB stub (tmdb_stub.py), which answers from the built
+             catalog with --tmdb-latency-ms injected per upstream call
+             (plus optional slow spikes, 5xx errors and 429s). Requests are
+             driven at --concurrency.
+
+build and load+query+batch each run in a fresh process, so ru_maxrss is
+that stage's own peak. No network access or TMDB key is needed.
+
+Usage:
+    python benchmarks/bench_suite.py --sizes 10000 100000 --out bench.json
+    python benchmarks/bench_suite.py --sizes 10000 --compare bench.json
+    python benchmarks/bench_suite.py --sizes 2000000 --raw-tags --skip-search --work-dir /data/bench
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import platform
+import queue
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from filters import TMDB_GENRE_IDS  # noqa: E402
+
+# ru_maxrss is KiB on Linux, bytes on macOS
+RSS_SCALE = 1024 * 1024 if sys.platform == "darwin" else 1024
+ARTIFACTS = ["bundle", "tfidf_matrix", "df", "neighbors", "movie_meta", "recommender", "genre_rows"]
+STAGES = ["neighbors", "matmul", "select", "rerank", "build"]
+
+
+# =========================
+# SYNTHETIC CATALOG
+# =========================
+def make_vocabulary(size: int, rng: np.random.Generator) -> np.ndarray:
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    lengths = rng.integers(4, 10, size)
+    chars = rng.choice(letters, (size, 9))
+    words = {"".join(row[:n]) for row, n in zip(chars, lengths)}
+    return np.array(sorted(words))
+
+
+def write_catalog(path: str, n_rows: int, seed: int = 0, vocab_size: int = 30000, chunk_rows: int = 50000) -> None:
+    """movies_metadata.csv-shaped file; columns model_build reads, plus ids and dates for movie_meta."""
+    rng = np.random.default_rng(seed)
+    vocab = make_vocabulary(vocab_size, rng)
+    zipf = 1.0 / (np.arange(len(vocab)) + 2.7)
+    zipf /= zipf.sum()
+    genres = list(TMDB_GENRE_IDS.items())
+    for start in range(0, n_rows, chunk_rows):
+        n = min(chunk_rows, n_rows - start)
+        words = vocab[rng.choice(len(vocab), (n, 48), p=zipf)]
+        lengths = rng.integers(20, 48, n)
+        title_words = vocab[rng.integers(0, len(vocab), (n, 3))]
+        title_len = rng.integers(1, 4, n)
+        picks = [rng.choice(len(genres), k, replace=False) for k in rng.integers(1, 4, n)]
+        chunk = pd.DataFrame({
+            "id": np.arange(start + 1, start + n + 1),
+            "title": [" ".join(t[:k]).title() for t, k in zip(title_words, title_len)],
+            "overview": [" ".join(w[:k]) for w, k in zip(words, lengths)],
+            "tagline": [" ".join(w[-5:]) for w in words],
+            "genres": ["[" + ", ".join(f"{{'id': {genres[g][0]}, 'name': '{genres[g][1]}'}}" for g in p) + "]" for p in picks],
+            "vote_average": np.round(rng.uniform(0, 10, n), 1),
+            "vote_count": rng.geometric(0.002, n),
+            "popularity": np.round(rng.lognormal(1.0, 1.2, n), 3),
+            "poster_path": [f"/p{i}.jpg" for i in range(start + 1, start + n + 1)],
+            "release_date": [f"{y}-{m:02d}-{d:02d}" for y, m, d in zip(rng.integers(1920, 2026, n), rng.integers(1, 13, n), rng.integers(1, 29, n))],
+        })
+        chunk.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+
+
+# =========================
+# MEASUREMENT HELPERS
+# =========================
+def latency_summary(seconds: List[float], items: Optional[int] = None) -> Dict[str, float]:
+    ms = np.asarray(seconds) * 1000
+    total = float(np.sum(seconds))
+    return {
+        "n": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+        "qps": (items or len(ms)) / total if total > 0 else 0.0,
+    }
+
+
+def peak_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / RSS_SCALE
+
+
+def quiet() -> None:
+    # children print build progress; keep stdout for the report
+    sys.stdout = open(os.devnull, "w")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_revision() -> Optional[str]:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# =========================
+# STAGES
+# =========================
+def build_stage(csv_path: str, model_dir: str, raw_tags: bool, out) -> None:
+    quiet()
+    import model_build
+
+    if raw_tags:
+        # skip NLTK cleaning: the fit runs on the raw tag strings
+        model_build.build_tags = lambda d: (d["overview"] + " " + d["genres"] + " " + d["tagline"]).tolist()
+    base = peak_rss_mib()
+    t0 = time.perf_counter()
+    model_build.build(csv_path, model_dir, incremental=False)
+    elapsed = time.perf_counter() - t0
+    peak = peak_rss_mib()
+    out.put({"seconds": elapsed, "peak_rss_mib": peak, "delta_rss_mib": peak - base})
+
+
+def serve_stage(model_dir: str, mode: str, queries: int, batch_size: int, top_n: int, seed: int, out) -> None:
+    quiet()
+    os.environ["MODEL_DIR"] = model_dir
+    os.environ.setdefault("TMDB_API_KEY", "benchmark")
+    if mode == "pickle":
+        os.environ["ARTIFACTS_DIR"] = os.path.join(model_dir, "__no_bundle__")
+    import main
+    from metrics import TFIDF_STAGE_SECONDS
+
+    base = peak_rss_mib()
+    t0 = time.perf_counter()
+    main.load_pickles()
+    load = {
+        "seconds": time.perf_counter() - t0,
+        "peak_rss_mib": peak_rss_mib(),
+        "delta_rss_mib": peak_rss_mib() - base,
+    }
+    loaded = {a: main.ARTIFACT_LOAD_SECONDS.snapshot(a) for a in ARTIFACTS}
+    load["artifacts_s"] = {a: seconds for a, (count, seconds) in loaded.items() if count}
+
+    rng = np.random.default_rng(seed)
+    titles = [str(main.TITLES[r]) for r in rng.integers(0, len(main.TITLES), queries)]
+    for t in titles[:10]:
+        main.tfidf_recommend_titles(t, top_n=top_n)  # warm caches and lazy imports
+
+    stages = TFIDF_STAGE_SECONDS
+    before = {s: stages.snapshot(s)[1] for s in STAGES}
+    single = []
+    for t in titles:
+        t0 = time.perf_counter()
+        main.tfidf_recommend_titles(t, top_n=top_n)
+        single.append(time.perf_counter() - t0)
+    query = latency_summary(single)
+    query["stage_mean_ms"] = {s: (stages.snapshot(s)[1] - before[s]) / len(titles) * 1000 for s in STAGES}
+
+    batches = []
+    for i in range(0, len(titles), batch_size):
+        t0 = time.perf_counter()
+        main.tfidf_recommend_batch(titles[i:i + batch_size], top_n=top_n)
+        batches.append(time.perf_counter() - t0)
+    batch = latency_summary(batches, items=len(titles))
+    batch["batch_size"] = batch_size
+
+    out.put({"load": load, "query": query, "batch": batch, "rows": len(main.TITLES), "serve_peak_rss_mib": peak_rss_mib()})
+
+
+async def drive_search(base_url: str, titles: List[str], concurrency: int) -> Dict[str, Any]:
+    import httpx
+
+    latencies: List[float] = []
+    errors = 0
+    queue = list(titles)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            while queue:
+                title = queue.pop()
+                t0 = time.perf_counter()
+                r = await client.get("/movie/search", params={"query": title})
+                latencies.append(time.perf_counter() - t0)
+                errors += r.status_code != 200
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+    out = latency_summary(latencies)
+    out.update({"qps": len(latencies) / wall, "errors": errors, "concurrency": concurrency})
+    return out
+
+
+def search_stage(model_dir: str, args: argparse.Namespace, titles: List[str]) -> Dict[str, Any]:
+    import httpx
+    from tmdb_stub import StubCatalog, TMDBStub, start_in_thread
+
+    # answering from the built catalog keeps TMDB ids aligned with the rows the API serves
+    stub = TMDBStub(
+        latency_ms=args.tmdb_latency_ms, jitter_ms=args.tmdb_jitter_ms, seed=args.seed,
+        error_rate=args.tmdb_error_rate, slow_rate=args.tmdb_slow_rate, slow_ms=args.tmdb_slow_ms,
+        rate_limit=args.tmdb_rate_limit, catalog=StubCatalog(model_dir),
+    )
+    tmdb_url, stop_stub = start_in_thread(stub)
+    port = free_port()
+    env = {
+        **os.environ,
+        "MODEL_DIR": model_dir,
+        "TMDB_BASE_URL": tmdb_url,
+        "TMDB_API_KEY": "benchmark",
+        "TMDB_CACHE_ENABLED": "1" if args.tmdb_cache else "0",
+        "POSTER_REFRESH_ENABLED": "0",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 900
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            try:
+                if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("uvicorn did not become healthy")
+            time.sleep(0.2)
+        asyncio.run(drive_search(base_url, titles[:min(20, len(titles))], args.concurrency))  # warm-up
+        result = asyncio.run(drive_search(base_url, titles, args.concurrency))
+        result["tmdb_latency_ms"] = args.tmdb_latency_ms
+        result["tmdb"] = stub.stats()
+        return result
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        stop_stub()
+
+
+def child_main(target, args, out) -> None:
+    # report failures on the queue too, so the parent never waits on a result that will not come
+    try:
+        target(*args, out)
+    except BaseException:
+        out.put({"error": traceback.format_exc()})
+        sys.exit(1)  # the parent prints the traceback
+
+
+def run_child(ctx, target, *args) -> Dict[str, Any]:
+    out = ctx.Queue()
+    p = ctx.Process(target=child_main, args=(target, args, out))
+    p.start()
+    try:
+        while True:
+            try:
+                result = out.get(timeout=1)
+                break
+            except queue.Empty:
+                # a child killed outright (OOM, signal) puts nothing; drain once after it is gone
+                if not p.is_alive():
+                    try:
+                        result = out.get(timeout=1)
+                        break
+                    except queue.Empty:
+                        raise RuntimeError(f"{target.__name__} exited with code {p.exitcode} and no result")
+    finally:
+        p.join(timeout=30)
+        if p.is_alive():
+            p.terminate()
+    if "error" in result:
+        raise RuntimeError(f"{target.__name__} failed in the child process:\n{result['error']}")
+    return result
+
+
+# =========================
+# REPORT
+# =========================
+def flatten(d: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    out = {}
+    for k, v in d.items():
+        if isinstance(v, dict):
+            out.update(flatten(v, f"{prefix}{k}."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[f"{prefix}{k}"] = float(v)
+    return out
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+    base = {r["rows_requested"]: flatten(r) for r in baseline["results"]}
+    print(f"baseline {baseline['meta'].get('git')}  ->  current {current['meta'].get('git')}")
+    for r in current["results"]:
+        old = base.get(r["rows_requested"])
+        if old is None:
+            continue
+        print(f"\n{r['rows_requested']:,} rows")
+        for key, new in flatten(r).items():
+            if key in old and old[key] and (key.endswith(("_ms", "qps", "seconds", "_mib")) or "_s." in key):
+                print(f"  {key:<40} {old[key]:>12.3f} {new:>12.3f} {100 * (new - old[key]) / old[key]:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--load-mode", choices=["bundle", "pickle"], default="bundle")
+    parser.add_argument("--raw-tags", action="store_true", help="skip NLTK preprocessing in the build (no corpora needed)")
+    parser.add_argument("--skip-search", action="store_true", help="skip the uvicorn /movie/search stage")
+    parser.add_argument("--search-requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--tmdb-latency-ms", type=float, default=40.0, help="delay the TMDB stub adds per call")
+    parser.add_argument("--tmdb-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--tmdb-slow-rate", type=float, default=0.0, help="share of TMDB calls with an extra --tmdb-slow-ms spike")
+    parser.add_argument("--tmdb-slow-ms", type=float, default=2000.0)
+    parser.add_argument("--tmdb-error-rate", type=float, default=0.0, help="share of TMDB calls answered 5xx")
+    parser.add_argument("--tmdb-rate-limit", type=float, default=0.0, help="TMDB requests per second before 429s (0 = off)")
+    parser.add_argument("--tmdb-cache", action="store_true", help="keep the API's TMDB response cache on")
+    parser.add_argument("--work-dir", default=None, help="keep CSVs (reused when present) and built models here")
+    parser.add_argument("--out", default=None, help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", default=None, help="baseline JSON report to diff against")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    work = args.work_dir or tempfile.mkdtemp(prefix="bench_suite_")
+    os.makedirs(work, exist_ok=True)
+    report = {
+        "meta": {
+            "git": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "numpy": np.__version__,
+            "args": vars(args),
+        },
+        "results": [],
+    }
+    try:
+        for n in args.sizes:
+            csv_path = os.path.join(work, f"movies_{n}_{args.seed}.csv")
+            model_dir = os.path.join(work, f"model_{n}_{args.seed}")
+            if not os.path.exists(csv_path):
+                t0 = time.perf_counter()
+                write_catalog(csv_path, n, seed=args.seed)
+                print(f"[{n:,}] catalog written in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+            os.makedirs(model_dir, exist_ok=True)
+            result: Dict[str, Any] = {"rows_requested": n, "csv_mib": os.path.getsize(csv_path) / 2**20}
+            result["build"] = run_child(ctx, build_stage, csv_path, model_dir, args.raw_tags)
+            print(f"[{n:,}] build {result['build']['seconds']:.1f}s", file=sys.stderr)
+            result.update(run_child(ctx, serve_stage, model_dir, args.load_mode, args.queries, args.batch_size, args.top_n, args.seed))
+            print(f"[{n:,}] load {result['load']['seconds']:.2f}s, query p50 {result['query']['p50_ms']:.2f}ms", file=sys.stderr)
+            if not args.skip_search:
+                titles = pd.read_csv(csv_path, usecols=["title"], dtype=str)["title"].dropna()
+                sample = titles.sample(args.search_requests, replace=True, random_state=args.seed).tolist()
+                result["search"] = search_stage(model_dir, args, sample)
+                print(f"[{n:,}] /movie/search p50 {result['search']['p50_ms']:.1f}ms at {args.concurrency} concurrent", file=sys.stderr)
+            report["results"].append(result)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compare the old full-argsort ranking in tfidf_recommend_titles with the
+argpartition + vectorized title lookup path, at several corpus sizes.
+
+Usage:
+    python benchmarks/bench_topn.py --sizes 10000 45000 200000 --top-n 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from similarity import top_n_indices  # noqa: E402
+
+
+def synthetic_tfidf(n_rows: int, n_features: int = 50000, nnz_per_row: int = 60, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    density = nnz_per_row / n_features
+    mat = sparse.random(n_rows, n_features, density=density, format="csr", random_state=rng, dtype=np.float64)
+    return normalize(mat)
+
+
+def old_rank(df: pd.DataFrame, scores: np.ndarray, idx: int, top_n: int):
+    order = np.argsort(-scores)
+    out = []
+    for i in order:
+        if int(i) == int(idx): continue
+        try:
+            title_i = str(df.iloc[int(i)]["title"])
+        except Exception: continue
+        out.append((title_i, float(scores[int(i)])))
+        if len(out) >= top_n: break
+    return out
+
+
+def new_rank(titles: np.ndarray, scores: np.ndarray, idx: int, top_n: int):
+    top = top_n_indices(scores, top_n, exclude=idx)
+    return list(zip(titles[top].tolist(), scores[top].tolist()))
+
+
+def time_it(fn, repeats: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - t0) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 45000, 200000])
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'old ms':>10} {'new ms':>10} {'speedup':>8}")
+    for n in args.sizes:
+        mat = synthetic_tfidf(n)
+        df = pd.DataFrame({"title": [f"Movie {i}" for i in range(n)]})
+        titles = df["title"].to_numpy(dtype=object)
+        idx = n // 2
+        scores = (mat @ mat[idx].T).toarray().ravel()
+
+        old = old_rank(df, scores, idx, args.top_n)
+        new = new_rank(titles, scores, idx, args.top_n)
+        assert [s for _, s in old] == [s for _, s in new], "ranking mismatch"
+
+        t_old = time_it(lambda: old_rank(df, scores, idx, args.top_n), args.repeats)
+        t_new = time_it(lambda: new_rank(titles, scores, idx, args.top_n), args.repeats)
+        print(f"{n:>10,} {t_old:>10.3f} {t_new:>10.3f} {t_old / t_new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
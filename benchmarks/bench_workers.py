@@ -0,0 +1,83 @@
+"""
+Resident memory per API worker: gzip pickles vs. the mmap artifact bundle.
+
+Starts N worker processes that each run main.load_pickles() and score a
+few queries (so the matrix pages are actually touched), then reports RSS
+and PSS from /proc/<pid>/smaps_rollup while all workers are alive. PSS
+splits shared pages between the processes mapping them, so it is the
+number that shows whether workers share one copy of the model.
+
+Usage (Linux only):
+    python benchmarks/bench_workers.py --workers 4 --mode bundle
+    python benchmarks/bench_workers.py --workers 4 --mode pickle
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def read_smaps_rollup(pid: int) -> dict:
+    out = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[-1] == "kB":
+                out[parts[0].rstrip(":")] = int(parts[1])
+    return out
+
+
+def worker(mode: str, artifacts_dir: str, queries: int, ready, done):
+    os.environ.setdefault("TMDB_API_KEY", "benchmark")
+    os.environ["ARTIFACTS_DIR"] = artifacts_dir if mode == "bundle" else os.path.join(ROOT, "__no_bundle__")
+    sys.path.insert(0, ROOT)
+    import main
+
+    main.load_pickles()
+    # go past the precomputed table so the live path touches the matrix
+    top_n = main.NEIGHBOR_IDX.shape[1] + 1 if main.NEIGHBOR_IDX is not None else 10
+    for t in main.TITLE_INDEX.keys[:queries]:
+        rows, _ = main.tfidf_recommend_rows(t, top_n=top_n)
+        main.TITLES[rows]
+    ready.put(os.getpid())
+    done.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--mode", choices=["bundle", "pickle"], default="bundle")
+    parser.add_argument("--artifacts", default=os.path.join(ROOT, "artifacts"))
+    parser.add_argument("--queries", type=int, default=50, help="queries each worker scores before measuring")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    ready, done = ctx.Queue(), ctx.Event()
+    procs = [
+        ctx.Process(target=worker, args=(args.mode, args.artifacts, args.queries, ready, done))
+        for _ in range(args.workers)
+    ]
+    for p in procs:
+        p.start()
+    pids = [ready.get(timeout=600) for _ in procs]
+
+    print(f"mode={args.mode} workers={args.workers}")
+    print(f"{'pid':>8} {'RSS MiB':>10} {'PSS MiB':>10} {'shared MiB':>11}")
+    tot_rss = tot_pss = 0
+    for pid in pids:
+        m = read_smaps_rollup(pid)
+        shared = m.get("Shared_Clean", 0) + m.get("Shared_Dirty", 0)
+        tot_rss += m["Rss"]
+        tot_pss += m["Pss"]
+        print(f"{pid:>8} {m['Rss'] / 1024:>10.1f} {m['Pss'] / 1024:>10.1f} {shared / 1024:>11.1f}")
+    print(f"{'total':>8} {tot_rss / 1024:>10.1f} {tot_pss / 1024:>10.1f}")
+
+    done.set()
+    for p in procs:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()
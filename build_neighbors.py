@@ -0,0 +1,69 @@
+"""
+Offline build step: precompute each movie's top-K TF-IDF neighbours.
+
+Writes two compact arrays next to the pickles that main.py serves from:
+    neighbors_idx.npy     int32   (n_movies, K)  row ids, best first
+    neighbors_scores.npy  float32 (n_movies, K)  cosine scores
+
+Usage:
+    python build_neighbors.py --k 50
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from artifacts import load_pickle_file, resolve_model_dir
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def build_neighbors(tfidf_matrix, k: int = 50, chunk_size: int = 1024):
+    n = tfidf_matrix.shape[0]
+    k = max(1, min(int(k), n - 1))
+    mat = tfidf_matrix.tocsr()
+    mat_t = mat.T.tocsc()
+
+    nbr_idx = np.full((n, k), -1, dtype=np.int32)
+    nbr_scores = np.zeros((n, k), dtype=np.float32)
+
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        block = (mat[start:stop] @ mat_t).toarray().astype(np.float32, copy=False)
+        rows = np.arange(stop - start)
+        # a movie is never its own neighbour
+        block[rows, rows + start] = -np.inf
+
+        part = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        part_scores = np.take_along_axis(block, part, axis=1)
+        order = np.argsort(-part_scores, axis=1, kind="stable")
+
+        nbr_idx[start:stop] = np.take_along_axis(part, order, axis=1)
+        nbr_scores[start:stop] = np.take_along_axis(part_scores, order, axis=1)
+
+    return nbr_idx, nbr_scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute top-K TF-IDF neighbours")
+    parser.add_argument("--k", type=int, default=50, help="neighbours stored per movie")
+    parser.add_argument("--chunk-size", type=int, default=1024, help="rows scored per block")
+    parser.add_argument("--dir", default=None, help="model directory (default: the one main.py serves)")
+    args = parser.parse_args()
+    model_dir = args.dir or resolve_model_dir(BASE_DIR)
+
+    t0 = time.perf_counter()
+    tfidf_matrix = load_pickle_file(os.path.join(model_dir, "tfidf_matrix.pkl"))
+    nbr_idx, nbr_scores = build_neighbors(tfidf_matrix, k=args.k, chunk_size=args.chunk_size)
+    np.save(os.path.join(model_dir, "neighbors_idx.npy"), nbr_idx)
+    np.save(os.path.join(model_dir, "neighbors_scores.npy"), nbr_scores)
+    print(
+        f"Wrote top-{nbr_idx.shape[1]} neighbours for {nbr_idx.shape[0]:,} movies "
+        f"in {time.perf_counter() - t0:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Shared fixtures: a small synthetic catalog built with model_build, the TMDB
+stub answering from it, and main.app served by TestClient against the stub.
+No TMDB key, network access or NLTK corpora are needed.
+"""
+import os
+
+import pandas as pd
+import pytest
+
+from filters import TMDB_GENRE_IDS
+
+# overview vocabulary and genres per topic, so neighbours stay within a topic
+TOPICS = [
+    ("starship galaxy alien planet orbit captain", ["Science Fiction", "Adventure"]),
+    ("detective murder heist gang police city", ["Crime", "Thriller"]),
+    ("romance wedding heart paris letters summer", ["Romance", "Drama"]),
+    ("haunted ghost curse night cellar scream", ["Horror"]),
+    ("family dog holiday school friends laugh", ["Comedy", "Family"]),
+]
+GENRE_ID_BY_NAME = {name: gid for gid, name in TMDB_GENRE_IDS.items()}
+CATALOG_ROWS = 200
+TMDB_CONCURRENCY = 4
+
+
+def catalog_frame(n_rows: int = CATALOG_ROWS) -> pd.DataFrame:
+    rows = []
+    for i in range(n_rows):
+        words, genres = TOPICS[i % len(TOPICS)]
+        vocab = words.split()
+        rows.append({
+            # every 7th movie has no TMDB id, so its card needs a TMDB title search
+            "id": "" if i % 7 == 3 else str(1000 + i),
+            "title": f"{vocab[0].title()} {vocab[1].title()} {i}",  # "Starship Galaxy 0", "Detective Murder 1", ...
+            "overview": " ".join(vocab[(i + k) % len(vocab)] for k in range(8)) + f" part{i % 3}",
+            "tagline": vocab[i % len(vocab)],
+            "genres": "[" + ", ".join(f"{{'id': {GENRE_ID_BY_NAME[g]}, 'name': '{g}'}}" for g in genres[: 1 + i % len(genres)]) + "]",
+            "vote_average": str(round(3 + (i * 37 % 70) / 10, 1)),
+            "vote_count": str(10 + i * 13 % 900),
+            "popularity": str(round(1 + (i * 53 % 400) / 10, 2)),
+            "poster_path": f"/p{i}.jpg" if i % 4 else "",
+            "release_date": f"{1960 + i % 60}-0{1 + i % 9}-1{i % 10}",
+        })
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture(scope="session")
+def catalog() -> pd.DataFrame:
+    return catalog_frame()
+
+
+@pytest.fixture(scope="session")
+def by_title(catalog) -> pd.DataFrame:
+    """Catalog indexed by title, with parsed genres, numeric ratings and years."""
+    import model_build
+
+    df = catalog.copy()
+    df["genres"] = df["genres"].map(model_build.parse_genres)
+    df["vote_average"] = pd.to_numeric(df["vote_average"])
+    df["year"] = df["release_date"].str[:4].astype(int)
+    return df.set_index("title")
+
+
+def rec_titles(response) -> list:
+    assert response.status_code == 200, response.text
+    return [item["title"] for item in response.json()]
+
+
+@pytest.fixture(scope="session")
+def model_dir(tmp_path_factory, catalog):
+    import model_build
+
+    out = tmp_path_factory.mktemp("model")
+    csv_path = out / "movies_metadata.csv"
+    catalog.to_csv(csv_path, index=False)
+    mp = pytest.MonkeyPatch()
+    # fit on the raw text: the NLTK cleaning step has its own data dependency
+    mp.setattr(model_build, "build_tags", lambda d: (d["overview"] + " " + d["genres"] + " " + d["tagline"]).str.lower().tolist())
+    try:
+        model_build.build(str(csv_path), str(out), incremental=False)
+    finally:
+        mp.undo()
+    return str(out)
+
+
+@pytest.fixture(scope="session")
+def stub(model_dir):
+    from tmdb_stub import StubCatalog, TMDBStub, start_in_thread
+
+    tmdb = TMDBStub(latency_ms=30, catalog=StubCatalog(model_dir))
+    url, stop = start_in_thread(tmdb)
+    tmdb.url = url
+    yield tmdb
+    stop()
+
+
+@pytest.fixture(scope="session")
+def api(model_dir, stub):
+    from fastapi.testclient import TestClient
+
+    os.environ.update({
+        "MODEL_DIR": model_dir,
+        "TMDB_BASE_URL": stub.url,
+        "TMDB_API_KEY": "test",
+        "TMDB_CONCURRENCY": str(TMDB_CONCURRENCY),
+        "POSTER_REFRESH_ENABLED": "0",
+    })
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
@@ -0,0 +1,167 @@
+"""
+Metadata filters for recommendation retrieval.
+
+Rating, popularity, release-year and genre constraints become one boolean
+row mask over the catalog. The engines apply it to the score vector before
+top-N selection, so a filtered query returns exactly top_n qualifying rows
+(when that many exist) instead of over-fetching and trimming afterwards.
+
+Per-row columns are built once at startup; genre membership is a uint64
+bitset per row (one bit per TMDB genre name), so a genre filter is a single
+vectorized AND. Only whole names match: "Fiction" is not "Science Fiction".
+Combined masks are cached per distinct filter.
+"""
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+_YEAR_RE = re.compile(r"^\s*(\d{4})")
+
+# TMDB's movie genre list; df.genres only keeps the names, space-joined
+TMDB_GENRES = (
+    "Action", "Adventure", "Animation", "Comedy", "Crime", "Documentary", "Drama",
+    "Family", "Fantasy", "Foreign", "History", "Horror", "Music", "Mystery",
+    "Romance", "Science Fiction", "TV Movie", "Thriller", "War", "Western",
+)
+TMDB_GENRE_IDS = {
+    28: "Action", 12: "Adventure", 16: "Animation", 35: "Comedy", 80: "Crime",
+    99: "Documentary", 18: "Drama", 10751: "Family", 14: "Fantasy", 10769: "Foreign",
+    36: "History", 27: "Horror", 10402: "Music", 9648: "Mystery", 10749: "Romance",
+    878: "Science Fiction", 10770: "TV Movie", 53: "Thriller", 10752: "War", 37: "Western",
+}
+
+
+# first token -> [(tokens, name)], longest names first so "TV Movie" wins over a bare "TV"
+_GENRES_BY_FIRST: Dict[str, List[Tuple[List[str], str]]] = {}
+for _name in sorted(TMDB_GENRES, key=lambda g: -len(g.split())):
+    _GENRES_BY_FIRST.setdefault(_name.lower().split()[0], []).append((_name.lower().split(), _name))
+
+
+def split_genres(text: Any) -> List[str]:
+    """'Science Fiction Drama' -> ['Science Fiction', 'Drama'] using the TMDB names."""
+    toks = str(text).lower().split() if isinstance(text, str) else []
+    out, i = [], 0
+    while i < len(toks):
+        for parts, name in _GENRES_BY_FIRST.get(toks[i], []):
+            if toks[i:i + len(parts)] == parts:
+                out.append(name)
+                i += len(parts)
+                break
+        else:
+            i += 1
+    return out
+
+
+def release_years(dates: Iterable[Any]) -> np.ndarray:
+    """'YYYY-MM-DD' (str or bytes) -> int16 year, 0 when missing or malformed."""
+    out = []
+    for d in dates:
+        if isinstance(d, bytes):
+            d = d.decode("ascii", errors="ignore")
+        m = _YEAR_RE.match(d) if isinstance(d, str) else None
+        out.append(int(m.group(1)) if m else 0)
+    return np.asarray(out, dtype=np.int16)
+
+
+def _genre_key(name: str) -> str:
+    return " ".join(str(name).lower().split())
+
+
+class CatalogFilters:
+    def __init__(
+        self,
+        vote_average: np.ndarray,
+        popularity: np.ndarray,
+        years: np.ndarray,
+        genres: Sequence[Any],
+        cache_size: int = 256,
+    ):
+        self.vote_average = np.asarray(vote_average, dtype=np.float32)
+        self.popularity = np.asarray(popularity, dtype=np.float32)
+        self.years = np.asarray(years, dtype=np.int16)
+        # normalised genre name -> bit; TMDB has 20 genres, well within 64 bits
+        self.genre_bit: Dict[str, int] = {}
+        bits = np.zeros(len(genres), dtype=np.uint64)
+        for i, g in enumerate(genres):
+            for name in split_genres(g):
+                key = _genre_key(name)
+                bit = self.genre_bit.get(key)
+                if bit is None:
+                    bit = self.genre_bit[key] = len(self.genre_bit)
+                bits[i] |= np.uint64(1 << bit)
+        self.genre_bits = bits
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple, Optional[np.ndarray]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.vote_average)
+
+    @property
+    def genre_names(self) -> List[str]:
+        return sorted(self.genre_bit)
+
+    def available_genres(self) -> List[str]:
+        return [g for g in TMDB_GENRES if self.known_genre(g)]
+
+    def year_range(self) -> Tuple[int, int]:
+        known = self.years[self.years > 0]
+        return (int(known.min()), int(known.max())) if len(known) else (0, 0)
+
+    def known_genre(self, name: str) -> bool:
+        """Whether name is a whole genre name present in the catalog (case-insensitive)."""
+        return _genre_key(name) in self.genre_bit
+
+    def genre_mask(self, genres: Sequence[str]) -> np.ndarray:
+        """Rows having any of the genres; names the catalog does not know match nothing."""
+        want = 0
+        for g in genres:
+            bit = self.genre_bit.get(_genre_key(g))
+            if bit is not None:
+                want |= 1 << bit
+        return (self.genre_bits & np.uint64(want)) != 0
+
+    def mask(
+        self,
+        min_rating: Optional[float] = None,
+        min_popularity: Optional[float] = None,
+        genres: Optional[Sequence[str]] = None,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+    ) -> Optional[np.ndarray]:
+        """Boolean row mask for the given constraints, or None when nothing is filtered.
+
+        Returned masks are cached and shared: treat them as read-only.
+        """
+        key = (
+            min_rating,
+            min_popularity,
+            tuple(sorted({_genre_key(g) for g in genres})) if genres else None,
+            year_from,
+            year_to,
+        )
+        if all(v is None for v in key):
+            return None
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        m = np.ones(len(self), dtype=bool)
+        if min_rating is not None:
+            m &= self.vote_average >= min_rating
+        if min_popularity is not None:
+            m &= self.popularity >= min_popularity
+        if year_from is not None:
+            m &= self.years >= year_from
+        if year_to is not None:
+            m &= (self.years <= year_to) & (self.years > 0)
+        if key[2]:
+            m &= self.genre_mask(key[2])
+        m.flags.writeable = False
+
+        self._cache[key] = m
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return m
@@ -1,15 +1,30 @@
+import asyncio
 import os
-import pickle
-from typing import Optional, List, Dict, Any, Tuple
+import re
+from time import perf_counter
+from typing import Optional, List, Dict, Any, Literal, Tuple
 
 import numpy as np
 import pandas as pd
+from scipy import sparse
+import scipy.sparse.linalg  # noqa: F401  (sparse.linalg.norm)
 import httpx
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
+from artifacts import ArtifactBundle, bundle_exists, load_bundle, load_pickle_file, resolve_model_dir
+from filters import TMDB_GENRE_IDS, CatalogFilters, release_years, split_genres
+from metrics import REGISTRY, MetricsMiddleware, record_timing, tfidf_stage, timed
+from movie_meta import load_movie_meta, save_movie_meta, set_poster_path
+from recommender import Recommender, RerankSettings
+from rerank import Reranker
+from similarity import DenseEngine, ExactEngine, IVFEngine, dense_exists, ivf_exists, load_dense, load_ivf
+from text_prep import load_nltk, preprocess_text
+from titles import TitleIndex
+from tmdb_cache import AsyncTTLCache
+
 
 # =========================
 # ENV
@@ -17,9 +32,40 @@ from dotenv import load_dotenv
 load_dotenv()
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
 
-TMDB_BASE = "https://api.themoviedb.org/3"
+TMDB_BASE = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3").rstrip("/")
 TMDB_IMG_500 = "https://image.tmdb.org/t/p/w500"
 
+# Shared TMDB connection pool
+TMDB_MAX_CONNECTIONS = int(os.getenv("TMDB_MAX_CONNECTIONS", "100"))
+TMDB_MAX_KEEPALIVE = int(os.getenv("TMDB_MAX_KEEPALIVE", "20"))
+TMDB_KEEPALIVE_EXPIRY = float(os.getenv("TMDB_KEEPALIVE_EXPIRY", "30"))
+TMDB_CONNECT_TIMEOUT = float(os.getenv("TMDB_CONNECT_TIMEOUT", "5"))
+TMDB_READ_TIMEOUT = float(os.getenv("TMDB_READ_TIMEOUT", "15"))
+TMDB_HTTP2 = os.getenv("TMDB_HTTP2", "0").lower() in {"1", "true", "yes"}
+# TMDB response cache (TTL seconds per endpoint, 0 disables caching for it)
+TMDB_CACHE_ENABLED = os.getenv("TMDB_CACHE_ENABLED", "1").lower() in {"1", "true", "yes"}
+TMDB_CACHE_MAX_ENTRIES = int(os.getenv("TMDB_CACHE_MAX_ENTRIES", "4096"))
+TMDB_CACHE_MAX_BYTES = int(os.getenv("TMDB_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+TMDB_CACHE_TTLS = {
+    "details": float(os.getenv("TMDB_CACHE_TTL_DETAILS", "86400")),
+    "search": float(os.getenv("TMDB_CACHE_TTL_SEARCH", "3600")),
+    "discover": float(os.getenv("TMDB_CACHE_TTL_DISCOVER", "3600")),
+    "feed": float(os.getenv("TMDB_CACHE_TTL_FEED", "600")),
+}
+TMDB_FEED_PATHS = {"/movie/popular", "/movie/top_rated", "/movie/upcoming", "/movie/now_playing"}
+
+# Max TMDB calls in flight per process, shared by every request and the poster refresh
+TMDB_CONCURRENCY = int(os.getenv("TMDB_CONCURRENCY", "16"))
+
+# Background job filling missing poster paths in movie_meta.npz. Opt-in; with
+# several workers only the one holding movie_meta.npz.lock runs it.
+POSTER_REFRESH_ENABLED = os.getenv("POSTER_REFRESH_ENABLED", "0").lower() in {"1", "true", "yes"}
+POSTER_REFRESH_BATCH = int(os.getenv("POSTER_REFRESH_BATCH", "40"))
+POSTER_REFRESH_INTERVAL = float(os.getenv("POSTER_REFRESH_INTERVAL", "10"))
+
+# Per-request stage durations in a Server-Timing response header (visible to any client)
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0").lower() in {"1", "true", "yes"}
+
 if not TMDB_API_KEY:
     raise RuntimeError("TMDB_API_KEY missing. Put it in .env as TMDB_API_KEY=xxxx")
 
@@ -35,7 +81,47 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
+)
+
+# =========================
+# METRICS (served at /metrics)
+# =========================
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "API request latency by route template and status", ("method", "route", "status")
 )
+TMDB_REQUEST_SECONDS = REGISTRY.histogram(
+    "tmdb_request_duration_seconds", "TMDB upstream call latency by path template and status", ("path", "status")
+)
+ARTIFACT_LOAD_SECONDS = REGISTRY.histogram(
+    "artifact_load_seconds", "Startup load time per model artifact", ("artifact",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+
+def tmdb_pool_state() -> Dict[Tuple[str, ...], float]:
+    # httpcore's pool behind the shared client; these are private attributes, hence the guards
+    pool = getattr(getattr(TMDB_CLIENT, "_transport", None), "_pool", None)
+    conns = list(getattr(pool, "connections", None) or [])
+    idle = sum(1 for c in conns if c.is_idle())
+    queued = sum(1 for r in list(getattr(pool, "_requests", None) or []) if r.is_queued())
+    return {("active",): len(conns) - idle, ("idle",): idle, ("queued",): queued}
+
+
+# callback metrics: read at scrape time, nothing on the request path
+REGISTRY.gauge("tmdb_cache_entries", "Entries in the TMDB response cache", fn=lambda: TMDB_CACHE.stats()["entries"])
+REGISTRY.gauge("tmdb_cache_bytes", "Payload bytes held by the TMDB response cache", fn=lambda: TMDB_CACHE.stats()["bytes"])
+REGISTRY.gauge("tmdb_cache_inflight", "TMDB fetches in flight behind the cache", fn=lambda: TMDB_CACHE.stats()["inflight"])
+REGISTRY.counter("tmdb_cache_lookups_total", "TMDB cache lookups by result", ("result",), fn=lambda: {
+    ("hit",): TMDB_CACHE.hits, ("miss",): TMDB_CACHE.misses, ("coalesced",): TMDB_CACHE.coalesced
+})
+REGISTRY.counter("tmdb_cache_evictions_total", "TMDB cache entries dropped for space or age", ("reason",), fn=lambda: {
+    ("lru",): TMDB_CACHE.evictions, ("expired",): TMDB_CACHE.expirations
+})
+REGISTRY.gauge("tmdb_pool_connections", "Connections of the shared TMDB client by state", ("state",), fn=tmdb_pool_state)
+REGISTRY.gauge("tmdb_pool_max_connections", "Pool size limit of the shared TMDB client", fn=lambda: TMDB_MAX_CONNECTIONS)
+
+app.add_middleware(MetricsMiddleware, histogram=HTTP_REQUEST_SECONDS, server_timing=SERVER_TIMING)
 
 
 # =========================
@@ -43,17 +129,74 @@ app.add_middleware(
 # =========================
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-DF_PATH = os.path.join(BASE_DIR, "df.pkl")
-INDICES_PATH = os.path.join(BASE_DIR, "indices.pkl")
-TFIDF_MATRIX_PATH = os.path.join(BASE_DIR, "tfidf_matrix.pkl")
-TFIDF_PATH = os.path.join(BASE_DIR, "tfidf.pkl")
+# MODEL_DIR env, else the current content-addressed set in model_cache/, else BASE_DIR
+MODEL_DIR = resolve_model_dir(BASE_DIR)
+
+DF_PATH = os.path.join(MODEL_DIR, "df.pkl")
+TFIDF_MATRIX_PATH = os.path.join(MODEL_DIR, "tfidf_matrix.pkl")
+TFIDF_PATH = os.path.join(MODEL_DIR, "tfidf.pkl")
+NEIGHBORS_IDX_PATH = os.path.join(MODEL_DIR, "neighbors_idx.npy")
+NEIGHBORS_SCORES_PATH = os.path.join(MODEL_DIR, "neighbors_scores.npy")
+MOVIE_META_PATH = os.path.join(MODEL_DIR, "movie_meta.npz")
+# Preferred over the pickles when present (build with: python artifacts.py)
+ARTIFACTS_DIR = os.getenv("ARTIFACTS_DIR", os.path.join(MODEL_DIR, "artifacts"))
+# df columns the API needs; long text columns stay on disk
+API_DF_COLUMNS = ["title", "genres", "vote_average", "popularity", "vote_count"]
+# Open bundle arrays read-only via mmap so uvicorn/gunicorn workers share one copy
+SERVE_MMAP = os.getenv("SERVE_MMAP", "1").lower() in {"1", "true", "yes"}
+# Similarity backend for live scoring: "exact" (brute-force cosine), "ivf"
+# (approximate, built with: python similarity.py) or "dense" (low-rank SVD
+# embeddings, built with: python similarity.py --kind dense)
+SIMILARITY_ENGINE = os.getenv("SIMILARITY_ENGINE", "exact").lower()
+ANN_DIR = os.getenv("ANN_DIR", os.path.join(MODEL_DIR, "ann"))
+DENSE_DIR = os.getenv("DENSE_DIR", os.path.join(MODEL_DIR, "dense"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+ANN_RERANK = int(os.getenv("ANN_RERANK", "400"))  # 0 returns embedding scores without exact re-rank
+
+# Hybrid re-ranking of the top RERANK_CANDIDATES by similarity, log-popularity and
+# Bayesian rating, with optional MMR diversity (lambda < 1). Default: pure similarity.
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "100"))
+RERANK_WEIGHTS = {
+    "similarity": float(os.getenv("RERANK_W_SIM", "1")),
+    "popularity": float(os.getenv("RERANK_W_POP", "0")),
+    "rating": float(os.getenv("RERANK_W_RATING", "0")),
+}
+RERANK_MMR_LAMBDA = float(os.getenv("RERANK_MMR_LAMBDA", "1"))
+# Memory for one dense (queries x movies) score block when batch endpoints score
+# a chunk of queries at once; the chunk size follows from it and the catalog size
+SCORE_BLOCK_BYTES = int(float(os.getenv("SCORE_BLOCK_MB", "64")) * 1024 * 1024)
+# Movies kept per genre for /recommend/genre, ranked by the popularity/rating prior
+GENRE_CANDIDATES = int(os.getenv("GENRE_CANDIDATES", "200"))
 
 df: Optional[pd.DataFrame] = None
-indices_obj: Any = None
 tfidf_matrix: Any = None
 tfidf_obj: Any = None
-
-TITLE_TO_IDX: Optional[Dict[str, int]] = None
+BUNDLE: Optional[ArtifactBundle] = None
+
+TITLES: Any = None  # ndarray of str, or an mmap-backed artifacts.StringColumn
+TITLE_INDEX: Optional[TitleIndex] = None  # normalised title -> every edition; prefix + trigram search
+RECOMMENDER: Optional[Recommender] = None  # shared with app.py; the globals below are its parts
+FILTERS: Optional[CatalogFilters] = None  # rating/popularity/year/genre masks
+RERANKER: Optional[Reranker] = None
+GENRE_ROWS: Dict[str, np.ndarray] = {}  # genre name -> rows, best prior first
+TEXT_COLUMNS: Dict[str, Any] = {}  # bundle string columns opened on first use (overview, ...)
+TEXT_PREP_READY = False  # NLTK corpora found at startup; free-text queries answer 503 otherwise
+
+TMDB_CLIENT: Optional[httpx.AsyncClient] = None
+TMDB_LIMIT: Optional[asyncio.Semaphore] = None  # created with TMDB_CLIENT, on its event loop
+TMDB_CACHE = AsyncTTLCache(max_entries=TMDB_CACHE_MAX_ENTRIES, max_bytes=TMDB_CACHE_MAX_BYTES)
+
+# Optional top-K neighbour table built offline by build_neighbors.py
+NEIGHBOR_IDX: Optional[np.ndarray] = None
+NEIGHBOR_SCORES: Optional[np.ndarray] = None
+
+# Optional row-aligned TMDB id/poster table written by app.py's build_model
+MOVIE_META: Optional[Dict[str, np.ndarray]] = None
+# tmdb_id -> row lookup over MOVIE_META: sorted ids and their rows
+TMDB_IDS_SORTED: Optional[np.ndarray] = None
+TMDB_ID_ROWS: Optional[np.ndarray] = None
+POSTER_REFRESH_TASK: Optional[asyncio.Task] = None
+POSTER_REFRESH_LOCK: Any = None  # open lock file while this process owns the refresh
 
 
 # =========================
@@ -83,6 +226,92 @@ class TFIDFRecItem(BaseModel):
     tmdb: Optional[TMDBMovieCard] = None
 
 
+class TitleEdition(BaseModel):
+    title: str
+    year: Optional[int] = None
+    tmdb_id: Optional[int] = None
+
+
+class TitleSuggestion(TitleEdition):
+    score: float
+    match: str  # "prefix" or "fuzzy"
+
+
+class RecFilters(BaseModel):
+    min_rating: Optional[float] = None
+    min_popularity: Optional[float] = None
+    # any of these genres, e.g. ["Drama", "Science Fiction"]
+    genres: Optional[List[str]] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+
+
+class RerankParams(BaseModel):
+    # unset fields keep the RERANK_* defaults
+    w_sim: Optional[float] = None
+    w_pop: Optional[float] = None
+    w_rating: Optional[float] = None
+    mmr_lambda: Optional[float] = None
+
+
+class TFIDFBatchRequest(BaseModel):
+    titles: List[str]
+    top_n: int = 10
+    filters: Optional[RecFilters] = None
+    rerank: Optional[RerankParams] = None
+    mode: Literal["per_title", "profile"] = "per_title"
+    # profile mode only: per-seed weights (e.g. ratings), default equal weights
+    weights: Optional[List[float]] = None
+
+
+class TFIDFBatchItem(BaseModel):
+    title: str
+    found: bool
+    results: List[TFIDFRecItem] = []
+
+
+class TFIDFBatchResponse(BaseModel):
+    mode: str
+    items: List[TFIDFBatchItem] = []
+    profile: List[TFIDFRecItem] = []
+    missing: List[str] = []
+
+
+class TextQueryBatchRequest(BaseModel):
+    queries: List[str]
+    top_n: int = 10
+    filters: Optional[RecFilters] = None
+    rerank: Optional[RerankParams] = None
+
+
+class TextQueryResult(BaseModel):
+    query: str
+    results: List[TFIDFRecItem]
+
+
+class MovieSummary(TitleEdition):
+    genres: str = ""
+    vote_average: float = 0.0
+    overview: str = ""
+
+
+class SimilarItem(MovieSummary):
+    score: float
+
+
+class SimilarResponse(BaseModel):
+    movie: MovieSummary
+    results: List[SimilarItem]
+
+
+class CatalogInfo(BaseModel):
+    movies: int
+    features: int
+    avg_rating: float
+    genres: List[str]
+    year_range: Tuple[int, int]
+
+
 class SearchBundleResponse(BaseModel):
     query: str
     movie_details: TMDBMovieDetails
@@ -93,8 +322,7 @@ class SearchBundleResponse(BaseModel):
 # =========================
 # UTILS
 # =========================
-def _norm_title(t: str) -> str:
-    return str(t).strip().lower()
+_TMDB_ID_RE = re.compile(r"/\d+(?=/|$)")
 
 
 def make_img_url(path: Optional[str]) -> Optional[str]:
@@ -103,33 +331,103 @@ def make_img_url(path: Optional[str]) -> Optional[str]:
     return f"{TMDB_IMG_500}{path}"
 
 
+def build_tmdb_client() -> httpx.AsyncClient:
+    http2 = TMDB_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            print("WARNING: TMDB_HTTP2 set but 'h2' is not installed (pip install httpx[http2]), using HTTP/1.1")
+            http2 = False
+    return httpx.AsyncClient(
+        base_url=TMDB_BASE,
+        http2=http2,
+        timeout=httpx.Timeout(TMDB_READ_TIMEOUT, connect=TMDB_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=TMDB_MAX_CONNECTIONS,
+            max_keepalive_connections=TMDB_MAX_KEEPALIVE,
+            keepalive_expiry=TMDB_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def get_tmdb_client() -> httpx.AsyncClient:
+    global TMDB_CLIENT, TMDB_LIMIT
+    if TMDB_CLIENT is None or TMDB_CLIENT.is_closed:
+        TMDB_CLIENT = build_tmdb_client()
+        TMDB_LIMIT = asyncio.Semaphore(TMDB_CONCURRENCY)
+    return TMDB_CLIENT
+
+
+def tmdb_cache_ttl(path: str) -> float:
+    if path in TMDB_FEED_PATHS or path.startswith("/trending"):
+        return TMDB_CACHE_TTLS["feed"]
+    if path.startswith("/search"):
+        return TMDB_CACHE_TTLS["search"]
+    if path.startswith("/discover"):
+        return TMDB_CACHE_TTLS["discover"]
+    if path.startswith("/movie/"):
+        return TMDB_CACHE_TTLS["details"]
+    return 0.0
+
+
+def tmdb_cache_key(path: str, params: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    norm = []
+    for k, v in params.items():
+        v = str(v).strip()
+        if k == "query":
+            v = " ".join(v.lower().split())
+        norm.append((k, v))
+    return path, tuple(sorted(norm))
+
+
 async def tmdb_get(path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    ttl = tmdb_cache_ttl(path) if TMDB_CACHE_ENABLED else 0.0
+    if ttl <= 0:
+        data, _ = await tmdb_fetch(path, params)
+        return data
+    return await TMDB_CACHE.get_or_fetch(
+        tmdb_cache_key(path, params), ttl, lambda: tmdb_fetch(path, params)
+    )
+
+
+def tmdb_path_template(path: str) -> str:
+    # "/movie/550/credits" -> "/movie/{id}/credits": ids must not become label values
+    return _TMDB_ID_RE.sub("/{id}", path)
+
+
+def observe_tmdb_call(path: str, status: str, seconds: float) -> None:
+    TMDB_REQUEST_SECONDS.observe(seconds, tmdb_path_template(path), status)
+    record_timing("tmdb", seconds)
+
+
+async def tmdb_fetch(path: str, params: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
     q = dict(params)
     q["api_key"] = TMDB_API_KEY
-    url = f"{TMDB_BASE}{path}"
-
-    async def _make_request():
-        async with httpx.AsyncClient(timeout=30) as client:
-            return await client.get(url, params=q)
+    client = get_tmdb_client()
 
-    try:
+    async with TMDB_LIMIT:
+        start = perf_counter()
         try:
-            r = await _make_request()
-        except (httpx.ConnectError, httpx.ConnectTimeout):
-            r = await _make_request()
-            
-    except httpx.RequestError as e:
-        raise HTTPException(
-            status_code=502,
-            detail=f"TMDB request error: {type(e).__name__} | {repr(e)}",
-        )
+            try:
+                r = await client.get(path, params=q)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                r = await client.get(path, params=q)
+
+        except httpx.RequestError as e:
+            observe_tmdb_call(path, type(e).__name__, perf_counter() - start)
+            raise HTTPException(
+                status_code=502,
+                detail=f"TMDB request error: {type(e).__name__} | {repr(e)}",
+            )
+        observe_tmdb_call(path, str(r.status_code), perf_counter() - start)
 
     if r.status_code != 200:
         raise HTTPException(
             status_code=502, detail=f"TMDB error {r.status_code}: {r.text}"
         )
 
-    return r.json()
+    return r.json(), len(r.content)
 
 
 async def tmdb_cards_from_results(
@@ -183,49 +481,196 @@ async def tmdb_search_first(query: str) -> Optional[dict]:
 # =========================
 # TF-IDF Helpers
 # =========================
-def build_title_to_idx_map(indices: Any) -> Dict[str, int]:
-    title_to_idx: Dict[str, int] = {}
-    if isinstance(indices, dict):
-        for k, v in indices.items():
-            title_to_idx[_norm_title(k)] = int(v)
-        return title_to_idx
-    try:
-        for k, v in indices.items():
-            title_to_idx[_norm_title(k)] = int(v)
-        return title_to_idx
-    except Exception:
-        raise RuntimeError("indices.pkl must be dict or pandas Series-like")
+def find_local_idx(title: str, year: Optional[int] = None, tmdb_id: Optional[int] = None) -> Optional[int]:
+    # a TMDB id the catalog knows names the edition outright; otherwise title (+ year)
+    row = row_for_tmdb_id(tmdb_id) if tmdb_id is not None else None
+    return row if row is not None else RECOMMENDER.find(title, year)
 
 
-def get_local_idx_by_title(title: str) -> int:
-    global TITLE_TO_IDX
-    if TITLE_TO_IDX is None:
+def get_local_idx_by_title(title: str, year: Optional[int] = None, tmdb_id: Optional[int] = None) -> int:
+    if RECOMMENDER is None:
         raise HTTPException(status_code=500, detail="TF-IDF index map not initialized")
-    key = _norm_title(title)
-    if key in TITLE_TO_IDX:
-        return int(TITLE_TO_IDX[key])
-    raise HTTPException(status_code=404, detail=f"Title not found: '{title}'")
+    idx = find_local_idx(title, year, tmdb_id)
+    if idx is not None:
+        return int(idx)
+    raise HTTPException(status_code=404, detail=f"Title not found: '{title}'" + (f" ({year})" if year else ""))
+
+
+def title_edition(row: int) -> Dict[str, Any]:
+    year = int(FILTERS.years[row]) if FILTERS is not None else 0
+    tmdb_id = int(MOVIE_META["tmdb_id"][row]) if MOVIE_META is not None else 0
+    return {"title": str(TITLES[row]), "year": year or None, "tmdb_id": tmdb_id if tmdb_id > 0 else None}
+
+
+def catalog_text(row: int, column: str) -> str:
+    # long text columns are not in the API df; read them from the (mmap) bundle
+    if column in df.columns:
+        value = df[column].iat[row]
+    elif BUNDLE is not None and column in BUNDLE.column_names:
+        if column not in TEXT_COLUMNS:
+            TEXT_COLUMNS[column] = BUNDLE.str_column(column)
+        value = TEXT_COLUMNS[column][row]
+    else:
+        return ""
+    return value if isinstance(value, str) else ""
+
+
+def movie_summary(row: int) -> Dict[str, Any]:
+    return {
+        **title_edition(row),
+        "genres": str(df["genres"].iat[row]),
+        "vote_average": float(df["vote_average"].iat[row]),
+        "overview": catalog_text(row, "overview"),
+    }
+
+
+def rec_filters(
+    min_rating: Optional[float] = Query(None, ge=0, le=10),
+    min_popularity: Optional[float] = Query(None, ge=0),
+    genre: Optional[List[str]] = Query(None),
+    year_from: Optional[int] = Query(None, ge=1800, le=2100),
+    year_to: Optional[int] = Query(None, ge=1800, le=2100),
+) -> RecFilters:
+    return RecFilters(min_rating=min_rating, min_popularity=min_popularity, genres=genre, year_from=year_from, year_to=year_to)
+
+
+def filter_mask(f: Optional[RecFilters]) -> Optional[np.ndarray]:
+    if f is None or FILTERS is None:
+        return None
+    if f.genres:
+        unknown = [g for g in f.genres if not FILTERS.known_genre(g)]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown genre(s): {', '.join(unknown)}")
+    return FILTERS.mask(f.min_rating, f.min_popularity, f.genres, f.year_from, f.year_to)
+
+
+def rerank_params(
+    w_sim: Optional[float] = Query(None, ge=0),
+    w_pop: Optional[float] = Query(None, ge=0),
+    w_rating: Optional[float] = Query(None, ge=0),
+    mmr_lambda: Optional[float] = Query(None, ge=0, le=1),
+) -> RerankParams:
+    return RerankParams(w_sim=w_sim, w_pop=w_pop, w_rating=w_rating, mmr_lambda=mmr_lambda)
+
+
+def rerank_settings(p: Optional[RerankParams]) -> Optional[RerankSettings]:
+    # None keeps pure similarity ranking
+    if RECOMMENDER is None or p is None:
+        return None
+    return RECOMMENDER.rerank_settings({"similarity": p.w_sim, "popularity": p.w_pop, "rating": p.w_rating}, p.mmr_lambda)
+
+
+def retrieve(qm: Any, top_n: int, exclude: Any = None, allow: Optional[np.ndarray] = None, rerank: Optional[RerankParams] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+    return RECOMMENDER.retrieve(qm, top_n, exclude=exclude, allow=allow, rerank=rerank_settings(rerank))
+
+
+def score_chunk_rows(limit: int) -> int:
+    # float64 scores per query row: 45k movies -> ~180 rows per 64 MB, 2M movies -> 4
+    return max(1, min(limit, SCORE_BLOCK_BYTES // (8 * tfidf_matrix.shape[0])))
+
+
+def tfidf_recommend_batch(titles: List[str], top_n: int = 10, chunk_size: Optional[int] = None, allow: Optional[np.ndarray] = None, rerank: Optional[RerankParams] = None) -> List[Optional[List[Tuple[str, float]]]]:
+    if tfidf_matrix is None:
+        raise HTTPException(status_code=500, detail="TF-IDF resources not loaded")
+    chunk_size = chunk_size or score_chunk_rows(256)
+    seeds = [find_local_idx(t) for t in titles]
+    out: List[Optional[List[Tuple[str, float]]]] = [None] * len(titles)
+    found = [i for i, idx in enumerate(seeds) if idx is not None]
+    for start in range(0, len(found), chunk_size):
+        pos = found[start:start + chunk_size]
+        idxs = np.array([seeds[i] for i in pos], dtype=np.int64)
+        results = retrieve(tfidf_matrix[idxs], top_n, exclude=idxs[:, None], allow=allow, rerank=rerank)
+        with tfidf_stage("build"):
+            for p, (r, sc) in zip(pos, results):
+                out[p] = list(zip(TITLES[r].tolist(), sc.tolist()))
+    return out
 
 
-def tfidf_recommend_titles(query_title: str, top_n: int = 10) -> List[Tuple[str, float]]:
+def tfidf_profile_recommend(titles: List[str], top_n: int = 10, weights: Optional[List[float]] = None, allow: Optional[np.ndarray] = None, rerank: Optional[RerankParams] = None) -> Tuple[List[Tuple[str, float]], List[str]]:
+    if tfidf_matrix is None:
+        raise HTTPException(status_code=500, detail="TF-IDF resources not loaded")
+    if weights is not None and len(weights) != len(titles):
+        raise HTTPException(status_code=400, detail="weights must have one entry per title")
+    w = np.ones(len(titles)) if weights is None else np.asarray(weights, dtype=np.float64)
+    seeds, seed_w, missing = [], [], []
+    for t, wi in zip(titles, w):
+        idx = find_local_idx(t)
+        if idx is None:
+            missing.append(t)
+        elif wi != 0:
+            seeds.append(idx)
+            seed_w.append(wi)
+    if not seeds:
+        return [], missing
+    # weighted mean of the seed vectors, re-normalised so scores stay cosines
+    profile = sparse.csr_matrix(np.asarray(seed_w) / np.sum(np.abs(seed_w))) @ tfidf_matrix[seeds]
+    norm = sparse.linalg.norm(profile)
+    if norm > 0:
+        profile = profile / norm
+    top, scores = retrieve(profile, top_n, exclude=[seeds], allow=allow, rerank=rerank)[0]
+    with tfidf_stage("build"):
+        return list(zip(TITLES[top].tolist(), scores.tolist())), missing
+
+
+def tfidf_recommend_rows(query_title: str, top_n: int = 10, allow: Optional[np.ndarray] = None, rerank: Optional[RerankParams] = None, year: Optional[int] = None, tmdb_id: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
     global df, tfidf_matrix
     if df is None or tfidf_matrix is None:
         raise HTTPException(status_code=500, detail="TF-IDF resources not loaded")
-    idx = get_local_idx_by_title(query_title)
-    qv = tfidf_matrix[idx]
-    scores = (tfidf_matrix @ qv.T).toarray().ravel()
-    order = np.argsort(-scores)
-    out: List[Tuple[str, float]] = []
-    for i in order:
-        if int(i) == int(idx): continue
-        try:
-            title_i = str(df.iloc[int(i)]["title"])
-        except Exception: continue
-        out.append((title_i, float(scores[int(i)])))
-        if len(out) >= top_n: break
+    idx = get_local_idx_by_title(query_title, year, tmdb_id)
+    return RECOMMENDER.similar(idx, top_n, allow=allow, rerank=rerank_settings(rerank))
+
+
+def tfidf_recommend_titles(query_title: str, top_n: int = 10, allow: Optional[np.ndarray] = None, rerank: Optional[RerankParams] = None, year: Optional[int] = None, tmdb_id: Optional[int] = None) -> List[Tuple[str, float]]:
+    rows, scores = tfidf_recommend_rows(query_title, top_n=top_n, allow=allow, rerank=rerank, year=year, tmdb_id=tmdb_id)
+    with tfidf_stage("build"):
+        return list(zip(TITLES[rows].tolist(), scores.tolist()))
+
+
+def clean_query_text(text: str) -> str:
+    if not TEXT_PREP_READY:
+        raise HTTPException(status_code=503, detail="Text preprocessing unavailable: NLTK stopwords/wordnet data missing")
+    return preprocess_text(text)
+
+
+def text_recommend_batch(queries: List[str], top_n: int = 10, chunk_size: Optional[int] = None, allow: Optional[np.ndarray] = None, rerank: Optional[RerankParams] = None) -> List[List[Tuple[str, float]]]:
+    if tfidf_matrix is None:
+        raise HTTPException(status_code=500, detail="TF-IDF resources not loaded")
+    vectorizer = get_vectorizer()
+    chunk_size = chunk_size or score_chunk_rows(64)
+    out: List[List[Tuple[str, float]]] = []
+    for start in range(0, len(queries), chunk_size):
+        chunk = [clean_query_text(q) for q in queries[start:start + chunk_size]]
+        qm = vectorizer.transform(chunk)
+        empty = qm.getnnz(axis=1) == 0
+        results = retrieve(qm, top_n, allow=allow, rerank=rerank)
+        with tfidf_stage("build"):
+            for (r, sc), no_terms in zip(results, empty):
+                keep = sc > 0
+                out.append([] if no_terms else list(zip(TITLES[r[keep]].tolist(), sc[keep].tolist())))
     return out
 
 
+def text_recommend(query: str, top_n: int = 10, allow: Optional[np.ndarray] = None, rerank: Optional[RerankParams] = None) -> List[Tuple[str, float]]:
+    return text_recommend_batch([query], top_n=top_n, allow=allow, rerank=rerank)[0]
+
+
+def local_tmdb_card(row: int) -> Optional[TMDBMovieCard]:
+    if MOVIE_META is None:
+        return None
+    tmdb_id = int(MOVIE_META["tmdb_id"][row])
+    if tmdb_id <= 0:
+        return None
+    poster = MOVIE_META["poster_path"][row].decode()
+    release = MOVIE_META["release_date"][row].decode()
+    return TMDBMovieCard(
+        tmdb_id=tmdb_id,
+        title=str(TITLES[row]),
+        poster_url=make_img_url(poster),
+        release_date=release or None,
+        vote_average=round(float(MOVIE_META["vote_average"][row]), 3),
+    )
+
+
 async def attach_tmdb_card_by_title(title: str) -> Optional[TMDBMovieCard]:
     try:
         m = await tmdb_search_first(title)
@@ -240,38 +685,305 @@ async def attach_tmdb_card_by_title(title: str) -> Optional[TMDBMovieCard]:
     except Exception: return None
 
 
+async def attach_tmdb_cards_by_titles(titles: List[str]) -> List[Optional[TMDBMovieCard]]:
+    # tmdb_fetch bounds the calls in flight across all requests (TMDB_CONCURRENCY)
+    return await asyncio.gather(*(attach_tmdb_card_by_title(t) for t in titles))
+
+
+async def tmdb_genre_cards(genre_id: int, exclude_id: int, limit: int) -> List[TMDBMovieCard]:
+    discover = await tmdb_get("/discover/movie", {"with_genres": genre_id, "language": "en-US", "sort_by": "popularity.desc", "page": 1})
+    cards = await tmdb_cards_from_results(discover.get("results", []), limit=limit)
+    return [c for c in cards if c.tmdb_id != exclude_id]
+
+
+def row_for_tmdb_id(tmdb_id: int) -> Optional[int]:
+    if TMDB_IDS_SORTED is None:
+        return None
+    pos = int(np.searchsorted(TMDB_IDS_SORTED, tmdb_id))
+    if pos < len(TMDB_IDS_SORTED) and TMDB_IDS_SORTED[pos] == tmdb_id:
+        return int(TMDB_ID_ROWS[pos])
+    return None
+
+
+def local_genre_cards(genre: str, exclude_id: int, limit: int) -> Optional[List[TMDBMovieCard]]:
+    # None when the local catalog cannot answer (no metadata table or unknown genre)
+    rows = GENRE_ROWS.get(genre)
+    if rows is None or MOVIE_META is None:
+        return None
+    cards: List[TMDBMovieCard] = []
+    for r in rows:
+        card = local_tmdb_card(int(r))
+        if card is not None and card.tmdb_id != exclude_id:
+            cards.append(card)
+            if len(cards) >= limit:
+                break
+    return cards
+
+
+async def genre_cards(genre_id: int, exclude_id: int, limit: int) -> List[TMDBMovieCard]:
+    name = TMDB_GENRE_IDS.get(genre_id)
+    local = local_genre_cards(name, exclude_id, limit) if name else None
+    return local if local is not None else await tmdb_genre_cards(genre_id, exclude_id, limit)
+
+
+async def attach_tmdb_cards_for_rows(rows: np.ndarray) -> List[Optional[TMDBMovieCard]]:
+    # local metadata first, TMDB title search only for rows without a known id
+    cards = [local_tmdb_card(int(r)) for r in rows]
+    missing = [i for i, c in enumerate(cards) if c is None]
+    if missing:
+        fetched = await attach_tmdb_cards_by_titles([str(TITLES[rows[i]]) for i in missing])
+        for i, c in zip(missing, fetched):
+            cards[i] = c
+    return cards
+
+
+def discard_tasks(*tasks: Optional[asyncio.Task]) -> None:
+    """Cancel tasks still running and mark failed ones as retrieved."""
+    for task in tasks:
+        if task is None: continue
+        if not task.done(): task.cancel()
+        elif not task.cancelled(): task.exception()
+
+
+def tfidf_recommend_with_fallback(titles: List[str], top_n: int, allow: Optional[np.ndarray] = None, rerank: Optional[RerankParams] = None, tmdb_id: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    for t in titles:
+        try: return tfidf_recommend_rows(t, top_n=top_n, allow=allow, rerank=rerank, tmdb_id=tmdb_id)
+        except Exception: continue
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+
 # =========================
 # STARTUP: LOAD PICKLES (With Compression Support)
 # =========================
-def load_pickle_file(base_path: str):
-    gz_path = f"{base_path}.gz"
-    if os.path.exists(gz_path):
-        import gzip
-        with gzip.open(gz_path, "rb") as f:
-            return pickle.load(f)
-    elif os.path.exists(base_path):
-        with open(base_path, "rb") as f:
-            return pickle.load(f)
-    else:
-        raise FileNotFoundError(f"Neither {gz_path} nor {base_path} found.")
+def get_vectorizer() -> Any:
+    # the fitted TfidfVectorizer is only needed for free-text queries
+    global tfidf_obj
+    if tfidf_obj is None:
+        with timed(ARTIFACT_LOAD_SECONDS, "vectorizer", timing="vectorizer_load"):
+            tfidf_obj = BUNDLE.vectorizer if BUNDLE is not None else load_pickle_file(TFIDF_PATH)
+    return tfidf_obj
+
+
+def load_neighbors(n_rows: int) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    if not (os.path.exists(NEIGHBORS_IDX_PATH) and os.path.exists(NEIGHBORS_SCORES_PATH)):
+        print("INFO: No precomputed neighbours found, using live TF-IDF scoring")
+        return None, None
+    mmap_mode = "r" if SERVE_MMAP else None
+    nbr_idx = np.load(NEIGHBORS_IDX_PATH, mmap_mode=mmap_mode)
+    nbr_scores = np.load(NEIGHBORS_SCORES_PATH, mmap_mode=mmap_mode)
+    if nbr_idx.shape != nbr_scores.shape or nbr_idx.shape[0] != n_rows:
+        print("WARNING: Neighbour table does not match tfidf_matrix, ignoring it (rerun build_neighbors.py)")
+        return None, None
+    return nbr_idx, nbr_scores
+
+
+def load_similarity_engine(matrix: Any) -> Any:
+    if SIMILARITY_ENGINE in ("ivf", "dense"):
+        path, exists, load = (ANN_DIR, ivf_exists, load_ivf) if SIMILARITY_ENGINE == "ivf" else (DENSE_DIR, dense_exists, load_dense)
+        if not exists(path):
+            print(f"WARNING: SIMILARITY_ENGINE={SIMILARITY_ENGINE} but no index in {path}, using exact scoring (run similarity.py)")
+        else:
+            index = load(path, mmap=SERVE_MMAP)
+            if index["manifest"]["n_rows"] != matrix.shape[0] or index["manifest"]["n_features"] != matrix.shape[1]:
+                print(f"WARNING: {SIMILARITY_ENGINE} index does not match tfidf_matrix, using exact scoring (rerun similarity.py)")
+            elif SIMILARITY_ENGINE == "ivf":
+                return IVFEngine(index, matrix=matrix, nprobe=ANN_NPROBE, rerank=ANN_RERANK)
+            else:
+                return DenseEngine(index)
+    elif SIMILARITY_ENGINE != "exact":
+        print(f"WARNING: Unknown SIMILARITY_ENGINE '{SIMILARITY_ENGINE}', using exact scoring")
+    return ExactEngine(matrix)
+
+
+def load_release_years() -> Optional[np.ndarray]:
+    if MOVIE_META is not None:
+        return release_years(MOVIE_META["release_date"])
+    if "release_date" in df.columns:
+        return release_years(df["release_date"])
+    if BUNDLE is not None and "release_date" in BUNDLE.column_names:
+        return release_years(BUNDLE.column("release_date"))
+    return None
+
+
+def load_recommender() -> Recommender:
+    return Recommender(
+        df,
+        tfidf_matrix,
+        titles=TITLES,
+        years=load_release_years(),
+        engine=load_similarity_engine(tfidf_matrix),
+        neighbors=(NEIGHBOR_IDX, NEIGHBOR_SCORES),
+        rerank_weights=RERANK_WEIGHTS,
+        mmr_lambda=RERANK_MMR_LAMBDA,
+        rerank_candidates=RERANK_CANDIDATES,
+    )
+
+
+def build_genre_rows() -> Dict[str, np.ndarray]:
+    order = np.argsort(-RERANKER.prior(), kind="stable")
+    return {g: order[FILTERS.genre_mask([g])[order]][:GENRE_CANDIDATES] for g in FILTERS.available_genres()}
+
+
+def build_tmdb_id_lookup() -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    if MOVIE_META is None:
+        return None, None
+    ids = MOVIE_META["tmdb_id"]
+    order = np.argsort(ids, kind="stable")
+    order = order[ids[order] > 0]
+    return ids[order], order.astype(np.int32)
+
+
+def load_local_meta(n_rows: int) -> Optional[Dict[str, np.ndarray]]:
+    if not os.path.exists(MOVIE_META_PATH):
+        print("INFO: No movie_meta.npz found, recommendation cards use TMDB title search")
+        return None
+    meta = load_movie_meta(MOVIE_META_PATH)
+    if len(meta["tmdb_id"]) != n_rows:
+        print("WARNING: movie_meta.npz does not match df.pkl, ignoring it (rebuild the model)")
+        return None
+    return meta
 
 
 @app.on_event("startup")
 def load_pickles():
-    global df, indices_obj, tfidf_matrix, tfidf_obj, TITLE_TO_IDX
+    global df, tfidf_matrix, tfidf_obj, BUNDLE, TITLES, RECOMMENDER, TITLE_INDEX, FILTERS, RERANKER, GENRE_ROWS
+    global NEIGHBOR_IDX, NEIGHBOR_SCORES, MOVIE_META, TMDB_IDS_SORTED, TMDB_ID_ROWS
     try:
-        df = load_pickle_file(DF_PATH)
-        indices_obj = load_pickle_file(INDICES_PATH)
-        tfidf_matrix = load_pickle_file(TFIDF_MATRIX_PATH)
-        tfidf_obj = load_pickle_file(TFIDF_PATH)
-        TITLE_TO_IDX = build_title_to_idx_map(indices_obj)
-        if df is None or "title" not in df.columns:
-            raise RuntimeError("df.pkl must contain a DataFrame with a 'title' column")
+        if bundle_exists(ARTIFACTS_DIR):
+            with ARTIFACT_LOAD_SECONDS.time("bundle"):
+                BUNDLE = load_bundle(ARTIFACTS_DIR, mmap=SERVE_MMAP)
+            with ARTIFACT_LOAD_SECONDS.time("tfidf_matrix"):
+                tfidf_matrix = BUNDLE.tfidf_matrix()
+            with ARTIFACT_LOAD_SECONDS.time("df"):
+                if SERVE_MMAP:
+                    # titles stay in the shared mapping and are decoded per lookup
+                    TITLES = BUNDLE.str_column("title")
+                    df = BUNDLE.dataframe([c for c in API_DF_COLUMNS if c != "title"])
+                else:
+                    df = BUNDLE.dataframe(API_DF_COLUMNS)
+                    TITLES = df["title"].astype(str).to_numpy(dtype=object)
+        else:
+            with ARTIFACT_LOAD_SECONDS.time("df"):
+                df = load_pickle_file(DF_PATH)
+            with ARTIFACT_LOAD_SECONDS.time("tfidf_matrix"):
+                tfidf_matrix = load_pickle_file(TFIDF_MATRIX_PATH)
+            if df is None or "title" not in df.columns:
+                raise RuntimeError("df.pkl must contain a DataFrame with a 'title' column")
+            TITLES = df["title"].astype(str).to_numpy(dtype=object)
+        tfidf_obj = None
+        with ARTIFACT_LOAD_SECONDS.time("neighbors"):
+            NEIGHBOR_IDX, NEIGHBOR_SCORES = load_neighbors(tfidf_matrix.shape[0])
+        with ARTIFACT_LOAD_SECONDS.time("movie_meta"):
+            MOVIE_META = load_local_meta(len(TITLES))
+        # titles resolve through TitleIndex over every row; indices.pkl keeps one edition per title and is not loaded
+        with ARTIFACT_LOAD_SECONDS.time("recommender"):
+            RECOMMENDER = load_recommender()
+        FILTERS, TITLE_INDEX, RERANKER = RECOMMENDER.filters, RECOMMENDER.title_index, RECOMMENDER.reranker
+        with ARTIFACT_LOAD_SECONDS.time("genre_rows"):
+            GENRE_ROWS = build_genre_rows()
+        TMDB_IDS_SORTED, TMDB_ID_ROWS = build_tmdb_id_lookup()
     except Exception as e:
         print(f"CRITICAL: Failed to load data files: {e}")
         raise e
 
 
+@app.on_event("startup")
+def load_text_prep():
+    # corpora are installed at build time; a request never downloads them
+    global TEXT_PREP_READY
+    try:
+        load_nltk()
+        TEXT_PREP_READY = True
+    except LookupError:
+        print("WARNING: NLTK stopwords/wordnet data missing, /recommend/text will answer 503 "
+              "(install with: python -m nltk.downloader stopwords wordnet)")
+
+
+@app.on_event("startup")
+async def open_tmdb_client():
+    get_tmdb_client()
+
+
+async def refresh_missing_posters():
+    tried = np.zeros(len(MOVIE_META["tmdb_id"]), dtype=bool)
+
+    async def _poster(tmdb_id: int) -> Optional[str]:
+        data, _ = await tmdb_fetch(f"/movie/{tmdb_id}", {"language": "en-US"})
+        return data.get("poster_path")
+
+    while True:
+        todo = np.flatnonzero((MOVIE_META["tmdb_id"] > 0) & (MOVIE_META["poster_path"] == b"") & ~tried)
+        todo = todo[:POSTER_REFRESH_BATCH]
+        if len(todo) == 0:
+            return
+        tried[todo] = True
+        found = await asyncio.gather(
+            *(_poster(int(MOVIE_META["tmdb_id"][r])) for r in todo), return_exceptions=True
+        )
+        updated = 0
+        for row, path in zip(todo, found):
+            if isinstance(path, str) and path:
+                set_poster_path(MOVIE_META, int(row), path)
+                updated += 1
+        if updated:
+            snapshot = dict(MOVIE_META)
+            await asyncio.to_thread(save_movie_meta, snapshot, MOVIE_META_PATH)
+        await asyncio.sleep(POSTER_REFRESH_INTERVAL)
+
+
+def try_lock_file(path: str) -> Any:
+    """Open path and take a non-blocking exclusive lock on it; None if another process holds it.
+
+    The OS drops the lock when the holder exits, so a crashed worker never
+    leaves a stale lock behind.
+    """
+    f = open(path, "a+b")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def log_poster_refresh_exit(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        e = task.exception()
+        print(f"WARNING: Poster refresh stopped: {type(e).__name__}: {e}")
+
+
+@app.on_event("startup")
+async def start_poster_refresh():
+    global POSTER_REFRESH_TASK, POSTER_REFRESH_LOCK
+    if not POSTER_REFRESH_ENABLED or MOVIE_META is None:
+        return
+    POSTER_REFRESH_LOCK = try_lock_file(f"{MOVIE_META_PATH}.lock")
+    if POSTER_REFRESH_LOCK is None:
+        print("INFO: Poster refresh already running in another worker")
+        return
+    POSTER_REFRESH_TASK = asyncio.create_task(refresh_missing_posters())
+    POSTER_REFRESH_TASK.add_done_callback(log_poster_refresh_exit)
+
+
+@app.on_event("shutdown")
+async def close_tmdb_client():
+    global TMDB_CLIENT, POSTER_REFRESH_TASK, POSTER_REFRESH_LOCK
+    if POSTER_REFRESH_TASK is not None:
+        POSTER_REFRESH_TASK.cancel()
+        POSTER_REFRESH_TASK = None
+    if POSTER_REFRESH_LOCK is not None:
+        POSTER_REFRESH_LOCK.close()
+        POSTER_REFRESH_LOCK = None
+    if TMDB_CLIENT is not None:
+        await TMDB_CLIENT.aclose()
+        TMDB_CLIENT = None
+
+
 # =========================
 # ROUTES
 # =========================
@@ -280,6 +992,16 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {"tmdb": TMDB_CACHE.stats()}
+
+
 @app.get("/home", response_model=List[TMDBMovieCard])
 async def home(category: str = Query("popular"), limit: int = Query(24, ge=1, le=50)):
     try:
@@ -295,6 +1017,35 @@ async def home(category: str = Query("popular"), limit: int = Query(24, ge=1, le
         raise HTTPException(status_code=500, detail=f"Home route failed: {e}")
 
 
+@app.get("/catalog/info", response_model=CatalogInfo)
+def catalog_info():
+    if RECOMMENDER is None:
+        raise HTTPException(status_code=500, detail="TF-IDF resources not loaded")
+    return CatalogInfo(
+        movies=len(RECOMMENDER),
+        features=tfidf_matrix.shape[1],
+        avg_rating=float(df["vote_average"].mean()),
+        genres=FILTERS.available_genres(),
+        year_range=FILTERS.year_range(),
+    )
+
+
+@app.get("/titles/suggest", response_model=List[TitleSuggestion])
+def titles_suggest(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50)):
+    # local typeahead: prefix matches first, typo-tolerant trigram matches after
+    if TITLE_INDEX is None:
+        raise HTTPException(status_code=500, detail="Title index not loaded")
+    return [TitleSuggestion(**title_edition(row), score=score, match=match) for row, score, match in TITLE_INDEX.suggest(q, limit)]
+
+
+@app.get("/titles/editions", response_model=List[TitleEdition])
+def titles_editions(title: str = Query(..., min_length=1)):
+    # every catalog row sharing this title; pass year or tmdb_id to /recommend/tfidf to pick one
+    if TITLE_INDEX is None:
+        raise HTTPException(status_code=500, detail="Title index not loaded")
+    return [TitleEdition(**title_edition(int(r))) for r in TITLE_INDEX.editions(title)]
+
+
 @app.get("/tmdb/search")
 async def tmdb_search(query: str = Query(..., min_length=1), page: int = Query(1, ge=1, le=10)):
     return await tmdb_search_movies(query=query, page=page)
@@ -307,39 +1058,110 @@ async def movie_details_route(tmdb_id: int):
 
 @app.get("/recommend/genre", response_model=List[TMDBMovieCard])
 async def recommend_genre(tmdb_id: int = Query(...), limit: int = Query(18, ge=1, le=50)):
+    # served from the local catalog when it knows the movie; TMDB /discover otherwise
+    row = row_for_tmdb_id(tmdb_id)
+    genres = split_genres(df["genres"].iat[row]) if row is not None else []
+    local = local_genre_cards(genres[0], tmdb_id, limit) if genres else None
+    if local is not None:
+        return local
     details = await tmdb_movie_details(tmdb_id)
     if not details.genres: return []
-    genre_id = details.genres[0]["id"]
-    discover = await tmdb_get("/discover/movie", {"with_genres": genre_id, "language": "en-US", "sort_by": "popularity.desc", "page": 1})
-    cards = await tmdb_cards_from_results(discover.get("results", []), limit=limit)
-    return [c for c in cards if c.tmdb_id != tmdb_id]
+    return await genre_cards(details.genres[0]["id"], tmdb_id, limit)
 
 
 @app.get("/recommend/tfidf")
-async def recommend_tfidf(title: str = Query(..., min_length=1), top_n: int = Query(10, ge=1, le=50)):
-    recs = tfidf_recommend_titles(title, top_n=top_n)
+async def recommend_tfidf(
+    title: str = Query(..., min_length=1),
+    top_n: int = Query(10, ge=1, le=50),
+    year: Optional[int] = Query(None, ge=1800, le=2100, description="edition of a duplicate title"),
+    tmdb_id: Optional[int] = Query(None, description="edition by TMDB id, takes precedence over title"),
+    filters: RecFilters = Depends(rec_filters),
+    rerank: RerankParams = Depends(rerank_params),
+):
+    recs = tfidf_recommend_titles(title, top_n=top_n, allow=filter_mask(filters), rerank=rerank, year=year, tmdb_id=tmdb_id)
     return [{"title": t, "score": s} for t, s in recs]
 
 
+@app.get("/recommend/similar", response_model=SimilarResponse)
+def recommend_similar(
+    title: str = Query(..., min_length=1),
+    top_n: int = Query(10, ge=1, le=50),
+    year: Optional[int] = Query(None, ge=1800, le=2100),
+    tmdb_id: Optional[int] = Query(None),
+    filters: RecFilters = Depends(rec_filters),
+    rerank: RerankParams = Depends(rerank_params),
+):
+    # /recommend/tfidf plus the card fields the Streamlit client renders
+    idx = get_local_idx_by_title(title, year, tmdb_id)
+    rows, scores = RECOMMENDER.similar(idx, top_n, allow=filter_mask(filters), rerank=rerank_settings(rerank))
+    return SimilarResponse(
+        movie=MovieSummary(**movie_summary(idx)),
+        results=[SimilarItem(**movie_summary(r), score=s) for r, s in zip(rows.tolist(), scores.tolist())],
+    )
+
+
+@app.post("/recommend/tfidf/batch", response_model=TFIDFBatchResponse)
+def recommend_tfidf_batch(req: TFIDFBatchRequest):
+    if not req.titles or len(req.titles) > 1000:
+        raise HTTPException(status_code=400, detail="titles must contain 1-1000 items")
+    if not 1 <= req.top_n <= 50:
+        raise HTTPException(status_code=400, detail="top_n must be between 1 and 50")
+    allow = filter_mask(req.filters)
+    if req.mode == "profile":
+        recs, missing = tfidf_profile_recommend(req.titles, top_n=req.top_n, weights=req.weights, allow=allow, rerank=req.rerank)
+        return TFIDFBatchResponse(
+            mode=req.mode, profile=[TFIDFRecItem(title=t, score=s) for t, s in recs], missing=missing
+        )
+    results = tfidf_recommend_batch(req.titles, top_n=req.top_n, allow=allow, rerank=req.rerank)
+    items = [
+        TFIDFBatchItem(title=t, found=recs is not None, results=[TFIDFRecItem(title=rt, score=s) for rt, s in recs or []])
+        for t, recs in zip(req.titles, results)
+    ]
+    return TFIDFBatchResponse(mode=req.mode, items=items, missing=[i.title for i in items if not i.found])
+
+
+@app.get("/recommend/text", response_model=List[TFIDFRecItem])
+def recommend_text(q: str = Query(..., min_length=1), top_n: int = Query(10, ge=1, le=50), filters: RecFilters = Depends(rec_filters), rerank: RerankParams = Depends(rerank_params)):
+    return [TFIDFRecItem(title=t, score=s) for t, s in text_recommend(q, top_n=top_n, allow=filter_mask(filters), rerank=rerank)]
+
+
+@app.post("/recommend/text/batch", response_model=List[TextQueryResult])
+def recommend_text_batch(req: TextQueryBatchRequest):
+    if not req.queries or len(req.queries) > 500:
+        raise HTTPException(status_code=400, detail="queries must contain 1-500 items")
+    if not 1 <= req.top_n <= 50:
+        raise HTTPException(status_code=400, detail="top_n must be between 1 and 50")
+    results = text_recommend_batch(req.queries, top_n=req.top_n, allow=filter_mask(req.filters), rerank=req.rerank)
+    return [
+        TextQueryResult(query=q, results=[TFIDFRecItem(title=t, score=s) for t, s in recs])
+        for q, recs in zip(req.queries, results)
+    ]
+
+
 @app.get("/movie/search", response_model=SearchBundleResponse)
-async def search_bundle(query: str = Query(..., min_length=1), tfidf_top_n: int = Query(12, ge=1, le=30), genre_limit: int = Query(12, ge=1, le=30)):
+async def search_bundle(query: str = Query(..., min_length=1), tfidf_top_n: int = Query(12, ge=1, le=30), genre_limit: int = Query(12, ge=1, le=30), filters: RecFilters = Depends(rec_filters), rerank: RerankParams = Depends(rerank_params)):
+    allow = filter_mask(filters)
     best = await tmdb_search_first(query)
     if not best: raise HTTPException(status_code=404, detail=f"No movie found for: {query}")
     tmdb_id = int(best["id"])
-    details = await tmdb_movie_details(tmdb_id)
-    tfidf_items: List[TFIDFRecItem] = []
-    recs = []
-    try: recs = tfidf_recommend_titles(details.title, top_n=tfidf_top_n)
-    except Exception:
-        try: recs = tfidf_recommend_titles(query, top_n=tfidf_top_n)
-        except Exception: recs = []
-    for title, score in recs:
-        card = await attach_tmdb_card_by_title(title)
-        tfidf_items.append(TFIDFRecItem(title=title, score=score, tmdb=card))
-    genre_recs: List[TMDBMovieCard] = []
-    if details.genres:
-        genre_id = details.genres[0]["id"]
-        discover = await tmdb_get("/discover/movie", {"with_genres": genre_id, "language": "en-US", "sort_by": "popularity.desc", "page": 1})
-        cards = await tmdb_cards_from_results(discover.get("results", []), limit=genre_limit)
-        genre_recs = [c for c in cards if c.tmdb_id != details.tmdb_id]
+    # TF-IDF scoring, the details fetch and the genre discover call are independent
+    recs_task = asyncio.create_task(asyncio.to_thread(
+        tfidf_recommend_with_fallback, [best.get("title") or query, query], tfidf_top_n, allow, rerank, tmdb_id
+    ))
+    genre_task: Optional[asyncio.Task] = None
+    try:
+        details = await tmdb_movie_details(tmdb_id)
+        if details.genres:
+            genre_task = asyncio.create_task(genre_cards(details.genres[0]["id"], details.tmdb_id, genre_limit))
+        rows, scores = await recs_task
+        cards = await attach_tmdb_cards_for_rows(rows)
+        with tfidf_stage("build"):
+            tfidf_items = [
+                TFIDFRecItem(title=t, score=s, tmdb=c)
+                for t, s, c in zip(TITLES[rows].tolist(), scores.tolist(), cards)
+            ]
+        genre_recs: List[TMDBMovieCard] = await genre_task if genre_task else []
+    finally:
+        # a failed step must not leave the other fetches running unobserved
+        discard_tasks(recs_task, genre_task)
     return SearchBundleResponse(query=query, movie_details=details, tfidf_recommendations=tfidf_items, genre_recommendations=genre_recs)
@@ -0,0 +1,264 @@
+"""
+In-process metrics registry with Prometheus text exposition.
+
+Counters, gauges and fixed-bucket histograms keep their series in plain
+dicts behind one lock per metric. Recording a sample costs a dict lookup,
+a bisect and two additions, which is cheap enough for the scoring hot path.
+Counters and gauges can also be callbacks that are read at scrape time
+(cache sizes, connection pool state), so nothing polls in the background.
+`Registry.render()` produces the text format that `/metrics` serves. Tests
+can parse it directly, with no collector running.
+
+Per-request breakdown: `MetricsMiddleware` opens a timing scope for each
+request. The scope is a contextvar, so it follows the request into
+`asyncio.to_thread` and the sync-route threadpool. Each `timed(...)` block
+adds its duration to the scope. With `server_timing=True` the response then
+carries a header such as
+
+    Server-Timing: tmdb;dur=182.4, matmul;dur=3.1, select;dur=0.4, app;dur=190.2
+"""
+import math
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+# seconds; spans a sub-millisecond neighbour lookup up to a slow TMDB call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), fn: Optional[Callable[[], Any]] = None):
+        """fn, when given, is read at scrape time: a number, or {label values tuple: number}."""
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.fn = fn
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[LabelValues, float]:
+        if self.fn is None:
+            with self._lock:
+                return dict(self._values)
+        value = self.fn()
+        return value if isinstance(value, dict) else {(): value}
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labels, k)} {_number(v)}" for k, v in sorted(self._read().items())]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> per-bucket counts (last one is +Inf), then the sum
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)  # first bucket with value <= le
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def time(self, *labels: str) -> "timed":
+        return timed(self, *labels)
+
+    def snapshot(self, *labels: str) -> Tuple[int, float]:
+        """(count, sum) of one series; (0, 0.0) before its first observation."""
+        with self._lock:
+            series = self._series.get(labels)
+            return (int(sum(series[:-1])), series[-1]) if series else (0, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        out = []
+        for key, counts in sorted(series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                out.append(f"{self.name}_bucket{_labels(self.labels, key, [('le', _number(bound))])} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(counts[-1])}")
+            out.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> Any:
+        # re-registering a name returns the existing metric, so module reloads keep their series
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"metric {metric.name} already registered as a {existing.kind}")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = (), fn: Optional[Callable[[], Any]] = None) -> Counter:
+        return self.register(Counter(name, help, labels, fn))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (), fn: Optional[Callable[[], Any]] = None) -> Gauge:
+        return self.register(Gauge(name, help, labels, fn))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                samples = metric.samples()
+            except Exception:
+                continue  # a failing callback (e.g. client not open yet) drops only its own metric
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+TFIDF_STAGE_SECONDS = REGISTRY.histogram(
+    "tfidf_stage_seconds",
+    "TF-IDF recommendation time per scoring call and stage (matmul, select, rerank, build, ...)",
+    ("stage",),
+)
+
+
+# =========================
+# REQUEST TIMINGS
+# =========================
+# stage name -> seconds spent in the current request; None outside a request
+_TIMINGS: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def record_timing(name: str, seconds: float) -> None:
+    timings = _TIMINGS.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+class timed:
+    """Observe the block's duration on histogram and add it to the request's `timing` entry.
+
+    A class rather than a generator-based context manager: it sits on the
+    scoring path and costs about half as much per block.
+    """
+
+    __slots__ = ("histogram", "labels", "timing", "start")
+
+    def __init__(self, histogram: Histogram, *labels: str, timing: Optional[str] = None):
+        self.histogram = histogram
+        self.labels = labels
+        self.timing = timing
+
+    def __enter__(self) -> "timed":
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        elapsed = perf_counter() - self.start
+        self.histogram.observe(elapsed, *self.labels)
+        if self.timing:
+            record_timing(self.timing, elapsed)
+
+
+def tfidf_stage(name: str) -> timed:
+    return timed(TFIDF_STAGE_SECONDS, name, timing=name)
+
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    parts = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.items()]
+    parts.append(f"app;dur={total * 1000:.3f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route latency histogram plus optional Server-Timing header.
+
+    The route label is the matched path template ("/movie/id/{tmdb_id}"), so
+    ids never become label values. Unmatched paths share one label.
+    """
+
+    def __init__(self, app: Any, histogram: Histogram, server_timing: bool = False):
+        self.app = app
+        self.histogram = histogram
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings: Dict[str, float] = {}
+        token = _TIMINGS.set(timings)
+        start = perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    header = server_timing_header(timings, perf_counter() - start)
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _TIMINGS.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self.histogram.observe(perf_counter() - start, scope["method"], route, str(status))
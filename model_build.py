@@ -0,0 +1,490 @@
+"""
+Model build pipeline: movies_metadata.csv -> df / TF-IDF matrix / title index / vectorizer.
+
+Used by app.py and runnable on its own:
+
+    python model_build.py movies_metadata.csv                # cached, content-addressed build
+    python model_build.py movies_metadata.csv --full         # never start from an older set
+    python model_build.py movies_metadata.csv --out DIR      # plain build into DIR
+
+Cached builds live in model_cache/<key>/, where the key hashes the CSV bytes
+together with the preprocessing and vectorizer configuration, so the same
+data is never rebuilt and different data never reuses a stale model.
+An incremental build also depends on the set it started from, so it is
+stored as model_cache/<key>-<base digest>/ instead.
+model_cache/CURRENT names the set main.py serves; least recently used sets
+beyond MODEL_CACHE_KEEP are deleted.
+
+An incremental build fingerprints every row by TMDB id plus a hash of its
+text fields, preprocesses only new or changed rows, transforms them with
+the existing vocabulary and appends them to the CSR matrix. IDF weights
+stay those of the last full fit, so once too much of the catalog or its
+vocabulary has moved (see MAX_CHANGED_FRACTION / MAX_OOV_RATE) it falls
+back to a full refit.
+
+The CSV is read in CSV_CHUNK_ROWS chunks of only the model's columns, which
+bounds parsing, not the build: the cleaned catalog, its tags and the TF-IDF
+matrix are held whole, so peak memory still grows with the catalog.
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
+from sklearn.pipeline import make_pipeline
+
+import text_prep
+from artifacts import CURRENT_FILE, MODEL_CACHE_DIRNAME, save_bundle
+from movie_meta import build_movie_meta, save_movie_meta
+from similarity import DenseEngine, build_dense, quality_report, save_dense
+
+
+BASE_COLS   = ['title', 'overview', 'genres', 'tagline', 'vote_average', 'popularity']
+META_COLS   = ['id', 'poster_path', 'release_date', 'vote_count']
+HASH_COLS   = ['title', 'overview', 'genres', 'tagline']
+
+CACHE_FILES = ['df.pkl', 'tfidf_matrix.pkl', 'indices.pkl', 'tfidf.pkl']
+BUNDLE_DIR  = 'artifacts'
+META_FILE   = 'movie_meta.npz'
+
+MODEL_CACHE_DIR  = os.getenv('MODEL_CACHE_DIR', MODEL_CACHE_DIRNAME)
+MODEL_CACHE_KEEP = int(os.getenv('MODEL_CACHE_KEEP', '3'))
+BUILD_INFO       = 'build.json'
+# bump whenever the pipeline output changes for the same CSV
+PIPELINE_VERSION = 3
+
+# incremental-build limits before a full refit is forced
+MAX_CHANGED_FRACTION = 0.25   # share of catalog rows new or changed
+MAX_OOV_RATE         = 0.10   # share of tokens in changed rows missing from the vocabulary
+
+
+# 'tfidf' (default): exact vocabulary, top 50k uni/bigrams. 'hashing': stateless
+# feature hashing, so fitting never holds the full n-gram vocabulary in memory
+MODEL_VECTORIZER = os.getenv('MODEL_VECTORIZER', 'tfidf')
+CSV_CHUNK_ROWS   = int(os.getenv('CSV_CHUNK_ROWS', '20000'))
+
+# optional dense/ stage: TruncatedSVD embeddings for SIMILARITY_ENGINE=dense (0 = off)
+DENSE_DIM   = int(os.getenv('DENSE_DIM', '0'))
+DENSE_DTYPE = os.getenv('DENSE_DTYPE', 'float32')
+
+
+def make_vectorizer():
+    if MODEL_VECTORIZER == 'hashing':
+        return make_pipeline(
+            HashingVectorizer(n_features=1 << 20, ngram_range=(1, 2), stop_words='english',
+                              alternate_sign=False, norm=None),
+            TfidfTransformer(),
+        )
+    return TfidfVectorizer(max_features=50000, ngram_range=(1, 2), stop_words='english')
+
+
+def preprocess_jobs():
+    return int(os.getenv('PREPROCESS_JOBS', '0')) or None
+
+
+# ─── Loading ────────────────────────────────────────────────────────────────────
+# matches both 'name': 'Drama' and 'name': "Children's" in the CSV's python-literal lists
+_GENRE_NAME_RE = re.compile(r"""['"]name['"]:\s*(?:'([^']*)'|"([^"]*)")""")
+
+
+def parse_genres(x):
+    if not isinstance(x, str) or not x or x == '[]':
+        return ''
+    names = [a or b for a, b in _GENRE_NAME_RE.findall(x)]
+    if not names:
+        # not the usual shape; let the literal parser decide
+        return " ".join([i['name'] for i in ast.literal_eval(x)])
+    return " ".join(names)
+
+
+def iter_catalog_chunks(csv_path, chunksize=None):
+    """Yield cleaned catalog chunks, reading only the columns the model uses."""
+    header = pd.read_csv(csv_path, nrows=0).columns
+    usecols = BASE_COLS + [c for c in META_COLS if c in header]
+    reader = pd.read_csv(csv_path, usecols=usecols, dtype=str, chunksize=chunksize or CSV_CHUNK_ROWS)
+    for chunk in reader:
+        chunk = chunk[usecols].dropna(subset=['title'])
+        chunk['overview']  = chunk['overview'].fillna(' ')
+        chunk['tagline']   = chunk['tagline'].fillna(' ')
+        chunk['genres']    = chunk['genres'].map(parse_genres)
+        chunk['vote_average'] = pd.to_numeric(chunk['vote_average'], errors='coerce').fillna(0)
+        chunk['popularity']   = pd.to_numeric(chunk['popularity'],   errors='coerce').fillna(0)
+        if 'vote_count' in chunk.columns:
+            chunk['vote_count'] = pd.to_numeric(chunk['vote_count'], errors='coerce').fillna(0)
+        yield chunk
+
+
+def load_catalog(csv_path, chunksize=None):
+    """Read and clean the CSV up to (not including) text preprocessing.
+
+    Rows identical in the model's columns (after cleaning) are dropped
+    chunk by chunk, across chunk boundaries too, so only the rows that are
+    kept accumulate. Columns the model never reads do not count: rows that
+    differ only there are duplicates for the model as well. The cleaned catalog is
+    still returned as one DataFrame (df.pkl and the bundle store it), so
+    peak memory grows with the kept rows of the model's columns; chunking
+    only bounds the parse and the unused CSV columns.
+    """
+    parts = []
+    seen = np.empty(0, dtype=np.uint64)  # sorted row hashes of the rows kept so far
+    for chunk in iter_catalog_chunks(csv_path, chunksize):
+        hashes = pd.util.hash_pandas_object(chunk.astype(str), index=False).to_numpy()
+        pos = np.minimum(np.searchsorted(seen, hashes), max(len(seen) - 1, 0))
+        keep = ~pd.Series(hashes).duplicated().to_numpy()
+        if len(seen):
+            keep &= seen[pos] != hashes
+        parts.append(chunk[keep])
+        seen = np.union1d(seen, hashes[keep])
+    if not parts:
+        return pd.DataFrame(columns=BASE_COLS + ['content_hash'])
+    df = pd.concat(parts, ignore_index=True)
+    del parts
+    df['content_hash'] = content_hashes(df)
+    return df
+
+
+def content_hashes(df):
+    return pd.util.hash_pandas_object(df[HASH_COLS].astype(str), index=False).to_numpy(dtype=np.uint64)
+
+
+def row_keys(df):
+    # TMDB id when present, title otherwise (ids are missing/malformed for a few rows)
+    ids = pd.to_numeric(df['id'], errors='coerce') if 'id' in df.columns else pd.Series(np.nan, index=df.index)
+    return np.where(ids.notna(), 'id:' + ids.fillna(0).astype(np.int64).astype(str), 't:' + df['title'].astype(str))
+
+
+def build_tags(df):
+    tags = (df['overview'] + " " + df['genres'] + " " + df['tagline']).tolist()
+    return text_prep.preprocess_texts(tags, n_jobs=preprocess_jobs())
+
+
+def build_indices(df):
+    return pd.Series(df.index, index=df['title']).drop_duplicates()
+
+
+# ─── Full & incremental builds ──────────────────────────────────────────────────
+def fit_model(df):
+    df = df.copy()
+    df['tags'] = build_tags(df)
+    tfidf = make_vectorizer()
+    if MODEL_VECTORIZER == 'hashing':
+        # hash chunk by chunk, then one IDF fit over the stacked counts
+        hasher, transformer = tfidf.steps[0][1], tfidf.steps[1][1]
+        counts = sparse.vstack(
+            [hasher.transform(df['tags'].iloc[i:i + CSV_CHUNK_ROWS]) for i in range(0, len(df), CSV_CHUNK_ROWS)],
+            format='csr',
+        )
+        tfidf_mat = transformer.fit_transform(counts)
+    else:
+        tfidf_mat = tfidf.fit_transform(df['tags'])
+    return df, tfidf_mat, build_indices(df), tfidf
+
+
+def oov_rate(tfidf, docs):
+    if not hasattr(tfidf, 'vocabulary_'):
+        return 0.0  # hashed features have no out-of-vocabulary terms
+    # unigrams only: most bigrams of any new overview are unseen by nature
+    analyzer = tfidf.build_analyzer()
+    vocab    = tfidf.vocabulary_
+    total = missing = 0
+    for doc in docs:
+        for term in analyzer(doc):
+            if ' ' in term:
+                continue
+            total += 1
+            missing += term not in vocab
+    return missing / total if total else 0.0
+
+
+def update_model(new_df, old_df, old_mat, tfidf, force_full=False):
+    """Bring a cached model up to date with new_df (output of load_catalog).
+
+    Returns (df, tfidf_mat, indices, tfidf, stats); stats['mode'] says
+    whether the incremental path or a full refit was used.
+    """
+    t0 = time.perf_counter()
+    if force_full or 'content_hash' not in old_df.columns or 'tags' not in old_df.columns:
+        reason = 'forced' if force_full else 'cached model has no fingerprints'
+        return _full(new_df, t0, reason)
+
+    old_keys = row_keys(old_df)
+    new_keys = row_keys(new_df)
+    # duplicate keys in the old model keep only their first row, and so does the hash map
+    _, first = np.unique(old_keys, return_index=True)
+    dedup = np.zeros(len(old_keys), dtype=bool)
+    dedup[first] = True
+    old_hash = dict(zip(old_keys[dedup], old_df['content_hash'].to_numpy(dtype=np.uint64)[dedup]))
+    new_hash = new_df['content_hash'].to_numpy(dtype=np.uint64)
+
+    is_fresh  = np.array([old_hash.get(k) != h for k, h in zip(new_keys, new_hash)], dtype=bool)
+    live_keys = set(new_keys[~is_fresh])
+    keep_old  = np.array([k in live_keys for k in old_keys], dtype=bool) & dedup
+
+    n_fresh = int(is_fresh.sum())
+    changed_fraction = n_fresh / max(len(new_df), 1)
+    if changed_fraction > MAX_CHANGED_FRACTION:
+        return _full(new_df, t0, f'{changed_fraction:.0%} of rows new or changed')
+
+    fresh = new_df[is_fresh].copy()
+    fresh['tags'] = build_tags(fresh) if n_fresh else []
+    drift = oov_rate(tfidf, fresh['tags']) if n_fresh else 0.0
+    if drift > MAX_OOV_RATE:
+        return _full(new_df, t0, f'vocabulary drift {drift:.0%} out-of-vocabulary tokens')
+
+    # unchanged rows keep their row order, changed/new rows go at the end
+    kept = old_df[keep_old]
+    df = pd.concat([kept, fresh], ignore_index=True)
+    # refresh ratings/popularity/poster for kept rows from the new CSV
+    if len(kept):
+        latest = new_df.set_axis(new_keys)
+        latest = latest[~latest.index.duplicated()]
+        kept_keys = old_keys[keep_old]
+        for col in ['vote_average', 'popularity'] + [c for c in META_COLS if c in new_df.columns]:
+            df.loc[:len(kept) - 1, col] = latest.loc[kept_keys, col].to_numpy()
+
+    parts = [old_mat.tocsr()[np.flatnonzero(keep_old)]]
+    if n_fresh:
+        parts.append(tfidf.transform(fresh['tags']))
+    tfidf_mat = sparse.vstack(parts, format='csr')
+
+    stats = {
+        'mode': 'incremental',
+        'rows': len(df),
+        'new_or_changed': n_fresh,
+        'removed': len(set(old_keys) - set(new_keys)),
+        'oov_rate': round(drift, 4),
+        'seconds': round(time.perf_counter() - t0, 2),
+    }
+    return df, tfidf_mat, build_indices(df), tfidf, stats
+
+
+def _full(new_df, t0, reason):
+    df, tfidf_mat, indices, tfidf = fit_model(new_df)
+    stats = {'mode': 'full', 'reason': reason, 'rows': len(df), 'seconds': round(time.perf_counter() - t0, 2)}
+    return df, tfidf_mat, indices, tfidf, stats
+
+
+# ─── Persistence ────────────────────────────────────────────────────────────────
+def model_exists(out_dir='.'):
+    return all(os.path.exists(os.path.join(out_dir, f)) for f in CACHE_FILES)
+
+
+def load_model(out_dir='.'):
+    df        = pd.read_pickle(os.path.join(out_dir, 'df.pkl'))
+    tfidf_mat = pickle.load(open(os.path.join(out_dir, 'tfidf_matrix.pkl'), 'rb'))
+    indices   = pickle.load(open(os.path.join(out_dir, 'indices.pkl'), 'rb'))
+    tfidf     = pickle.load(open(os.path.join(out_dir, 'tfidf.pkl'), 'rb'))
+    return df, tfidf_mat, indices, tfidf
+
+
+def write_movie_meta(df, out_dir='.', overwrite=False):
+    # TMDB id / poster / release date table the API uses to build cards offline
+    path = os.path.join(out_dir, META_FILE)
+    if 'id' in df.columns and (overwrite or not os.path.exists(path)):
+        save_movie_meta(build_movie_meta(df), path)
+
+
+def write_dense(tfidf_mat, out_dir='.'):
+    index   = build_dense(tfidf_mat, dim=DENSE_DIM, dtype=DENSE_DTYPE)
+    quality = quality_report(tfidf_mat, DenseEngine(index))
+    save_dense(os.path.join(out_dir, 'dense'), index, quality)
+    print(f"Dense index: {DENSE_DIM} dims {DENSE_DTYPE}, recall@{quality['top_n']} {quality['recall']}, "
+          f"score ratio {quality['score_ratio']}")
+
+
+def save_model(df, tfidf_mat, indices, tfidf, out_dir='.'):
+    # row ids may have moved: stale neighbour tables / indexes would serve wrong titles
+    for name in ('neighbors_idx.npy', 'neighbors_scores.npy'):
+        path = os.path.join(out_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+            print(f"Removed stale {name}; rerun build_neighbors.py")
+    for name in ('ann', 'dense'):
+        path = os.path.join(out_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+            print(f"Removed stale {name}/; rerun similarity.py")
+    df.to_pickle(os.path.join(out_dir, 'df.pkl'))
+    pickle.dump(tfidf_mat, open(os.path.join(out_dir, 'tfidf_matrix.pkl'), 'wb'))
+    pickle.dump(indices, open(os.path.join(out_dir, 'indices.pkl'), 'wb'))
+    pickle.dump(tfidf, open(os.path.join(out_dir, 'tfidf.pkl'), 'wb'))
+    save_bundle(os.path.join(out_dir, BUNDLE_DIR), df, tfidf_mat, indices, tfidf)
+    write_movie_meta(df, out_dir, overwrite=True)
+    if DENSE_DIM:
+        write_dense(tfidf_mat, out_dir)
+
+
+# ─── Content-addressed cache ────────────────────────────────────────────────────
+def build_config():
+    config = {
+        'pipeline_version': PIPELINE_VERSION,
+        'columns':          BASE_COLS + META_COLS,
+        'preprocess':       {'regex': text_prep._NON_ALPHA_RE.pattern, 'stopwords': 'nltk:english', 'lemmatizer': 'wordnet'},
+        'vectorizer':       {k: repr(v) for k, v in sorted(make_vectorizer().get_params().items())},
+    }
+    if DENSE_DIM:
+        # only when enabled, so existing cache keys stay valid
+        config['dense'] = {'dim': DENSE_DIM, 'dtype': DENSE_DTYPE}
+    return config
+
+
+def config_hash():
+    return hashlib.sha256(json.dumps(build_config(), sort_keys=True).encode()).hexdigest()[:16]
+
+
+def file_digest(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_key(csv_path):
+    return hashlib.sha256(f"{file_digest(csv_path)}:{config_hash()}".encode()).hexdigest()[:20]
+
+
+def _touch(set_dir):
+    with open(os.path.join(set_dir, BUILD_INFO), 'a'):
+        os.utime(os.path.join(set_dir, BUILD_INFO))
+
+
+def _build_info(set_dir):
+    with open(os.path.join(set_dir, BUILD_INFO)) as f:
+        return json.load(f)
+
+
+def _last_used(set_dir):
+    return os.path.getmtime(os.path.join(set_dir, BUILD_INFO))
+
+
+def _cached_sets(cache_dir):
+    if not os.path.isdir(cache_dir):
+        return []
+    sets = [os.path.join(cache_dir, d) for d in os.listdir(cache_dir) if '.' not in d]
+    sets = [d for d in sets if os.path.exists(os.path.join(d, BUILD_INFO)) and model_exists(d)]
+    return sorted(sets, key=_last_used, reverse=True)
+
+
+def _sets_for(cache_dir, key):
+    # the full build named <key> first, then incremental builds <key>-<base>, most recently used first
+    sets = [d for d in _cached_sets(cache_dir) if os.path.basename(d).split('-')[0] == key]
+    return sorted(sets, key=lambda d: os.path.basename(d) != key)
+
+
+def set_current(cache_dir, key):
+    tmp_path = os.path.join(cache_dir, f'{CURRENT_FILE}.tmp-{os.getpid()}')
+    with open(tmp_path, 'w') as f:
+        f.write(key)
+    os.replace(tmp_path, os.path.join(cache_dir, CURRENT_FILE))
+
+
+def gc_cache(cache_dir, keep=None):
+    keep = MODEL_CACHE_KEEP if keep is None else keep
+    try:
+        with open(os.path.join(cache_dir, CURRENT_FILE)) as f:
+            current = f.read().strip()
+    except FileNotFoundError:
+        current = None
+    for set_dir in _cached_sets(cache_dir)[keep:]:
+        if os.path.basename(set_dir) != current:
+            shutil.rmtree(set_dir, ignore_errors=True)
+    # leftovers of builds that crashed before their rename
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if '.tmp-' in name and os.path.isdir(path) and time.time() - os.path.getmtime(path) > 3600:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def cached_build(csv_path, key=None, cache_dir=None, force_full=False):
+    """Return the model for csv_path, building it only if no set exists for its content key.
+
+    A miss starts from the most recently used set with the same config
+    (incremental update) unless force_full. An incremental result depends
+    on its base, so it is stored as <key>-<base digest> and one name always
+    holds one model; a full build is stored as <key>. The new set is written
+    to a temp dir and renamed into place, so readers never see a partial build.
+    """
+    cache_dir = cache_dir or MODEL_CACHE_DIR
+    key = key or cache_key(csv_path)
+    hits = _sets_for(cache_dir, key)
+    if force_full:
+        hits = [d for d in hits if os.path.basename(d) == key]
+    if hits:
+        _touch(hits[0])
+        set_current(cache_dir, os.path.basename(hits[0]))
+        return load_model(hits[0])
+
+    os.makedirs(cache_dir, exist_ok=True)
+    t0 = time.perf_counter()
+    new_df = load_catalog(csv_path)
+    cfg = config_hash()
+    base = None if force_full else next(
+        (d for d in _cached_sets(cache_dir) if _build_info(d).get('config') == cfg), None
+    )
+    if base is not None:
+        old_df, old_mat, _, tfidf = load_model(base)
+        df, tfidf_mat, indices, tfidf, stats = update_model(new_df, old_df, old_mat, tfidf)
+        stats['base'] = os.path.basename(base)
+    else:
+        df, tfidf_mat, indices, tfidf, stats = _full(new_df, t0, 'forced' if force_full else 'no cached model')
+    set_key = key
+    if stats['mode'] == 'incremental':
+        set_key = f"{key}-{hashlib.sha256(stats['base'].encode()).hexdigest()[:8]}"
+    set_dir = os.path.join(cache_dir, set_key)
+
+    tmp_dir = f'{set_dir}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    save_model(df, tfidf_mat, indices, tfidf, tmp_dir)
+    with open(os.path.join(tmp_dir, BUILD_INFO), 'w') as f:
+        json.dump({'key': set_key, 'config': cfg, 'csv': os.path.abspath(csv_path), 'stats': stats}, f, indent=2)
+    try:
+        os.replace(tmp_dir, set_dir)
+    except OSError:
+        # another process finished the same key first; its set is equivalent
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    _touch(set_dir)
+    set_current(cache_dir, set_key)
+    gc_cache(cache_dir)
+    print(f"Model build [{set_key}]: {stats}")
+    return df, tfidf_mat, indices, tfidf
+
+
+def build(csv_path, out_dir='.', incremental=True, force_full=False):
+    """Build or update the model in out_dir from csv_path and persist it."""
+    new_df = load_catalog(csv_path)
+    if incremental and model_exists(out_dir):
+        old_df, old_mat, _, tfidf = load_model(out_dir)
+        df, tfidf_mat, indices, tfidf, stats = update_model(new_df, old_df, old_mat, tfidf, force_full=force_full)
+    else:
+        t0 = time.perf_counter()
+        df, tfidf_mat, indices, tfidf, stats = _full(new_df, t0, 'no cached model' if incremental else 'forced')
+    save_model(df, tfidf_mat, indices, tfidf, out_dir)
+    print(f"Model build: {stats}")
+    return df, tfidf_mat, indices, tfidf
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or incrementally update the TF-IDF model')
+    parser.add_argument('csv_path')
+    parser.add_argument('--out', default=None, help='build into this directory instead of the content-addressed cache')
+    parser.add_argument('--full', action='store_true', help='refit from scratch even if a model exists')
+    args = parser.parse_args()
+    if args.out:
+        build(args.csv_path, args.out, incremental=not args.full, force_full=args.full)
+    else:
+        cached_build(args.csv_path, force_full=args.full)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Compact per-movie TMDB metadata table, row-aligned with df.pkl.
+
+Lets the API build recommendation cards (TMDB id, poster, release date,
+rating) straight from local data instead of a /search/movie call per title.
+Stored as one uncompressed .npz of fixed-width arrays:
+
+    tmdb_id       int32    -1 when the CSV id is missing or malformed
+    poster_path   bytes    e.g. b"/rhIRbceoE9lR4veEXuwCC2wARtG.jpg", b"" if unknown
+    release_date  bytes    b"YYYY-MM-DD" or b""
+    vote_average  float32
+"""
+import os
+import tempfile
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+
+META_COLUMNS = ("tmdb_id", "poster_path", "release_date", "vote_average")
+
+
+def _bytes_column(values: pd.Series) -> np.ndarray:
+    cleaned = values.fillna("").astype(str).str.strip()
+    return cleaned.str.encode("ascii", errors="ignore").to_numpy(dtype=np.bytes_)
+
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    if name in df.columns:
+        return df[name]
+    return pd.Series([None] * len(df), index=df.index, dtype=object)
+
+
+def build_movie_meta(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    ids = pd.to_numeric(_column(df, "id"), errors="coerce")
+    ids = ids.where((ids > 0) & (ids <= np.iinfo(np.int32).max))
+    return {
+        "tmdb_id": ids.fillna(-1).to_numpy(dtype=np.int32),
+        "poster_path": _bytes_column(_column(df, "poster_path")),
+        "release_date": _bytes_column(_column(df, "release_date")),
+        "vote_average": pd.to_numeric(_column(df, "vote_average"), errors="coerce").fillna(0).to_numpy(dtype=np.float32),
+    }
+
+
+def save_movie_meta(meta: Dict[str, np.ndarray], path: str) -> None:
+    # unique temp name: concurrent writers must not share one half-written file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **{c: meta[c] for c in META_COLUMNS})
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_movie_meta(path: str) -> Dict[str, np.ndarray]:
+    with np.load(path) as data:
+        meta = {c: data[c] for c in META_COLUMNS}
+    n = len(meta["tmdb_id"])
+    if any(len(v) != n for v in meta.values()):
+        raise RuntimeError(f"{path}: columns have different lengths")
+    return meta
+
+
+def set_poster_path(meta: Dict[str, np.ndarray], row: int, poster_path: str) -> None:
+    value = poster_path.encode("ascii", errors="ignore")
+    col = meta["poster_path"]
+    if len(value) > col.dtype.itemsize:
+        col = col.astype(f"S{len(value)}")
+        meta["poster_path"] = col
+    col[row] = value
@@ -0,0 +1,106 @@
+"""
+Recommendation engine shared by the FastAPI service (main.py) and the
+Streamlit app (app.py), so both surfaces rank movies with the same code.
+
+    title lookup   titles.TitleIndex: normalised titles, every edition
+    filters        filters.CatalogFilters masks, applied before top-N
+    retrieval      a similarity engine (exact / ivf / dense), or the
+                   precomputed neighbour table when it can answer
+    re-ranking     rerank.Reranker over the top `rerank_candidates`
+
+The caller loads the model (main.py from artifacts/pickles, app.py from
+its CSV build) and hands the pieces over; nothing here does I/O.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from filters import CatalogFilters
+from metrics import tfidf_stage
+from rerank import Reranker
+from similarity import ExactEngine
+from titles import TitleIndex
+
+# (weight overrides, mmr lambda) for Reranker.rerank; None = pure similarity
+RerankSettings = Optional[Tuple[Dict[str, float], Optional[float]]]
+
+
+class Recommender:
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        tfidf_matrix: Any,
+        titles: Any = None,
+        years: Optional[np.ndarray] = None,
+        engine: Any = None,
+        neighbors: Tuple[Optional[np.ndarray], Optional[np.ndarray]] = (None, None),
+        rerank_weights: Optional[Dict[str, float]] = None,
+        mmr_lambda: float = 1.0,
+        rerank_candidates: int = 100,
+    ):
+        """
+        df needs title (unless `titles` is given), genres, vote_average and
+        popularity; vote_count is optional. `titles` may be any indexable
+        string column (e.g. an mmap-backed artifacts.StringColumn), `years`
+        the int16 release years (0 = unknown).
+        """
+        self.df = df
+        self.tfidf_matrix = tfidf_matrix
+        self.titles = titles if titles is not None else df["title"].astype(str).to_numpy(dtype=object)
+        years = np.zeros(len(self.titles), dtype=np.int16) if years is None else years
+        self.filters = CatalogFilters(df["vote_average"].to_numpy(), df["popularity"].to_numpy(), years, df["genres"].tolist())
+        self.title_index = TitleIndex(self.titles, df["popularity"].to_numpy(), self.filters.years)
+        self.engine = engine if engine is not None else ExactEngine(tfidf_matrix)
+        self.neighbor_idx, self.neighbor_scores = neighbors
+        vote_count = df["vote_count"].to_numpy() if "vote_count" in df.columns else None
+        self.reranker = Reranker(df["popularity"].to_numpy(), df["vote_average"].to_numpy(), vote_count, weights=rerank_weights, mmr_lambda=mmr_lambda)
+        self.rerank_candidates = rerank_candidates
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def find(self, title: Any, year: Optional[int] = None) -> Optional[int]:
+        return self.title_index.lookup(title, year)
+
+    def rerank_settings(self, weights: Optional[Dict[str, float]] = None, mmr_lambda: Optional[float] = None) -> RerankSettings:
+        # None when the request leaves the ranking at pure similarity
+        weights = {k: v for k, v in (weights or {}).items() if v is not None}
+        return None if self.reranker.is_identity(weights, mmr_lambda) else (weights, mmr_lambda)
+
+    def candidate_similarities(self, rows: np.ndarray) -> np.ndarray:
+        sub = self.tfidf_matrix[rows]
+        return (sub @ sub.T).toarray()
+
+    def rerank_rows(self, rows: np.ndarray, scores: np.ndarray, top_n: int, settings: RerankSettings) -> Tuple[np.ndarray, np.ndarray]:
+        keep = scores > 0  # popularity alone must not pull in unrelated movies
+        weights, lam = settings
+        with tfidf_stage("rerank"):
+            return self.reranker.rerank(rows[keep], scores[keep], top_n, pairwise=self.candidate_similarities, weights=weights, mmr_lambda=lam)
+
+    def retrieve(self, qm: Any, top_n: int, exclude: Any = None, allow: Optional[np.ndarray] = None, rerank: RerankSettings = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """One (rows, scores) pair per query row of qm, best first."""
+        if rerank is None:
+            return self.engine.search(qm, top_n, exclude=exclude, allow=allow)
+        pool = self.engine.search(qm, max(top_n, self.rerank_candidates), exclude=exclude, allow=allow)
+        return [self.rerank_rows(r, sc, top_n, rerank) for r, sc in pool]
+
+    def similar(self, row: int, top_n: int = 10, allow: Optional[np.ndarray] = None, rerank: RerankSettings = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Movies most similar to catalog row `row`, excluding itself."""
+        nbr_idx = self.neighbor_idx
+        if nbr_idx is not None and top_n <= nbr_idx.shape[1]:
+            with tfidf_stage("neighbors"):
+                full = allow is not None or rerank is not None
+                nbr = nbr_idx[row] if full else nbr_idx[row, :top_n]
+                keep = nbr >= 0
+                if allow is not None:
+                    keep &= allow[np.maximum(nbr, 0)]
+                # filtered: the stored list only answers when enough of it qualifies
+                answered = allow is None or keep.sum() >= top_n
+                if answered:
+                    rows, scores = nbr[keep], self.neighbor_scores[row, :len(nbr)][keep]
+            if answered:
+                if rerank is not None:
+                    return self.rerank_rows(rows, scores, top_n, rerank)
+                return rows[:top_n], scores[:top_n]
+        return self.retrieve(self.tfidf_matrix[row], top_n, exclude=[[row]], allow=allow, rerank=rerank)[0]
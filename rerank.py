@@ -0,0 +1,112 @@
+"""
+Hybrid re-ranking of retrieved candidates.
+
+Blends, per candidate row,
+
+    w_sim * similarity + w_pop * popularity prior + w_rating * rating prior
+
+where the popularity prior is log1p(popularity) scaled to [0, 1] and the
+rating prior is a Bayesian (IMDb-style) weighted rating scaled to [0, 1]:
+
+    (v / (v + m)) * R + (m / (v + m)) * C
+
+R = vote_average, v = vote_count, C = catalog mean rating and m = a vote
+count quantile, so a 10.0 from three votes no longer beats an 8.1 from
+ten thousand. Priors are computed once per catalog; re-ranking a block of
+candidates is a handful of vectorized array ops, plus an optional greedy
+MMR pass (lambda < 1) that trades relevance for diversity using the
+candidates' pairwise similarities.
+"""
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+def popularity_prior(popularity: np.ndarray) -> np.ndarray:
+    p = np.log1p(np.clip(np.asarray(popularity, dtype=np.float64), 0, None))
+    top = p.max() if len(p) else 0.0
+    return (p / top if top > 0 else p).astype(np.float32)
+
+
+def bayesian_rating(
+    vote_average: np.ndarray,
+    vote_count: Optional[np.ndarray] = None,
+    min_votes_quantile: float = 0.75,
+) -> np.ndarray:
+    """Weighted rating in [0, 10]; plain vote_average when vote counts are unknown."""
+    r = np.nan_to_num(np.asarray(vote_average, dtype=np.float64))
+    if vote_count is None:
+        return r.astype(np.float32)
+    v = np.clip(np.nan_to_num(np.asarray(vote_count, dtype=np.float64)), 0, None)
+    voted = v > 0
+    if not voted.any():
+        return r.astype(np.float32)
+    c = r[voted].mean()
+    m = max(np.quantile(v[voted], min_votes_quantile), 1.0)
+    return ((v / (v + m)) * r + (m / (v + m)) * c).astype(np.float32)
+
+
+class Reranker:
+    def __init__(
+        self,
+        popularity: np.ndarray,
+        vote_average: np.ndarray,
+        vote_count: Optional[np.ndarray] = None,
+        weights: Optional[Dict[str, float]] = None,
+        mmr_lambda: float = 1.0,
+    ):
+        self.popularity = popularity_prior(popularity)
+        self.rating = bayesian_rating(vote_average, vote_count) / np.float32(10)
+        self.weights = {"similarity": 1.0, "popularity": 0.0, "rating": 0.0, **(weights or {})}
+        self.mmr_lambda = mmr_lambda
+
+    def prior(self, rows: Any = slice(None), weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """Popularity + rating part of the blend, for ranking without a query."""
+        w = {**self.weights, **(weights or {})}
+        if not w["popularity"] and not w["rating"]:
+            return self.popularity[rows]
+        return w["popularity"] * self.popularity[rows] + w["rating"] * self.rating[rows]
+
+    def is_identity(self, weights: Optional[Dict[str, float]] = None, mmr_lambda: Optional[float] = None) -> bool:
+        w = {**self.weights, **(weights or {})}
+        lam = self.mmr_lambda if mmr_lambda is None else mmr_lambda
+        return not w["popularity"] and not w["rating"] and lam >= 1
+
+    def rerank(
+        self,
+        rows: np.ndarray,
+        sim: np.ndarray,
+        top_n: int,
+        pairwise: Optional[Any] = None,
+        weights: Optional[Dict[str, float]] = None,
+        mmr_lambda: Optional[float] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-rank one query's candidates; returns (rows, blended scores), best first.
+
+        pairwise(rows) -> (k, k) candidate similarity matrix, only needed for MMR.
+        """
+        w = {**self.weights, **(weights or {})}
+        lam = self.mmr_lambda if mmr_lambda is None else mmr_lambda
+        rows = np.asarray(rows)
+        blended = (
+            w["similarity"] * np.asarray(sim, dtype=np.float32)
+            + w["popularity"] * self.popularity[rows]
+            + w["rating"] * self.rating[rows]
+        )
+        k = min(top_n, len(rows))
+        if lam >= 1 or pairwise is None or k <= 1:
+            order = np.argsort(-blended, kind="stable")[:k]
+            return rows[order], blended[order]
+
+        # greedy MMR: each pick maximises lam * relevance - (1 - lam) * max similarity to earlier picks
+        sims = np.asarray(pairwise(rows), dtype=np.float32)
+        picked = np.empty(k, dtype=np.int64)
+        redundancy = np.zeros(len(rows), dtype=np.float32)
+        available = np.ones(len(rows), dtype=bool)
+        for i in range(k):
+            mmr = np.where(available, lam * blended - (1 - lam) * redundancy, -np.inf)
+            j = int(np.argmax(mmr))
+            picked[i] = j
+            available[j] = False
+            np.maximum(redundancy, sims[j], out=redundancy)
+        return rows[picked], blended[picked]
@@ -0,0 +1,454 @@
+"""
+Pluggable similarity backends over the TF-IDF matrix.
+
+    ExactEngine  brute-force cosine against every row (one sparse product),
+                 the reference results
+    DenseEngine  brute-force over low-rank TruncatedSVD embeddings: one dense
+                 GEMV/GEMM per query block instead of a sparse product
+    IVFEngine    approximate: rows projected to L2-normalised float32
+                 embeddings (TruncatedSVD or Gaussian random projection) and
+                 grouped into spherical k-means cells; a query only scores
+                 the rows in its `nprobe` nearest cells, then re-ranks the
+                 best `rerank` candidates with exact cosine
+
+All take a block of sparse query vectors (rows of the TF-IDF matrix or
+vectorizer output) and return one (rows, scores) pair per query, best
+first. An optional boolean `allow` mask over the catalog (see filters.py)
+restricts results to qualifying rows before top-N selection. Recall/latency knobs for IVF: n_lists and dim at build time,
+nprobe and rerank at query time.
+
+The indexes are written next to the model files:
+
+    ann/
+        ann.json               dim, n_lists, projection method, shapes
+        projection.npy         float32 (n_features, dim)
+        centroids.npy          float32 (n_lists, dim)
+        list_offsets.npy       int64   (n_lists + 1,)  cell i = [offsets[i], offsets[i+1])
+        list_rows.npy          int32   (n_rows,)       catalog rows grouped by cell
+        list_embeddings.npy    float32 (n_rows, dim)   embeddings in list_rows order
+    dense/
+        dense.json             dim, dtype, quality report against exact scoring
+        projection.npy         float32 or float16 (n_features, dim)
+        embeddings.npy         float32 or float16 (n_rows, dim); float16 halves
+                               the mapped memory, and queries widen it
+                               block by block
+
+Build them with:
+    python similarity.py --dim 128 --n-lists 1024
+    python similarity.py --kind dense --dim 256 --dtype float16
+"""
+import abc
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from artifacts import replace_dir, staging_dir
+from metrics import tfidf_stage
+
+
+ANN_MANIFEST = "ann.json"
+ANN_FORMAT_VERSION = 1
+ANN_FILES = ("projection", "centroids", "list_offsets", "list_rows", "list_embeddings")
+DENSE_MANIFEST = "dense.json"
+DENSE_FILES = ("projection", "embeddings")
+
+SearchResult = Tuple[np.ndarray, np.ndarray]
+
+
+# =========================
+# TOP-N SELECTION
+# =========================
+def top_n_indices(scores: np.ndarray, top_n: int, exclude: Optional[int] = None) -> np.ndarray:
+    n = scores.shape[0]
+    k = min(top_n + (exclude is not None), n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    cand = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+    cand = cand[np.argsort(-scores[cand], kind="stable")]
+    if exclude is not None:
+        cand = cand[cand != exclude]
+    return cand[:top_n]
+
+
+def top_n_indices_2d(scores: np.ndarray, top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+    # row-wise top_n over a (n_queries, n_movies) block, best first
+    k = min(top_n, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64), np.empty((scores.shape[0], 0), dtype=scores.dtype)
+    cand = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < scores.shape[1] else np.tile(np.arange(k), (scores.shape[0], 1))
+    cand_scores = np.take_along_axis(scores, cand, axis=1)
+    order = np.argsort(-cand_scores, axis=1, kind="stable")
+    return np.take_along_axis(cand, order, axis=1), np.take_along_axis(cand_scores, order, axis=1)
+
+
+def _l2_normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return x / norms
+
+
+def embed_queries(qm: Any, projection: np.ndarray) -> np.ndarray:
+    dense = qm @ projection
+    dense = np.asarray(dense.toarray() if sparse.issparse(dense) else dense, dtype=np.float32)
+    return _l2_normalize(dense)
+
+
+# =========================
+# ENGINES
+# =========================
+class BruteForceEngine(abc.ABC):
+    """Scores every row; subclasses provide scores(qm) -> (n_queries, n_movies)."""
+
+    @abc.abstractmethod
+    def scores(self, qm: Any) -> np.ndarray:
+        ...
+
+    def search(
+        self,
+        qm: Any,
+        top_n: int,
+        exclude: Optional[Sequence[Sequence[int]]] = None,
+        allow: Optional[np.ndarray] = None,
+    ) -> List[SearchResult]:
+        """Top top_n rows per query row of qm; exclude holds rows to skip, one list per query."""
+        with tfidf_stage("matmul"):
+            scores = self.scores(qm)
+        with tfidf_stage("select"):
+            if allow is not None:
+                scores[:, ~allow] = -np.inf
+            if exclude is not None:
+                for i, rows in enumerate(exclude):
+                    scores[i, list(rows)] = -np.inf
+            rows, row_scores = top_n_indices_2d(scores, top_n)
+            out = []
+            for r, sc in zip(rows, row_scores):
+                keep = np.isfinite(sc)
+                out.append((r[keep], sc[keep]))
+        return out
+
+
+class ExactEngine(BruteForceEngine):
+    name = "exact"
+
+    def __init__(self, matrix: Any):
+        self.matrix = matrix
+
+    def scores(self, qm: Any) -> np.ndarray:
+        # one sparse product scores a block of query vectors: (n_queries, n_movies)
+        return (self.matrix @ qm.T).T.toarray()
+
+
+class DenseEngine(BruteForceEngine):
+    name = "dense"
+
+    # catalog rows widened to float32 at a time when the index is stored as float16
+    UPCAST_ROWS = 16384
+
+    def __init__(self, index: Dict[str, np.ndarray]):
+        # arrays keep their stored dtype, so a float16 mmap stays half the size and
+        # shared between workers; BLAS has no float16 kernels, so scores() widens
+        # the projection rows a query touches and the embeddings block by block
+        self.projection = index["projection"]
+        self.embeddings = index["embeddings"]
+
+    def embed(self, qm: Any) -> np.ndarray:
+        if self.projection.dtype == np.float32:
+            return embed_queries(qm, self.projection)
+        qm = sparse.csr_matrix(qm)
+        cols = np.unique(qm.indices)
+        return embed_queries(qm[:, cols], self.projection[cols].astype(np.float32))
+
+    def scores(self, qm: Any) -> np.ndarray:
+        qd = self.embed(qm)
+        if self.embeddings.dtype == np.float32:
+            return qd @ self.embeddings.T
+        out = np.empty((qd.shape[0], len(self.embeddings)), dtype=np.float32)
+        for start in range(0, len(self.embeddings), self.UPCAST_ROWS):
+            block = self.embeddings[start:start + self.UPCAST_ROWS].astype(np.float32)
+            out[:, start:start + len(block)] = qd @ block.T
+        return out
+
+
+class IVFEngine:
+    name = "ivf"
+
+    def __init__(self, index: Dict[str, np.ndarray], matrix: Any = None, nprobe: int = 16, rerank: int = 400):
+        self.projection = index["projection"]
+        self.centroids = index["centroids"]
+        self.list_offsets = index["list_offsets"]
+        self.list_rows = index["list_rows"]
+        self.list_embeddings = index["list_embeddings"]
+        # exact re-rank needs the sparse matrix; without it scores are embedding cosines
+        self.matrix = matrix
+        self.nprobe = max(1, min(int(nprobe), len(self.centroids)))
+        self.rerank = int(rerank) if matrix is not None else 0
+
+    def candidates(self, q: np.ndarray, cell_scores: np.ndarray, nprobe: int) -> Tuple[np.ndarray, np.ndarray]:
+        probe = top_n_indices(cell_scores, nprobe)
+        spans = [(self.list_offsets[c], self.list_offsets[c + 1]) for c in probe]
+        rows = np.concatenate([self.list_rows[s:e] for s, e in spans])
+        approx = np.concatenate([self.list_embeddings[s:e] @ q for s, e in spans])
+        return rows, approx
+
+    def search(
+        self,
+        qm: Any,
+        top_n: int,
+        exclude: Optional[Sequence[Sequence[int]]] = None,
+        allow: Optional[np.ndarray] = None,
+    ) -> List[SearchResult]:
+        with tfidf_stage("matmul"):
+            qd = embed_queries(qm, self.projection)
+            cell_scores = qd @ self.centroids.T
+        out = []
+        for i in range(qd.shape[0]):
+            with tfidf_stage("ivf_probe"):
+                nprobe = self.nprobe
+                while True:
+                    rows, approx = self.candidates(qd[i], cell_scores[i], nprobe)
+                    keep = np.ones(len(rows), dtype=bool) if allow is None else allow[rows]
+                    if exclude is not None and len(exclude[i]):
+                        keep &= ~np.isin(rows, np.asarray(exclude[i]))
+                    # a selective filter can empty the probed cells: widen until top_n qualify
+                    if allow is None or keep.sum() >= top_n or nprobe >= len(self.centroids):
+                        break
+                    nprobe = min(nprobe * 4, len(self.centroids))
+                rows, approx = rows[keep], approx[keep]
+            if self.rerank:
+                with tfidf_stage("ivf_exact"):
+                    pool = top_n_indices(approx, max(self.rerank, top_n))
+                    rows = rows[pool]
+                    scores = (self.matrix[rows] @ qm[i].T).toarray().ravel()
+            else:
+                scores = approx
+            with tfidf_stage("select"):
+                top = top_n_indices(scores, top_n)
+            out.append((rows[top].astype(np.int64), scores[top]))
+        return out
+
+
+# =========================
+# BUILD
+# =========================
+def project(matrix: Any, dim: int = 128, method: str = "svd", seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (projection, embeddings): a (n_features, dim) map and the L2-normalised row embeddings."""
+    dim = max(1, min(int(dim), matrix.shape[1] - 1))
+    if method == "svd":
+        from sklearn.decomposition import TruncatedSVD
+
+        svd = TruncatedSVD(n_components=dim, algorithm="randomized", random_state=seed)
+        svd.fit(matrix)
+        projection = svd.components_.T.astype(np.float32)
+    elif method == "random":
+        rng = np.random.default_rng(seed)
+        projection = (rng.standard_normal((matrix.shape[1], dim)) / np.sqrt(dim)).astype(np.float32)
+    else:
+        raise ValueError(f"Unknown projection method '{method}' (expected 'svd' or 'random')")
+    embeddings = _l2_normalize(np.asarray(matrix @ projection, dtype=np.float32))
+    return projection, embeddings
+
+
+def assign_cells(embeddings: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    out = np.empty(len(embeddings), dtype=np.int32)
+    for start in range(0, len(embeddings), chunk_size):
+        out[start:start + chunk_size] = np.argmax(embeddings[start:start + chunk_size] @ centroids.T, axis=1)
+    return out
+
+
+def spherical_kmeans(embeddings: np.ndarray, n_lists: int, n_iter: int = 10, seed: int = 0, max_sample: int = 256) -> np.ndarray:
+    """Cosine k-means over a sample of at most max_sample points per cell."""
+    rng = np.random.default_rng(seed)
+    n = len(embeddings)
+    n_lists = max(1, min(int(n_lists), n))
+    sample = embeddings[rng.choice(n, min(n, n_lists * max_sample), replace=False)]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = assign_cells(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        empty = np.flatnonzero(np.bincount(assign, minlength=n_lists) == 0)
+        # reseed empty cells from random sample points
+        sums[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        centroids = _l2_normalize(sums)
+    return centroids
+
+
+def default_n_lists(n_rows: int) -> int:
+    return max(1, int(4 * np.sqrt(n_rows)))
+
+
+def build_ivf(
+    matrix: Any,
+    dim: int = 128,
+    n_lists: Optional[int] = None,
+    method: str = "svd",
+    n_iter: int = 10,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    projection, embeddings = project(matrix, dim=dim, method=method, seed=seed)
+    centroids = spherical_kmeans(embeddings, n_lists or default_n_lists(matrix.shape[0]), n_iter=n_iter, seed=seed)
+    cells = assign_cells(embeddings, centroids)
+    order = np.argsort(cells, kind="stable")
+    offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cells, minlength=len(centroids)), out=offsets[1:])
+    return {
+        "projection": projection,
+        "centroids": centroids,
+        "list_offsets": offsets,
+        "list_rows": order.astype(np.int32),
+        "list_embeddings": embeddings[order],
+        "method": method,
+    }
+
+
+def build_dense(matrix: Any, dim: int = 256, dtype: str = "float32", seed: int = 0) -> Dict[str, Any]:
+    projection, embeddings = project(matrix, dim=dim, method="svd", seed=seed)
+    return {"projection": projection.astype(dtype), "embeddings": embeddings.astype(dtype)}
+
+
+def quality_report(matrix: Any, engine: Any, n_queries: int = 200, top_n: int = 10, seed: int = 0) -> Dict[str, Any]:
+    """Compare engine against exact cosine on catalog rows used as queries.
+
+    recall is the overlap of the two top_n lists; score_ratio is the mean
+    exact cosine of the engine's picks over that of the exact picks, so a
+    miss that is nearly as similar still scores close to 1.
+    """
+    exact = ExactEngine(matrix)
+    queries = np.random.default_rng(seed).choice(matrix.shape[0], min(n_queries, matrix.shape[0]), replace=False)
+    recall, ratio = [], []
+    for start in range(0, len(queries), 16):
+        qs = queries[start:start + 16]
+        qm = matrix[qs]
+        exclude = qs[:, None]
+        exact_scores = exact.scores(qm)
+        for i, ((er, es), (ar, _)) in enumerate(zip(exact.search(qm, top_n, exclude), engine.search(qm, top_n, exclude))):
+            if len(er) == 0 or es.sum() <= 0:
+                continue
+            recall.append(len(np.intersect1d(er, ar)) / len(er))
+            ratio.append(exact_scores[i, ar].sum() / es.sum())
+    return {
+        "queries": len(recall),
+        "top_n": top_n,
+        "recall": round(float(np.mean(recall)), 4) if recall else None,
+        "score_ratio": round(float(np.mean(ratio)), 4) if ratio else None,
+    }
+
+
+# =========================
+# SAVE / LOAD
+# =========================
+def _save_arrays(out_dir: str, arrays: Dict[str, np.ndarray], manifest_name: str, manifest: Dict[str, Any]) -> str:
+    tmp_dir = staging_dir(out_dir)
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), arr)
+    manifest = {
+        "format_version": ANN_FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        **manifest,
+    }
+    with open(os.path.join(tmp_dir, manifest_name), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return replace_dir(tmp_dir, out_dir)
+
+
+def _load_arrays(path: str, names: Sequence[str], manifest_name: str, mmap: bool) -> Dict[str, Any]:
+    with open(os.path.join(path, manifest_name)) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != ANN_FORMAT_VERSION:
+        raise RuntimeError(f"{path}: unsupported index format {manifest.get('format_version')}")
+    mmap_mode = "r" if mmap else None
+    index: Dict[str, Any] = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in names}
+    index["manifest"] = manifest
+    return index
+
+
+def save_ivf(out_dir: str, index: Dict[str, Any]) -> str:
+    return _save_arrays(out_dir, {name: index[name] for name in ANN_FILES}, ANN_MANIFEST, {
+        "method": index.get("method", "svd"),
+        "n_rows": int(len(index["list_rows"])),
+        "n_features": int(index["projection"].shape[0]),
+        "dim": int(index["projection"].shape[1]),
+        "n_lists": int(len(index["centroids"])),
+    })
+
+
+def ivf_exists(path: str) -> bool:
+    return os.path.exists(os.path.join(path, ANN_MANIFEST))
+
+
+def load_ivf(path: str, mmap: bool = True) -> Dict[str, Any]:
+    return _load_arrays(path, ANN_FILES, ANN_MANIFEST, mmap)
+
+
+def save_dense(out_dir: str, index: Dict[str, Any], quality: Optional[Dict[str, Any]] = None) -> str:
+    return _save_arrays(out_dir, {name: index[name] for name in DENSE_FILES}, DENSE_MANIFEST, {
+        "n_rows": int(index["embeddings"].shape[0]),
+        "n_features": int(index["projection"].shape[0]),
+        "dim": int(index["projection"].shape[1]),
+        "dtype": str(index["embeddings"].dtype),
+        "quality": quality,
+    })
+
+
+def dense_exists(path: str) -> bool:
+    return os.path.exists(os.path.join(path, DENSE_MANIFEST))
+
+
+def load_dense(path: str, mmap: bool = True) -> Dict[str, Any]:
+    return _load_arrays(path, DENSE_FILES, DENSE_MANIFEST, mmap)
+
+
+# =========================
+# CLI
+# =========================
+def main():
+    from artifacts import bundle_exists, load_bundle, load_pickle_file, resolve_model_dir
+
+    parser = argparse.ArgumentParser(description="Build the IVF approximate-neighbour index or the dense embedding index")
+    parser.add_argument("--kind", choices=["ivf", "dense"], default="ivf")
+    parser.add_argument("--dim", type=int, default=128, help="embedding dimensions")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32", help="dense embedding storage")
+    parser.add_argument("--n-lists", type=int, default=None, help="k-means cells (default: 4*sqrt(n_rows))")
+    parser.add_argument("--method", choices=["svd", "random"], default="svd", help="sparse -> dense projection")
+    parser.add_argument("--n-iter", type=int, default=10, help="k-means iterations")
+    parser.add_argument("--dir", default=None, help="model directory (default: the one main.py serves)")
+    parser.add_argument("--out", default=None, help="index directory (default: <dir>/ann or <dir>/dense)")
+    args = parser.parse_args()
+    model_dir = args.dir or resolve_model_dir(os.path.dirname(os.path.abspath(__file__)))
+
+    t0 = time.perf_counter()
+    bundle_dir = os.path.join(model_dir, "artifacts")
+    if bundle_exists(bundle_dir):
+        matrix = load_bundle(bundle_dir, mmap=False).tfidf_matrix()
+    else:
+        matrix = load_pickle_file(os.path.join(model_dir, "tfidf_matrix.pkl")).tocsr()
+
+    if args.kind == "dense":
+        index = build_dense(matrix, dim=args.dim, dtype=args.dtype)
+        quality = quality_report(matrix, DenseEngine(index))
+        out = save_dense(args.out or os.path.join(model_dir, "dense"), index, quality)
+        sparse_mb = (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 2**20
+        print(
+            f"Wrote {args.dtype} dense index ({index['embeddings'].shape[1]} dims, "
+            f"{(index['embeddings'].nbytes + index['projection'].nbytes) / 2**20:.1f} MiB vs {sparse_mb:.1f} MiB sparse) to {out} "
+            f"in {time.perf_counter() - t0:.1f}s; recall@{quality['top_n']} {quality['recall']}, "
+            f"score ratio {quality['score_ratio']}"
+        )
+        return
+
+    index = build_ivf(matrix, dim=args.dim, n_lists=args.n_lists, method=args.method, n_iter=args.n_iter)
+    out = save_ivf(args.out or os.path.join(model_dir, "ann"), index)
+    sizes = np.diff(index["list_offsets"])
+    print(
+        f"Wrote {args.method} IVF index ({index['projection'].shape[1]} dims, {len(sizes):,} cells, "
+        f"{sizes.mean():.0f} rows/cell avg, {sizes.max():,} max) to {out} in {time.perf_counter() - t0:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""
+Recommendation endpoints against the synthetic catalog: similarity ranking.
+"""
+from conftest import rec_titles as titles
+
+
+def test_recommend_tfidf_ranks_by_similarity(api):
+    r = api.get("/recommend/tfidf", params={"title": "Starship Galaxy 0", "top_n": 10})
+    scores = [item["score"] for item in r.json()]
+    assert len(scores) == 10
+    assert scores == sorted(scores, reverse=True)
+    assert "Starship Galaxy 0" not in titles(r)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+from artifacts import load_bundle, save_bundle
+
+
+def unsorted_csr() -> sparse.csr_matrix:
+    # row 0 stores its column indices out of order
+    data = np.array([0.5, 0.25, 1.0], dtype=np.float32)
+    indices = np.array([3, 1, 2], dtype=np.int32)
+    indptr = np.array([0, 2, 3], dtype=np.int32)
+    mat = sparse.csr_matrix((data, indices, indptr), shape=(2, 4))
+    mat.has_sorted_indices = False
+    return mat
+
+
+def test_save_bundle_leaves_the_input_matrix_untouched(tmp_path):
+    mat = unsorted_csr()
+    before = (mat.data.copy(), mat.indices.copy(), mat.indptr.copy())
+    df = pd.DataFrame({"title": ["a", "b"], "vote_count": [1, 2]})
+    out = save_bundle(str(tmp_path / "bundle"), df, mat, {"a": 0, "b": 1})
+
+    for arr, orig in zip((mat.data, mat.indices, mat.indptr), before):
+        np.testing.assert_array_equal(arr, orig)
+    loaded = load_bundle(out).tfidf_matrix()
+    np.testing.assert_array_equal(loaded.toarray(), mat.toarray())
+    assert list(loaded.indices[:2]) == [1, 3]
+
+
+def test_string_column_indexing_matches_numpy(tmp_path):
+    titles = [f"title {i} é" for i in range(20)]
+    df = pd.DataFrame({"title": titles})
+    out = save_bundle(str(tmp_path / "bundle"), df, sparse.identity(20, format="csr"), {t: i for i, t in enumerate(titles)})
+    col = load_bundle(out).str_column("title")
+    expected = np.array(titles, dtype=object)
+
+    assert col[3] == titles[3] and col[-1] == titles[-1]
+    for key in (slice(None), slice(2, 15, 3), slice(None, None, -4), [5, -2, 0], np.array([7, 7, 1]), expected == "title 4 é", []):
+        np.testing.assert_array_equal(col[key], expected[key])
+    for bad in (20, -21, [0, 20]):
+        with pytest.raises(IndexError):
+            col[bad]
@@ -0,0 +1,32 @@
+from filters import split_genres
+
+
+def test_batch_matches_single_title_requests(api):
+    titles = ["Starship Galaxy 0", "Detective Murder 1", "Haunted Ghost 3"]
+    r = api.post("/recommend/tfidf/batch", json={"titles": titles, "top_n": 6})
+    assert r.status_code == 200, r.text
+    for title, item in zip(titles, r.json()["items"]):
+        single = api.get("/recommend/tfidf", params={"title": title, "top_n": 6}).json()
+        assert [rec["title"] for rec in item["results"]] == [rec["title"] for rec in single]
+
+
+def test_batch_applies_filters_and_reports_missing(api, by_title):
+    body = {
+        "titles": ["Starship Galaxy 0", "Romance Wedding 2", "No Such Movie"],
+        "top_n": 5,
+        "filters": {"genres": ["Comedy"]},
+    }
+    r = api.post("/recommend/tfidf/batch", json=body)
+    assert r.status_code == 200, r.text
+    data = r.json()
+    assert data["missing"] == ["No Such Movie"]
+    found = [item for item in data["items"] if item["found"]]
+    assert len(found) == 2
+    for item in found:
+        assert len(item["results"]) == 5
+        assert all("Comedy" in split_genres(by_title.loc[rec["title"], "genres"]) for rec in item["results"])
+
+
+def test_batch_rejects_partial_genre(api):
+    r = api.post("/recommend/tfidf/batch", json={"titles": ["Starship Galaxy 0"], "filters": {"genres": ["Fiction"]}})
+    assert r.status_code == 400
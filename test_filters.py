@@ -0,0 +1,50 @@
+import pytest
+
+from conftest import rec_titles as titles
+from filters import CatalogFilters, split_genres
+
+
+def test_genre_filter_keeps_only_that_genre(api, by_title):
+    r = api.get("/recommend/tfidf", params={"title": "Starship Galaxy 0", "top_n": 10, "genre": "Drama"})
+    found = titles(r)
+    assert len(found) == 10
+    assert all("Drama" in split_genres(by_title.loc[t, "genres"]) for t in found)
+
+
+def test_multi_word_genre_filter(api, by_title):
+    r = api.get("/recommend/tfidf", params={"title": "Detective Murder 1", "top_n": 5, "genre": "science fiction"})
+    found = titles(r)
+    assert len(found) == 5
+    assert all("Science Fiction" in split_genres(by_title.loc[t, "genres"]) for t in found)
+
+
+@pytest.mark.parametrize("genre", ["Fiction", "Science", "Westerns"])
+def test_partial_or_unknown_genre_is_rejected(api, genre):
+    r = api.get("/recommend/tfidf", params={"title": "Starship Galaxy 0", "genre": genre})
+    assert r.status_code == 400
+    assert genre in r.json()["detail"]
+
+
+def test_rating_and_year_filters(api, by_title):
+    params = {"title": "Starship Galaxy 0", "top_n": 10, "min_rating": 6, "year_from": 1980, "year_to": 2000}
+    found = titles(api.get("/recommend/tfidf", params=params))
+    assert found
+    assert all(by_title.loc[t, "vote_average"] >= 6 for t in found)
+    assert all(1980 <= by_title.loc[t, "year"] <= 2000 for t in found)
+
+
+def test_catalog_mask_matches_a_row_by_row_check():
+    genres = ["Drama Romance", "Science Fiction", "Drama", "", "Science Fiction Drama", "Family"]
+    filters = CatalogFilters(
+        vote_average=[7.5, 5.0, 8.1, 9.0, 6.5, 7.0],
+        popularity=[10, 50, 3, 80, 20, 5],
+        years=[1999, 2005, 1980, 0, 2010, 2001],
+        genres=genres,
+    )
+    assert filters.mask() is None
+    mask = filters.mask(min_rating=6, genres=["science fiction", "Romance"], year_from=1990)
+    assert mask.tolist() == [True, False, False, False, True, False]
+    # whole names only: "Fiction" is not a genre, and does not match "Science Fiction"
+    assert not filters.genre_mask(["Fiction"]).any()
+    assert filters.genre_mask(["family"]).tolist() == [False] * 5 + [True]
+    assert filters.mask(min_rating=6, genres=["Romance", "science fiction"], year_from=1990) is mask
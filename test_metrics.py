@@ -0,0 +1,73 @@
+import asyncio
+import re
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from metrics import MetricsMiddleware, Registry, tfidf_stage
+
+
+def series(text: str, name: str) -> dict:
+    """{label string: value} for one metric name in Prometheus text."""
+    out = {}
+    for line in text.splitlines():
+        m = re.match(rf"^{re.escape(name)}(\{{.*\}})? (\S+)$", line)
+        if m:
+            out[m.group(1) or ""] = float(m.group(2))
+    return out
+
+
+def test_metrics_label_routes_by_template(api, catalog):
+    tmdb_id = int(catalog.loc[catalog["id"] != "", "id"].iloc[0])
+    assert api.get(f"/movie/id/{tmdb_id}").status_code == 200
+    assert api.get("/recommend/tfidf", params={"title": "Starship Galaxy 0"}).status_code == 200
+    assert api.get("/no/such/route").status_code == 404
+
+    r = api.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert "server-timing" not in r.headers  # SERVER_TIMING is off unless set
+    requests = series(r.text, "http_request_duration_seconds_count")
+    assert requests['{method="GET",route="/movie/id/{tmdb_id}",status="200"}'] >= 1
+    assert requests['{method="GET",route="/recommend/tfidf",status="200"}'] >= 1
+    assert requests['{method="GET",route="unmatched",status="404"}'] >= 1
+    assert not any(str(tmdb_id) in labels for labels in requests)
+
+    upstream = series(r.text, "tmdb_request_duration_seconds_count")
+    assert upstream and not any(re.search(r"/\d", labels) for labels in upstream)
+    pool = series(r.text, "tmdb_pool_connections")
+    assert set(pool) == {'{state="active"}', '{state="idle"}', '{state="queued"}'}
+    assert pool['{state="idle"}'] + pool['{state="active"}'] >= 1  # the stub has been called
+    assert series(r.text, "tfidf_stage_seconds_count")['{stage="matmul"}'] >= 1
+
+
+def timing_app(server_timing: bool) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, histogram=Registry().histogram("req", "test", ("method", "route", "status")), server_timing=server_timing)
+
+    def score():
+        with tfidf_stage("matmul"):
+            pass
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        # the timing scope follows the request into worker threads
+        await asyncio.to_thread(score)
+        return {"id": item_id}
+
+    return app
+
+
+def test_server_timing_header_lists_stages():
+    with TestClient(timing_app(server_timing=True)) as client:
+        r = client.get("/items/7")
+    assert r.status_code == 200
+    stages = dict(part.split(";dur=") for part in r.headers["server-timing"].split(", "))
+    assert list(stages) == ["matmul", "app"]
+    assert 0 <= float(stages["matmul"]) <= float(stages["app"])
+
+
+def test_server_timing_is_off_by_default():
+    with TestClient(timing_app(server_timing=False)) as client:
+        r = client.get("/items/7")
+    assert "server-timing" not in r.headers
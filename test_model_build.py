@@ -0,0 +1,153 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+import model_build
+from conftest import catalog_frame
+
+
+@pytest.fixture(autouse=True)
+def raw_tags(monkeypatch):
+    # fit on the raw text, as in conftest: the NLTK cleaning step has its own data dependency
+    monkeypatch.setattr(model_build, "build_tags", lambda d: (d["overview"] + " " + d["genres"] + " " + d["tagline"]).str.lower().tolist())
+
+
+def write_csv(path, frame):
+    frame.to_csv(path, index=False)
+    return str(path)
+
+
+def full_model(tmp_path, frame):
+    new_df = model_build.load_catalog(write_csv(tmp_path / "old.csv", frame))
+    df, mat, _, tfidf, _ = model_build._full(new_df, 0.0, "test")
+    return df, mat, tfidf
+
+
+def update(tmp_path, old, frame):
+    new_df = model_build.load_catalog(write_csv(tmp_path / "new.csv", frame))
+    return model_build.update_model(new_df, *old)
+
+
+def test_incremental_build_appends_new_rows(tmp_path):
+    old = full_model(tmp_path, catalog_frame(100))
+    df, mat, indices, _, stats = update(tmp_path, old, catalog_frame(110))
+    assert stats["mode"] == "incremental"
+    assert stats["new_or_changed"] == 10
+    assert list(df["title"]) == list(old[0]["title"]) + list(catalog_frame(110)["title"][100:])
+    assert mat.shape[0] == len(df) == 110
+    np.testing.assert_array_equal(mat[:100].toarray(), old[1].toarray())
+    assert indices["Family Dog 104"] == 104
+
+
+def test_incremental_build_refreshes_changed_rows(tmp_path):
+    old = full_model(tmp_path, catalog_frame(100))
+    frame = catalog_frame(100)
+    frame.loc[5, "overview"] = "haunted ghost curse"
+    frame.loc[6, "vote_average"] = "9.9"  # not a text field: refreshed in place
+    df, mat, _, tfidf, stats = update(tmp_path, old, frame)
+    assert stats["mode"] == "incremental"
+    assert stats["new_or_changed"] == 1
+    assert df["title"].iloc[-1] == frame.loc[5, "title"]
+    assert frame.loc[5, "title"] not in set(df["title"].iloc[:-1])
+    np.testing.assert_allclose(mat[-1].toarray(), tfidf.transform(model_build.build_tags(df.iloc[[-1]])).toarray())
+    assert df.set_index("title").loc[frame.loc[6, "title"], "vote_average"] == 9.9
+
+
+def test_too_many_changes_fall_back_to_a_full_refit(tmp_path):
+    old = full_model(tmp_path, catalog_frame(100))
+    frame = catalog_frame(100)
+    frame.loc[:40, "overview"] = frame.loc[:40, "overview"] + " remastered"
+    *_, stats = update(tmp_path, old, frame)
+    assert stats["mode"] == "full"
+    assert "changed" in stats["reason"]
+
+
+def test_duplicate_keys_compare_against_the_kept_row(tmp_path):
+    old_df, old_mat, tfidf = full_model(tmp_path, catalog_frame(50))
+    # a later duplicate of row 0 with other content: dedup keeps row 0, so must the hash map
+    dup = old_df.iloc[[0]].assign(overview="something else", content_hash=np.uint64(12345))
+    old_df = pd.concat([old_df, dup], ignore_index=True)
+    old_mat = sparse.vstack([old_mat, old_mat[0]], format="csr")
+    df, mat, _, _, stats = update(tmp_path, (old_df, old_mat, tfidf), catalog_frame(50))
+    assert stats["new_or_changed"] == 0
+    assert len(df) == mat.shape[0] == 50
+
+
+def test_cached_build_names_incremental_sets_by_their_base(tmp_path):
+    cache = str(tmp_path / "cache")
+    v1 = write_csv(tmp_path / "v1.csv", catalog_frame(100))
+    v2 = write_csv(tmp_path / "v2.csv", catalog_frame(105))
+    key1, key2 = model_build.cache_key(v1), model_build.cache_key(v2)
+
+    model_build.cached_build(v1, cache_dir=cache)
+    model_build.cached_build(v2, cache_dir=cache)
+    incremental = [os.path.basename(d) for d in model_build._sets_for(cache, key2)]
+    assert len(incremental) == 1 and incremental[0].startswith(f"{key2}-")
+    info = model_build._build_info(os.path.join(cache, incremental[0]))
+    assert info["stats"]["mode"] == "incremental" and info["stats"]["base"] == key1
+
+    # the same content key from a full build is a different set, and both stay addressable
+    model_build.cached_build(v2, cache_dir=cache, force_full=True)
+    assert [os.path.basename(d) for d in model_build._sets_for(cache, key2)] == [key2, incremental[0]]
+    with open(os.path.join(cache, "CURRENT")) as f:
+        assert f.read() == key2
+
+
+def test_cache_key_follows_content_and_config(tmp_path, monkeypatch):
+    a = write_csv(tmp_path / "a.csv", catalog_frame(30))
+    same = write_csv(tmp_path / "copy.csv", catalog_frame(30))
+    other = write_csv(tmp_path / "b.csv", catalog_frame(31))
+    key = model_build.cache_key(a)
+    assert model_build.cache_key(same) == key
+    assert model_build.cache_key(other) != key
+    monkeypatch.setattr(model_build, "MODEL_VECTORIZER", "hashing")
+    assert model_build.cache_key(a) != key
+
+
+def test_cached_build_reuses_a_set_without_rebuilding(tmp_path, monkeypatch):
+    cache = str(tmp_path / "cache")
+    csv = write_csv(tmp_path / "a.csv", catalog_frame(30))
+    df, *_ = model_build.cached_build(csv, cache_dir=cache)
+
+    def no_build(*args, **kwargs):
+        raise AssertionError("cache hit rebuilt the model")
+
+    monkeypatch.setattr(model_build, "_full", no_build)
+    monkeypatch.setattr(model_build, "update_model", no_build)
+    again, *_ = model_build.cached_build(write_csv(tmp_path / "renamed.csv", catalog_frame(30)), cache_dir=cache)
+    assert list(again["title"]) == list(df["title"])
+
+
+def test_gc_keeps_the_most_recently_used_sets_and_current(tmp_path, monkeypatch):
+    cache = str(tmp_path / "cache")
+    monkeypatch.setattr(model_build, "MODEL_CACHE_KEEP", 10)  # no cleanup while the sets are built
+    keys = []
+    for i, n in enumerate((20, 21, 22, 23)):
+        csv = write_csv(tmp_path / f"v{i}.csv", catalog_frame(n))
+        model_build.cached_build(csv, cache_dir=cache, force_full=True)
+        key = model_build.cache_key(csv)
+        os.utime(os.path.join(cache, key, model_build.BUILD_INFO), (1000 + i, 1000 + i))
+        keys.append(key)
+    model_build.set_current(cache, keys[0])  # oldest, but served
+    stale_tmp = os.path.join(cache, f"{keys[1]}.tmp-999")
+    fresh_tmp = os.path.join(cache, f"{keys[2]}.tmp-998")
+    for d in (stale_tmp, fresh_tmp):
+        os.makedirs(d)
+    os.utime(stale_tmp, (0, 0))
+
+    model_build.gc_cache(cache, keep=2)
+    left = {os.path.basename(d) for d in model_build._cached_sets(cache)}
+    assert left == {keys[3], keys[2], keys[0]}
+    assert not os.path.exists(stale_tmp)
+    assert os.path.exists(fresh_tmp)  # may belong to a build still running
+
+
+def test_duplicates_are_dropped_across_chunks(tmp_path):
+    frame = catalog_frame(12)
+    frame["budget"] = range(12)  # not read by the model, so it does not tell rows apart
+    dupes = pd.concat([frame, frame.iloc[[0, 5, 11]].assign(budget=-1)], ignore_index=True)
+    df = model_build.load_catalog(write_csv(tmp_path / "dupes.csv", dupes), chunksize=5)
+    assert list(df["title"]) == list(frame["title"])
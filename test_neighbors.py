@@ -0,0 +1,28 @@
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+from build_neighbors import build_neighbors
+from similarity import ExactEngine
+
+
+def tfidf_like(n_rows: int = 300, n_features: int = 500, seed: int = 0) -> sparse.csr_matrix:
+    return normalize(sparse.random(n_rows, n_features, density=0.03, format="csr", random_state=seed))
+
+
+def test_neighbor_table_matches_live_top_n():
+    mat = tfidf_like()
+    nbr_idx, nbr_scores = build_neighbors(mat, k=10, chunk_size=64)
+    engine = ExactEngine(mat)
+    rows = np.arange(0, mat.shape[0], 7)
+    live = engine.search(mat[rows], 10, exclude=[[r] for r in rows])
+    for r, (live_rows, live_scores) in zip(rows, live):
+        assert list(nbr_idx[r]) == list(live_rows)
+        np.testing.assert_allclose(nbr_scores[r], live_scores, rtol=1e-5, atol=1e-6)
+
+
+def test_neighbor_table_never_lists_the_movie_itself():
+    mat = tfidf_like(n_rows=50)
+    nbr_idx, _ = build_neighbors(mat, k=49, chunk_size=16)
+    assert nbr_idx.shape == (50, 49)
+    assert not (nbr_idx == np.arange(50)[:, None]).any()
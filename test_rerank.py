@@ -0,0 +1,33 @@
+import numpy as np
+
+from conftest import rec_titles as titles
+from rerank import Reranker
+
+
+def test_rerank_overrides_change_the_order(api, by_title):
+    base = titles(api.get("/recommend/tfidf", params={"title": "Starship Galaxy 0", "top_n": 10}))
+    rated = titles(api.get("/recommend/tfidf", params={"title": "Starship Galaxy 0", "top_n": 10, "w_sim": 0.2, "w_rating": 1}))
+    assert len(rated) == 10
+    assert rated != base
+    mean_rating = lambda ts: by_title.loc[ts, "vote_average"].mean()
+    assert mean_rating(rated) >= mean_rating(base)
+
+
+def test_mmr_diversity_returns_top_n(api):
+    r = api.get("/recommend/tfidf", params={"title": "Haunted Ghost 3", "top_n": 8, "mmr_lambda": 0.5})
+    assert len(titles(r)) == 8
+
+
+def test_blend_and_mmr_on_known_candidates():
+    reranker = Reranker(popularity=np.array([1, 1000, 1, 1]), vote_average=np.array([5, 5, 9, 5]))
+    rows, sim = np.array([0, 1, 2, 3]), np.array([0.9, 0.8, 0.7, 0.85])
+    assert reranker.is_identity()
+    assert reranker.rerank(rows, sim, 4)[0].tolist() == [0, 3, 1, 2]
+    assert reranker.rerank(rows, sim, 2, weights={"popularity": 1.0})[0].tolist() == [1, 0]
+    assert reranker.rerank(rows, sim, 1, weights={"similarity": 0.1, "rating": 1.0})[0].tolist() == [2]
+
+    # rows 0 and 3 are near-duplicates: MMR trades the second for a different row
+    pairwise = np.eye(4, dtype=np.float32)
+    pairwise[0, 3] = pairwise[3, 0] = 0.95
+    picked, _ = reranker.rerank(rows, sim, 2, pairwise=lambda r: pairwise[np.ix_(r, r)], mmr_lambda=0.5)
+    assert picked.tolist() == [0, 1]
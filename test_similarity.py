@@ -0,0 +1,60 @@
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+from similarity import DenseEngine, IVFEngine, build_dense, build_ivf, load_ivf, quality_report, save_ivf
+
+
+def clustered_tfidf(n_rows: int = 600, n_topics: int = 6, vocab: int = 60, seed: int = 0) -> sparse.csr_matrix:
+    # each topic draws most of its terms from its own slice of the vocabulary
+    rng = np.random.default_rng(seed)
+    n_features = n_topics * vocab
+    rows = []
+    for i in range(n_rows):
+        topic = i % n_topics
+        own = rng.choice(vocab, 12, replace=False) + topic * vocab
+        shared = rng.choice(n_features, 3, replace=False)
+        row = np.zeros(n_features, dtype=np.float32)
+        row[own] = rng.random(12) + 0.5
+        row[shared] += rng.random(3) * 0.3
+        rows.append(row)
+    return normalize(sparse.csr_matrix(np.vstack(rows)))
+
+
+def test_ivf_recall_against_exact():
+    mat = clustered_tfidf()
+    index = build_ivf(mat, dim=32, n_lists=12)
+    probed = quality_report(mat, IVFEngine(index, mat, nprobe=4, rerank=200), n_queries=100)
+    assert probed["recall"] >= 0.9
+    everything = quality_report(mat, IVFEngine(index, mat, nprobe=12, rerank=mat.shape[0]), n_queries=100)
+    assert everything["recall"] == 1.0
+
+
+def test_ivf_index_round_trips_and_replaces_the_old_one(tmp_path):
+    mat = clustered_tfidf(n_rows=120)
+    out = str(tmp_path / "ann")
+    save_ivf(out, build_ivf(mat, dim=8, n_lists=4, seed=1))
+    index = build_ivf(mat, dim=16, n_lists=6)
+    save_ivf(out, index)
+    loaded = load_ivf(out)
+    assert loaded["manifest"]["n_lists"] == 6
+    for name in ("projection", "centroids", "list_offsets", "list_rows", "list_embeddings"):
+        np.testing.assert_array_equal(loaded[name], index[name])
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["ann"]  # no temp or old dirs left behind
+
+
+def test_dense_recall_grows_with_dim_and_float16_matches():
+    mat = clustered_tfidf()
+    reports = [quality_report(mat, DenseEngine(build_dense(mat, dim=d)), n_queries=100) for d in (16, 128, 359)]
+    recalls = [r["recall"] for r in reports]
+    assert recalls == sorted(recalls) and recalls[0] < recalls[-1]
+    # at full rank the embeddings reproduce the sparse cosines
+    assert reports[-1]["recall"] == 1.0
+    assert reports[1]["score_ratio"] >= 0.9
+
+    index32 = build_dense(mat, dim=48)
+    engine16 = DenseEngine(build_dense(mat, dim=48, dtype="float16"))
+    engine16.UPCAST_ROWS = 100  # several widening blocks over 600 rows
+    assert engine16.embeddings.dtype == np.float16
+    qm = mat[:5]
+    np.testing.assert_allclose(engine16.scores(qm), DenseEngine(index32).scores(qm), atol=5e-3)
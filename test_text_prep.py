@@ -0,0 +1,82 @@
+import multiprocessing
+import re
+
+import nltk
+import pytest
+
+import text_prep
+
+
+def nltk_data_available() -> bool:
+    try:
+        text_prep.load_nltk()
+        return True
+    except LookupError:
+        return False
+
+
+def no_download(*args, **kwargs):
+    raise AssertionError("nltk.download called on the serving path")
+
+
+def test_load_nltk_never_downloads_by_default(monkeypatch):
+    monkeypatch.setattr(nltk, "download", no_download)
+    if nltk_data_available():
+        stop_words, lemmatizer = text_prep.load_nltk()
+        assert "the" in stop_words
+    else:
+        with pytest.raises(LookupError):
+            text_prep.load_nltk()
+
+
+def test_text_queries_fail_fast_without_corpora(api, monkeypatch):
+    import main
+
+    monkeypatch.setattr(nltk, "download", no_download)
+    monkeypatch.setattr(main, "TEXT_PREP_READY", False)
+    r = api.get("/recommend/text", params={"q": "haunted ghost"})
+    assert r.status_code == 503
+    assert "NLTK" in r.json()["detail"]
+
+
+class SuffixLemmatizer:
+    """Stand-in for WordNetLemmatizer, so the test needs no corpora."""
+
+    def lemmatize(self, word):
+        return word[:-1] if word.endswith("s") and len(word) > 3 else word
+
+
+@pytest.fixture
+def fake_nltk(monkeypatch):
+    monkeypatch.setattr(text_prep, "_stop_words", {"the", "a", "of", "and", "in"})
+    monkeypatch.setattr(text_prep, "_lemmatizer", SuffixLemmatizer())
+    text_prep._lemmatize.cache_clear()
+    yield text_prep._stop_words, text_prep._lemmatizer
+    text_prep._lemmatize.cache_clear()
+
+
+def baseline_preprocess(text, stop_words, lemmatizer):
+    # the original per-row loop from app.py
+    text = str(text).lower()
+    text = re.sub(r'[^a-zA-Z\s]', '', text)
+    words = [w for w in text.split() if w not in stop_words]
+    return " ".join(lemmatizer.lemmatize(w) for w in words)
+
+
+SAMPLES = [
+    "The Ghosts of Paris", "  Starships   and\tplanets\n", "Amélie's 2nd Letters!", "İstanbul KELVIN K",
+    None, 3.5, "", "a the of", "Detectives in the City of Heists",
+]
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="workers must inherit the stand-in corpora")
+def test_parallel_preprocessing_is_byte_identical(fake_nltk, monkeypatch):
+    stop_words, lemmatizer = fake_nltk
+    texts = SAMPLES * 40
+    expected = [baseline_preprocess(t, stop_words, lemmatizer) for t in texts]
+    monkeypatch.setattr(text_prep, "PARALLEL_MIN_ROWS", 0)
+
+    serial = text_prep.preprocess_texts(texts, n_jobs=1, report=False)
+    parallel = text_prep.preprocess_texts(texts, n_jobs=3, chunk_size=7, report=False)
+    assert [s.encode() for s in serial] == [e.encode() for e in expected]
+    assert [p.encode() for p in parallel] == [e.encode() for e in expected]
@@ -0,0 +1,70 @@
+import numpy as np
+
+from titles import TitleIndex, normalize_title
+
+
+CATALOG = ["The Godfather", "The Godfather Part II", "Amélie", "Godzilla", "The Matrix", "Matrix Revolutions", "Hamlet", "Hamlet"]
+POPULARITY = np.array([90, 60, 40, 30, 80, 20, 5, 15], dtype=np.float32)
+YEARS = np.array([1972, 1974, 2001, 1998, 1999, 2003, 1948, 1996])
+
+
+def index() -> TitleIndex:
+    return TitleIndex(CATALOG, popularity=POPULARITY, years=YEARS)
+
+
+def test_normalize_folds_accents_case_and_punctuation():
+    assert normalize_title("Amélie!") == normalize_title("AMELIE") == "amelie"
+    assert normalize_title("  Fast & Furious ") == "fast and furious"
+
+
+def test_prefix_suggestions_rank_exact_then_title_start_then_mid_title():
+    rows = [CATALOG[r] for r, _, match in index().suggest("godf", limit=5) if match == "prefix"]
+    assert rows == ["The Godfather", "The Godfather Part II"]
+    rows = [CATALOG[r] for r, _, _ in index().suggest("matrix", limit=2)]
+    assert rows == ["Matrix Revolutions", "The Matrix"]  # title start beats a more popular mid-title hit
+
+
+def test_fuzzy_suggestions_catch_typos():
+    hits = index().suggest("godfahter", limit=3)
+    assert CATALOG[hits[0][0]] == "The Godfather"
+    assert hits[0][2] == "fuzzy"
+    assert index().suggest("zzzzqqq") == []
+
+
+def test_lookup_is_forgiving_about_spelling_of_the_same_title():
+    idx = index()
+    assert idx.lookup("amelie") == idx.lookup("Amélie") == 2
+    assert idx.lookup("No Such Film") is None
+
+
+def test_suggest_endpoint(api):
+    r = api.get("/titles/suggest", params={"q": "haunted gho", "limit": 5})
+    assert r.status_code == 200, r.text
+    items = r.json()
+    assert len(items) == 5
+    assert all(item["title"].startswith("Haunted Ghost") and item["match"] == "prefix" for item in items)
+    typo = api.get("/titles/suggest", params={"q": "detectve murdr 1", "limit": 1}).json()
+    assert typo[0]["title"].startswith("Detective Murder")
+
+
+def test_duplicate_titles_keep_every_edition_most_popular_first():
+    idx = index()
+    assert idx.editions("hamlet").tolist() == [7, 6]
+    assert idx.lookup("Hamlet") == 7
+    assert idx.lookup("Hamlet", year=1948) == 6
+    assert idx.lookup("Hamlet (1948)") == 6
+    assert idx.lookup("Hamlet", year=2020) is None
+    assert [r for r, _, _ in idx.suggest("haml")] == [7, 6]
+
+
+def test_editions_endpoint_and_year_selection(api, catalog):
+    row = catalog.iloc[12]
+    year = int(row["release_date"][:4])
+    editions = api.get("/titles/editions", params={"title": row["title"].upper()}).json()
+    assert editions == [{"title": row["title"], "year": year, "tmdb_id": int(row["id"])}]
+
+    params = {"title": row["title"], "top_n": 3}
+    assert api.get("/recommend/tfidf", params={**params, "year": year}).status_code == 200
+    missing = api.get("/recommend/tfidf", params={**params, "year": year + 1})
+    assert missing.status_code == 404
+    assert f"({year + 1})" in missing.json()["detail"]
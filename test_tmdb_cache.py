@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from tmdb_cache import AsyncTTLCache
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_misses_share_one_fetch():
+    async def scenario():
+        cache = AsyncTTLCache()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"n": calls}, 10
+
+        results = await asyncio.gather(*(cache.get_or_fetch("k", 60, fetch) for _ in range(5)))
+        return calls, results, cache.stats()
+
+    calls, results, stats = run(scenario())
+    assert calls == 1
+    assert all(r == {"n": 1} for r in results)
+    assert stats["misses"] == 1 and stats["coalesced"] == 4 and stats["inflight"] == 0
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def scenario():
+        cache = AsyncTTLCache()
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return "value", 5
+
+        leader = asyncio.create_task(cache.get_or_fetch("k", 60, fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_fetch("k", 60, fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower, cache.get("k")
+
+    value, cached = run(scenario())
+    assert value == "value"
+    assert cached == "value"
+
+
+def test_failures_reach_every_waiter_and_are_not_cached():
+    async def scenario():
+        cache = AsyncTTLCache()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(*(cache.get_or_fetch("k", 60, fetch) for _ in range(3)), return_exceptions=True)
+        return results, cache.get("k"), cache.stats()["inflight"]
+
+    results, cached, inflight = run(scenario())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert cached is None and inflight == 0
+
+
+def test_lru_bound_by_bytes():
+    cache = AsyncTTLCache(max_entries=10, max_bytes=100)
+    for i in range(5):
+        cache.set(i, i, ttl=60, nbytes=40)
+    assert cache.get(0) is None and cache.get(4) == 4
+    assert cache.stats()["bytes"] <= 100
@@ -0,0 +1,92 @@
+"""
+Text cleaning shared by the model build (app.py) and free-text queries (main.py).
+
+Both sides must run exactly the same preprocessing, otherwise query vectors
+land in a different part of the TF-IDF space than the catalog rows.
+"""
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+import nltk
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+
+
+_NON_ALPHA_RE = re.compile(r'[^a-zA-Z\s]')
+
+_stop_words = None
+_lemmatizer = None
+
+# below this many rows a process pool costs more than it saves
+PARALLEL_MIN_ROWS = 5000
+
+
+def load_nltk(download: bool = False):
+    """Stopwords and lemmatizer, loaded once per process.
+
+    Missing corpora raise LookupError unless download=True, which only the
+    build side passes: the API must never reach the network from a request.
+    """
+    global _stop_words, _lemmatizer
+    if _stop_words is None:
+        try:
+            words = stopwords.words('english')
+            WordNetLemmatizer().lemmatize('movies')
+        except LookupError:
+            if not download:
+                raise
+            nltk.download('stopwords', quiet=True)
+            nltk.download('wordnet', quiet=True)
+            words = stopwords.words('english')
+        _stop_words = set(words)
+        _lemmatizer = WordNetLemmatizer()
+    return _stop_words, _lemmatizer
+
+
+@lru_cache(maxsize=1 << 18)
+def _lemmatize(word):
+    # the vocabulary is far smaller than the token count, so memoize per token
+    return load_nltk()[1].lemmatize(word)
+
+
+def preprocess_text(text):
+    stop_words, _ = load_nltk()
+    words = _NON_ALPHA_RE.sub('', str(text).lower()).split()
+    return " ".join(_lemmatize(w) for w in words if w not in stop_words)
+
+
+def _preprocess_chunk(texts):
+    return [preprocess_text(t) for t in texts]
+
+
+def preprocess_texts(
+    texts: Sequence,
+    n_jobs: Optional[int] = None,
+    chunk_size: int = 2000,
+    report: bool = True,
+) -> List[str]:
+    """preprocess_text over many rows, split into chunks across a process pool.
+
+    Output is identical to the serial loop. n_jobs defaults to the CPU count;
+    n_jobs=1 or small inputs run in-process.
+    """
+    t0 = time.perf_counter()
+    texts = list(texts)
+    load_nltk(download=True)  # fetch missing corpora once, before any worker looks for them
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs <= 1 or len(texts) < PARALLEL_MIN_ROWS:
+        n_jobs = 1
+        out = _preprocess_chunk(texts)
+    else:
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            out = [row for chunk in pool.map(_preprocess_chunk, chunks) for row in chunk]
+    if report:
+        elapsed = time.perf_counter() - t0
+        rate = len(texts) / elapsed if elapsed > 0 else float('inf')
+        print(f"Preprocessed {len(texts):,} rows in {elapsed:.1f}s ({rate:,.0f} rows/s, {n_jobs} worker(s))")
+    return out
@@ -0,0 +1,117 @@
+"""
+In-process async response cache for TMDB lookups.
+
+TTL per entry, LRU eviction bounded by entry count and payload bytes, and
+single-flight coalescing: concurrent misses for one key share a single
+upstream call. Cached values are shared between callers and must be
+treated as read-only.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+def _consume_exception(task: asyncio.Future) -> None:
+    # every waiter may have been cancelled; mark the failure retrieved so it is not logged
+    if not task.cancelled():
+        task.exception()
+
+
+class AsyncTTLCache:
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (expires_at, nbytes, value), least recently used first
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self._drop(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float, nbytes: int = 0) -> None:
+        if ttl <= 0 or nbytes > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + ttl, nbytes, value)
+        self._bytes += nbytes
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    async def get_or_fetch(
+        self,
+        key: Hashable,
+        ttl: float,
+        fetch: Callable[[], Awaitable[Tuple[Any, int]]],
+    ) -> Any:
+        """Return the cached value for key, calling fetch() at most once per miss.
+
+        fetch must return (value, nbytes). It runs in a task the cache owns,
+        so a caller that is cancelled stops waiting without aborting the
+        fetch for everyone else sharing it. Failures are not cached; every
+        caller waiting on the failed fetch sees the same exception.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fetch(key, ttl, fetch))
+            task.add_done_callback(_consume_exception)
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: Hashable, ttl: float, fetch: Callable[[], Awaitable[Tuple[Any, int]]]) -> Any:
+        try:
+            value, nbytes = await fetch()
+            self.set(key, value, ttl, nbytes)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+    def _drop(self, key: Hashable) -> None:
+        _, nbytes, _ = self._entries.pop(key)
+        self._bytes -= nbytes
@@ -0,0 +1,491 @@
+"""
+Local stand-in for the TMDB v3 API, for benchmarks and offline load tests.
+
+    python tmdb_stub.py --port 8799 --latency-ms 40 --jitter-ms 10
+    TMDB_BASE_URL=http://127.0.0.1:8799 uvicorn main:app
+
+Serves the routes main.py calls: /search/movie, /movie/{id},
+/discover/movie, /trending/movie/day and the category feeds. Each request
+is answered from the first source that has it:
+
+    fixtures   recorded responses (--fixtures DIR), one JSON file per
+               request, keyed by path plus query params without api_key.
+               With --record, misses are fetched once from --upstream
+               (TMDB_API_KEY from the environment) and saved for replay.
+    catalog    the local model (--catalog MODEL_DIR): movie_meta.npz ids,
+               posters and dates, titles and genres from the artifact
+               bundle or df.pkl. Searches go through titles.TitleIndex,
+               so ids line up with the rows the API serves.
+    synthetic  deterministic TMDB-shaped movies derived from the request
+
+Fault injection reproduces production tail latency:
+
+    --latency-ms / --jitter-ms   base delay per response
+    --slow-rate / --slow-ms      share of responses delayed by an extra spike
+    --error-rate                 share answered 500/502/503 after the delay
+    --rate-limit / --rate-burst  token bucket in requests per second; above
+                                 it TMDB's 429 body and a Retry-After header
+
+The server runs on asyncio streams with HTTP/1.1 keep-alive, so one
+process keeps up with the API's whole connection pool. GET /__stub/stats
+returns request counts by status, source and path, and the peak number of
+requests in flight.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from filters import TMDB_GENRE_IDS, release_years, split_genres
+
+
+_ID_RE = re.compile(r"/\d+(?=/|$)")
+GENRE_IDS = [28, 12, 16, 35, 80, 18, 14, 27, 10749, 878, 53]
+GENRE_ID_BY_NAME = {name: gid for gid, name in TMDB_GENRE_IDS.items()}
+
+Response = Tuple[int, Dict[str, Any], Dict[str, str]]
+
+
+def _movie_id(text: str) -> int:
+    return zlib.crc32(text.lower().encode()) % 1_000_000 + 1
+
+
+def _empty_page(page: int) -> Dict[str, Any]:
+    return {"page": page, "results": [], "total_pages": 0, "total_results": 0}
+
+
+def _not_found() -> Dict[str, Any]:
+    return {"success": False, "status_code": 34, "status_message": "The resource you requested could not be found."}
+
+
+# =========================
+# FIXTURES
+# =========================
+class FixtureStore:
+    """Recorded responses, one JSON file per request: {"path", "params", "status", "body"}."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._entries: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        for name in os.listdir(directory):
+            if name.endswith(".json"):
+                with open(os.path.join(directory, name)) as f:
+                    fx = json.load(f)
+                self._entries[self.key(fx["path"], fx.get("params", {}))] = (int(fx.get("status", 200)), fx["body"])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(path: str, params: Dict[str, str]) -> str:
+        # same normalisation as main.tmdb_cache_key, so a replay matches however the query was typed
+        norm = sorted(
+            (k, " ".join(str(v).lower().split()) if k == "query" else str(v).strip())
+            for k, v in params.items() if k != "api_key"
+        )
+        return hashlib.sha1(json.dumps([path, norm]).encode()).hexdigest()
+
+    def get(self, path: str, params: Dict[str, str]) -> Optional[Tuple[int, Dict[str, Any]]]:
+        return self._entries.get(self.key(path, params))
+
+    def put(self, path: str, params: Dict[str, str], status: int, body: Dict[str, Any]) -> None:
+        key = self.key(path, params)
+        self._entries[key] = (status, body)
+        clean = {k: v for k, v in params.items() if k != "api_key"}
+        with open(os.path.join(self.directory, f"{key}.json"), "w") as f:
+            json.dump({"path": path, "params": clean, "status": status, "body": body}, f)
+
+
+# =========================
+# CATALOG
+# =========================
+class StubCatalog:
+    """TMDB-shaped answers from a local model directory."""
+
+    def __init__(self, model_dir: str):
+        from artifacts import bundle_exists, load_bundle
+        from movie_meta import load_movie_meta
+        from titles import TitleIndex
+
+        bundle_dir = os.path.join(model_dir, "artifacts")
+        if bundle_exists(bundle_dir):
+            bundle = load_bundle(bundle_dir)
+            df = bundle.dataframe(["title", "overview", "genres", "popularity", "vote_count"])
+        else:
+            import pandas as pd
+            df = pd.read_pickle(os.path.join(model_dir, "df.pkl"))
+        meta = load_movie_meta(os.path.join(model_dir, "movie_meta.npz"))
+        self.titles = df["title"].astype(str).tolist()
+        self.overviews = df["overview"].astype(str).tolist() if "overview" in df.columns else [""] * len(df)
+        self.genres = [[GENRE_ID_BY_NAME[g] for g in split_genres(x)] for x in df["genres"]]
+        self.popularity = np.nan_to_num(df["popularity"].to_numpy(dtype=np.float64))
+        self.vote_count = df["vote_count"].to_numpy() if "vote_count" in df.columns else np.zeros(len(df))
+        self.meta = meta
+        self.years = release_years(meta["release_date"])
+        self.title_index = TitleIndex(self.titles, self.popularity, self.years)
+
+        ids = meta["tmdb_id"]
+        self.row_by_id = {int(i): r for r, i in enumerate(ids) if i > 0}
+        listed = np.flatnonzero(ids > 0)
+        by_pop = listed[np.argsort(-self.popularity[listed], kind="stable")]
+        rated = listed[self.vote_count[listed] >= np.median(self.vote_count[listed])] if len(listed) else listed
+        by_date = listed[np.argsort(meta["release_date"][listed], kind="stable")[::-1]]
+        self.feeds = {
+            "/movie/popular": by_pop,
+            "/trending/movie/day": by_pop,
+            "/trending/movie/week": by_pop,
+            "/movie/top_rated": rated[np.argsort(-meta["vote_average"][rated], kind="stable")],
+            "/movie/now_playing": by_date,
+            "/movie/upcoming": by_date,
+        }
+        genre_rows: Dict[int, List[int]] = {}
+        for r in by_pop.tolist():
+            for gid in self.genres[r]:
+                genre_rows.setdefault(gid, []).append(r)
+        self.by_genre = {gid: np.asarray(rows, dtype=np.int64) for gid, rows in genre_rows.items()}
+
+    def movie(self, row: int) -> Dict[str, Any]:
+        poster = self.meta["poster_path"][row].decode("ascii") or None
+        return {
+            "id": int(self.meta["tmdb_id"][row]),
+            "title": self.titles[row],
+            "overview": self.overviews[row],
+            "poster_path": poster,
+            "backdrop_path": poster,
+            "release_date": self.meta["release_date"][row].decode("ascii"),
+            "genre_ids": self.genres[row],
+            "vote_average": float(self.meta["vote_average"][row]),
+            "vote_count": int(self.vote_count[row]),
+            "popularity": float(self.popularity[row]),
+        }
+
+    def page(self, rows: np.ndarray, page: int, size: int) -> Dict[str, Any]:
+        chunk = rows[(page - 1) * size:page * size]
+        return {
+            "page": page,
+            "results": [self.movie(int(r)) for r in chunk],
+            "total_pages": -(-len(rows) // size),
+            "total_results": int(len(rows)),
+        }
+
+    def handle(self, path: str, params: Dict[str, str], page: int, size: int) -> Optional[Tuple[int, Dict[str, Any]]]:
+        parts = path.strip("/").split("/")
+        if path == "/search/movie":
+            hits = self.title_index.suggest(params.get("query", ""), limit=size)
+            rows = np.array([r for r, _, _ in hits if self.meta["tmdb_id"][r] > 0], dtype=np.int64)
+            return 200, self.page(rows, 1, size) if page == 1 else _empty_page(page)
+        if len(parts) == 2 and parts[0] == "movie" and parts[1].isdigit():
+            row = self.row_by_id.get(int(parts[1]))
+            if row is None:
+                return 404, _not_found()
+            movie = self.movie(row)
+            movie["genres"] = [{"id": g, "name": TMDB_GENRE_IDS[g]} for g in movie.pop("genre_ids")]
+            return 200, movie
+        if path == "/discover/movie":
+            gid = params.get("with_genres", "").split(",")[0]
+            rows = self.by_genre.get(int(gid), np.empty(0, dtype=np.int64)) if gid.isdigit() else self.feeds["/movie/popular"]
+            return 200, self.page(rows, page, size)
+        if path in self.feeds:
+            return 200, self.page(self.feeds[path], page, size)
+        return None
+
+
+# =========================
+# SERVER
+# =========================
+class TMDBStub:
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        page_size: int = 20,
+        seed: int = 0,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_ms: float = 0.0,
+        rate_limit: float = 0.0,
+        rate_burst: Optional[int] = None,
+        fixtures: Optional[FixtureStore] = None,
+        catalog: Optional[StubCatalog] = None,
+        upstream: Optional[str] = None,
+    ):
+        """rate_limit is requests per second (0 = unlimited), with bursts of rate_burst (default: one second's worth).
+
+        With `upstream` set, fixture misses are fetched from it and recorded.
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.page_size = page_size
+        self.rng = random.Random(seed)
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst or max(1, int(rate_limit))
+        self._tokens = float(self.rate_burst)
+        self._refilled = time.monotonic()
+        self.fixtures = fixtures
+        self.catalog = catalog
+        self.upstream = upstream
+        self._upstream_client: Any = None
+        self.requests = 0
+        self.by_status: Dict[int, int] = {}
+        self.by_source: Dict[str, int] = {}
+        self.by_path: Dict[str, int] = {}
+        self.inflight = 0
+        self.max_inflight = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "by_status": {str(k): v for k, v in sorted(self.by_status.items())},
+            "by_source": dict(self.by_source),
+            "by_path": dict(sorted(self.by_path.items())),
+            "max_inflight": self.max_inflight,
+        }
+
+    def movie(self, movie_id: int, title: Optional[str] = None) -> Dict[str, Any]:
+        genre = GENRE_IDS[movie_id % len(GENRE_IDS)]
+        return {
+            "id": movie_id,
+            "title": title or f"Movie {movie_id}",
+            "overview": f"Synthetic overview for movie {movie_id}.",
+            "poster_path": f"/stub{movie_id}.jpg",
+            "backdrop_path": f"/stub{movie_id}_b.jpg",
+            "release_date": f"{1950 + movie_id % 75}-01-01",
+            "genre_ids": [genre],
+            "vote_average": round(5 + (movie_id % 50) / 10, 1),
+            "vote_count": movie_id % 5000,
+            "popularity": float(movie_id % 1000),
+        }
+
+    def page(self, seed_text: str, page: int) -> Dict[str, Any]:
+        base = _movie_id(f"{seed_text}:{page}")
+        results = [self.movie(base + i) for i in range(self.page_size)]
+        return {"page": page, "results": results, "total_pages": 10, "total_results": 10 * self.page_size}
+
+    def handle(self, path: str, params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        """(status, JSON body) for one GET, synthesised from the request."""
+        page = int(params.get("page") or 1)
+        parts = path.strip("/").split("/")
+        if path == "/search/movie":
+            query = params.get("query", "").strip()
+            if not query:
+                return 200, _empty_page(page)
+            hit = self.movie(_movie_id(query), title=query)
+            return 200, {"page": page, "results": [hit], "total_pages": 1, "total_results": 1}
+        if len(parts) == 2 and parts[0] == "movie" and parts[1].isdigit():
+            movie = self.movie(int(parts[1]))
+            movie["genres"] = [{"id": g, "name": TMDB_GENRE_IDS.get(g, str(g))} for g in movie.pop("genre_ids")]
+            movie["runtime"] = 90 + int(parts[1]) % 60
+            return 200, movie
+        if path == "/discover/movie":
+            return 200, self.page(f"discover:{params.get('with_genres', '')}", page)
+        if parts[0] in ("movie", "trending"):
+            return 200, self.page(path, page)
+        return 404, _not_found()
+
+    def _take_token(self) -> float:
+        """0 when the request may pass, else seconds until the bucket has a token."""
+        if self.rate_limit <= 0:
+            return 0.0
+        now = time.monotonic()
+        self._tokens = min(self.rate_burst, self._tokens + (now - self._refilled) * self.rate_limit)
+        self._refilled = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate_limit
+
+    async def _fetch_upstream(self, path: str, params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        import httpx
+
+        if self._upstream_client is None:
+            self._upstream_client = httpx.AsyncClient(base_url=self.upstream.rstrip("/"), timeout=30)
+        r = await self._upstream_client.get(path, params={**params, "api_key": os.getenv("TMDB_API_KEY", "")})
+        return r.status_code, r.json()
+
+    async def _answer(self, path: str, params: Dict[str, str]) -> Tuple[str, int, Dict[str, Any]]:
+        if self.fixtures is not None:
+            hit = self.fixtures.get(path, params)
+            if hit is not None:
+                return ("fixture",) + hit
+            if self.upstream:
+                status, body = await self._fetch_upstream(path, params)
+                if status in (200, 404):
+                    self.fixtures.put(path, params, status, body)
+                return ("upstream", status, body)
+        if self.catalog is not None:
+            page = int(params.get("page") or 1)
+            hit = self.catalog.handle(path, params, page, self.page_size)
+            if hit is not None:
+                return ("catalog",) + hit
+        return ("synthetic",) + self.handle(path, params)
+
+    async def respond(self, path: str, params: Dict[str, str]) -> Response:
+        """(status, body, extra headers) after rate limiting, delays and injected errors."""
+        if path == "/__stub/stats":
+            return 200, self.stats(), {}
+        self.requests += 1
+        template = _ID_RE.sub("/{id}", path)
+        self.by_path[template] = self.by_path.get(template, 0) + 1
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            return await self._respond(path, params)
+        finally:
+            self.inflight -= 1
+
+    async def _respond(self, path: str, params: Dict[str, str]) -> Response:
+        retry_after = self._take_token()
+        if retry_after:
+            # TMDB rejects over-limit requests straight away
+            status, source = 429, "rate_limit"
+            body = {"success": False, "status_code": 25, "status_message": f"Your request count is over the allowed limit of {self.rate_burst}."}
+            headers = {"Retry-After": str(max(1, round(retry_after)))}
+        else:
+            delay = self.latency_ms + (self.rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0)
+            if self.slow_rate and self.rng.random() < self.slow_rate:
+                delay += self.slow_ms
+            if delay > 0:
+                await asyncio.sleep(delay / 1000)
+            if self.error_rate and self.rng.random() < self.error_rate:
+                status, source = self.rng.choice((500, 502, 503)), "error"
+                body = {"success": False, "status_code": 11, "status_message": "Internal error: Something went wrong, contact TMDB."}
+            else:
+                source, status, body = await self._answer(path, params)
+            headers = {}
+        self.by_status[status] = self.by_status.get(status, 0) + 1
+        self.by_source[source] = self.by_source.get(source, 0) + 1
+        return status, body, headers
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                _, target, _ = request_line.decode("latin-1").split(" ", 2)
+                url = urlsplit(target)
+                status, body, extra = await self.respond(url.path, dict(parse_qsl(url.query)))
+                payload = json.dumps(body).encode()
+                close = headers.get("connection", "").lower() == "close"
+                head = [
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}",
+                    "Content-Type: application/json;charset=utf-8",
+                    f"Content-Length: {len(payload)}",
+                    f"Connection: {'close' if close else 'keep-alive'}",
+                ] + [f"{k}: {v}" for k, v in extra.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, ValueError, asyncio.CancelledError):
+            pass  # client went away, malformed request, or the server is stopping
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8799) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._serve_connection, host, port, backlog=1024)
+
+
+def start_in_thread(stub: TMDBStub, host: str = "127.0.0.1", port: int = 0) -> Tuple[str, Any]:
+    """Run the stub on its own event loop thread; returns (base url, stop())."""
+    loop = asyncio.new_event_loop()
+    started: Dict[str, Any] = {}
+    ready = threading.Event()
+
+    async def _run():
+        server = await stub.serve(host, port)
+        started["server"] = server
+        started["port"] = server.sockets[0].getsockname()[1]
+        ready.set()
+        try:
+            await server.serve_forever()
+        except asyncio.CancelledError:
+            pass  # stop() closed the server
+        # idle keep-alive connections are still parked in readline()
+        pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    thread = threading.Thread(target=lambda: loop.run_until_complete(_run()), daemon=True)
+    thread.start()
+    ready.wait()
+
+    def stop():
+        loop.call_soon_threadsafe(started["server"].close)
+        thread.join(timeout=5)
+
+    return f"http://{host}:{started['port']}", stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local TMDB stand-in for offline benchmarks and load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="uniform +- spread around --latency-ms")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of responses delayed by --slow-ms more")
+    parser.add_argument("--slow-ms", type=float, default=2000.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of responses answered 500/502/503")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests per second before 429s (0 = off)")
+    parser.add_argument("--rate-burst", type=int, default=None, help="token bucket size (default: one second's worth)")
+    parser.add_argument("--catalog", default=None, help="model dir to answer from (movie_meta.npz + artifacts/ or df.pkl)")
+    parser.add_argument("--fixtures", default=None, help="directory of recorded responses to replay")
+    parser.add_argument("--record", action="store_true", help="fetch fixture misses from --upstream and save them")
+    parser.add_argument("--upstream", default="https://api.themoviedb.org/3")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.record and not args.fixtures:
+        parser.error("--record needs --fixtures DIR")
+
+    fixtures = FixtureStore(args.fixtures) if args.fixtures else None
+    catalog = StubCatalog(args.catalog) if args.catalog else None
+    stub = TMDBStub(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, seed=args.seed,
+        error_rate=args.error_rate, slow_rate=args.slow_rate, slow_ms=args.slow_ms,
+        rate_limit=args.rate_limit, rate_burst=args.rate_burst,
+        fixtures=fixtures, catalog=catalog, upstream=args.upstream if args.record else None,
+    )
+    sources: List[str] = []
+    if fixtures is not None:
+        sources.append(f"{len(fixtures)} fixtures" + (" (recording)" if args.record else ""))
+    if catalog is not None:
+        sources.append(f"catalog of {len(catalog.titles):,} movies")
+
+    async def _run():
+        server = await stub.serve(args.host, args.port)
+        print(f"TMDB stub on http://{args.host}:{args.port}: {', '.join(sources + ['synthetic'])}; "
+              f"latency {args.latency_ms} +- {args.jitter_ms} ms, errors {args.error_rate:.1%}, "
+              f"rate limit {args.rate_limit or 'off'}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(_run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()